@@ -1,12 +1,29 @@
 import argparse
+import os
+import time
+import warnings
+from io import BytesIO
 
 import numpy as np
 import pandas as pd
-from geopy.distance import geodesic
+from matplotlib import pyplot as plt
 
+from dati import leggi_agenzie, leggi_annunci, leggi_tipologie
 from grafici import plot_grafico_a_torta_numero_annunci, plot_grafico_media_prezzi_nel_tempo, pairplot_agenzie, \
-    plot_grafico_media_prezzi_nel_tempo_per_categoria
+    plot_grafico_media_prezzi_nel_tempo_per_categoria, plot_mappa_prezzi, plot_grafico_indice_prezzi
+from geo import calcola_comparabili, calcola_deviazione_prezzo_mq, deduplica, leggi_proprieta, rimuovi_duplicati, \
+    aggiorna_zone_annunci, calcola_griglia, leggi_griglia, scegli_livello
+from geo.griglia import NUMERO_LIVELLI, get_lato_cella
+from grafici.mappa_prezzi import TITOLI_MAPPA
 from grafici.plot_clusterizazzione import plot_clusterizazzione
+from statistiche import calcola_statistiche_streaming, MotoreScenari, leggi_scenari, leggi_rollup, \
+    calcola_indice_prezzi, StatisticheIndicePrezzi, CacheRisultati, get_chiave_query, get_versione_dati, \
+    maschera_filtri
+
+FILE_ANNUNCI_CSV = "files/annunci.csv"
+FILE_RISULTATI_SCENARI_CSV = "files/risultati_scenari.csv"
+# Argomenti che non cambiano il risultato di una query e non fanno parte della chiave della cache
+ARGOMENTI_ESCLUSI_CACHE = ["cache", "directory_grafici"]
 
 
 def _get_annunci_join_tipologie():
@@ -15,20 +32,36 @@ def _get_annunci_join_tipologie():
 
     :return: Un DataFrame contenente gli annunci uniti alle loro tipologie e agenzie.
     """
-    tipologie = pd.read_csv("files/tipologie.csv", index_col="id")
+    tipologie = leggi_tipologie(indice="id")
     tipologie = tipologie.add_suffix('_tipologia')
-    agenzie = pd.read_csv("files/agenzie.csv", index_col="id")
+    agenzie = leggi_agenzie(indice="id")
     agenzie = agenzie.add_suffix('_agenzia')
 
-    annunci = pd.read_csv("files/annunci.csv")
+    # Le date vengono convertite durante la lettura, secondo lo schema degli annunci
+    annunci = leggi_annunci(FILE_ANNUNCI_CSV)
     annunci = annunci.join(tipologie, on="tipologia", how="inner", rsuffix="_tipologia", validate="many_to_one")
     annunci = annunci.join(agenzie, on="agenzia", how="inner", rsuffix="_agenzia", validate="many_to_one")
 
-    annunci["data_ultima_modifica_prezzo"] = pd.to_datetime(annunci["data_ultima_modifica_prezzo"])
-
     return annunci
 
 
+def _get_rollup_join_tipologie(agenzia=None):
+    """
+    Carica il rollup giornaliero dei prezzi e gli aggiunge il nome della tipologia.
+
+    :param agenzia: Se specificato, mantiene solo gli aggregati di questa agenzia.
+    :return: Il rollup giornaliero con la colonna 'nome_tipologia'.
+    """
+    tipologie = leggi_tipologie(indice="id")
+    tipologie = tipologie.add_suffix('_tipologia')
+
+    rollup = leggi_rollup()
+    if agenzia:
+        rollup = rollup[rollup["agenzia"] == agenzia]
+
+    return rollup.join(tipologie, on="tipologia", how="inner")
+
+
 def _get_id_agenzie():
     """
     Estrae gli ID univoci delle agenzie da un file CSV.
@@ -39,7 +72,7 @@ def _get_id_agenzie():
     :return: Una lista degli ID univoci delle agenzie.
     :rtype: List[str]
     """
-    df = pd.read_csv('files/agenzie.csv')
+    df = leggi_agenzie()
     return df['id'].unique().tolist()
 
 
@@ -66,6 +99,45 @@ def _get_args():
     parser.add_argument('-r', '--raggio', type=float, help='Raggio (in km)', required=False)
     parser.add_argument('-a', '--agenzia', type=str, help='Numero dell\'agenzia', required=False,
                         choices=_get_id_agenzie())
+    parser.add_argument('-dc', '--date_casuali', action='store_true', required=False,
+                        help='Assegna agli annunci date di ultima modifica prezzo casuali nel 2023')
+    parser.add_argument('-s', '--seed', type=int, default=0, required=False,
+                        help='Seed usato per generare le date casuali')
+    parser.add_argument('-st', '--streaming', action='store_true', required=False,
+                        help='Calcola le statistiche leggendo gli annunci a blocchi, senza generare i grafici')
+    parser.add_argument('-dch', '--dimensione_chunk', type=int, default=500_000, required=False,
+                        help='Numero di annunci letti per blocco in modalità streaming')
+    parser.add_argument('-b', '--batch', type=str, required=False,
+                        help='File CSV di scenari di filtri da valutare in blocco, senza generare i grafici')
+    parser.add_argument('-o', '--output', type=str, default=FILE_RISULTATI_SCENARI_CSV, required=False,
+                        help='File CSV in cui salvare i risultati della modalità batch')
+    parser.add_argument('-ru', '--rollup', action='store_true', required=False,
+                        help='Genera i grafici temporali dal rollup giornaliero invece che dagli annunci')
+    parser.add_argument('-cmp', '--comparabili', type=str, required=False,
+                        help='File CSV in cui salvare, per ogni annuncio filtrato, lo scostamento del prezzo al mq dai '
+                             'suoi comparabili, senza generare i grafici')
+    parser.add_argument('-dd', '--deduplica', action='store_true', required=False,
+                        help='Considera una sola volta gli immobili pubblicati con più riferimenti')
+    parser.add_argument('-k', '--numero_comparabili', type=int, default=10, required=False,
+                        help='Numero di comparabili per annuncio')
+    parser.add_argument('-fz', '--file_zone', type=str, required=False,
+                        help='File GeoJSON con i poligoni delle zone (quartieri o NIL) a cui assegnare gli annunci')
+    parser.add_argument('-z', '--zona', type=str, required=False, help='Nome della zona')
+    parser.add_argument('-pz', '--per_zona', action='store_true', required=False,
+                        help='Mostra statistiche e grafici per zona invece che per agenzia e tipologia')
+    parser.add_argument('-mp', '--mappa_prezzi', action='store_true', required=False,
+                        help='Mostra la mappa di calore dei prezzi dalla griglia geografica precalcolata')
+    parser.add_argument('-lg', '--livello_griglia', type=int, required=False, choices=range(NUMERO_LIVELLI),
+                        help='Livello della griglia da mostrare (0 è il più grossolano); di default dipende '
+                             'dall\'area')
+    parser.add_argument('-vm', '--valore_mappa', type=str, default="mediana_prezzo_mq", required=False,
+                        choices=list(TITOLI_MAPPA), help='Valore da rappresentare nella mappa dei prezzi')
+    parser.add_argument('-ip', '--indice_prezzi', action='store_true', required=False,
+                        help='Mostra anche l\'indice edonico dei prezzi, a parità di caratteristiche degli annunci')
+    parser.add_argument('-ca', '--cache', action='store_true', required=False,
+                        help='Riusa statistiche e grafici già calcolati per la stessa query e gli stessi dati')
+    parser.add_argument('-dg', '--directory_grafici', type=str, required=False,
+                        help='Directory in cui salvare i grafici in formato PNG invece di mostrarli')
 
     args = parser.parse_args()
 
@@ -76,90 +148,399 @@ def _get_args():
     if args.prezzo_minimo and args.prezzo_massimo and args.prezzo_minimo > args.prezzo_massimo:
         parser.error("Il prezzo minimo deve essere minore del prezzo massimo.")
 
+    if args.rollup and any([args.prezzo_minimo, args.prezzo_massimo, args.raggio, args.date_casuali, args.deduplica]):
+        parser.error("Il rollup è aggregato per agenzia e tipologia: con --rollup si può filtrare solo per agenzia.")
+
+    if (args.zona or args.per_zona) and not args.file_zone:
+        parser.error("Per filtrare o raggruppare per zona devi specificare il file delle zone con --file_zone.")
+
+    if (args.zona or args.per_zona) and (args.streaming or args.rollup):
+        parser.error("Le zone non sono disponibili in modalità streaming né con il rollup.")
+
+    if args.cache and any([args.batch, args.comparabili, args.mappa_prezzi]):
+        parser.error("La cache si applica solo alle statistiche e ai grafici, non a --batch, --comparabili e "
+                     "--mappa_prezzi.")
+
+    if args.mappa_prezzi and any([args.prezzo_minimo, args.prezzo_massimo, args.agenzia, args.zona, args.deduplica]):
+        parser.error("La griglia aggrega tutti gli annunci: con --mappa_prezzi si può solo delimitare l'area con "
+                     "latitudine, longitudine e raggio.")
+
     return args
 
 
-def _edita_date_annunci(annunci):
+def _edita_date_annunci(annunci, seed=0):
     """
     Modifica la data di ultima modifica prezzo per ogni annuncio in modo casuale.
 
+    Le date vengono estratte tutte insieme da un unico generatore, per cui il risultato è deterministico a parità di
+    seed e il costo è quello di una singola operazione vettoriale anche con milioni di annunci.
+
     :param annunci: DataFrame contenente gli annunci.
+    :param seed: Seed del generatore di numeri casuali.
     """
-    for i in range(len(annunci)):
-        # Crea un nuovo generatore di numeri casuali
-        rng = np.random.default_rng(seed=i)
+    rng = np.random.default_rng(seed=seed)
 
-        # Genera un intervallo di date
-        date_range = pd.date_range(start="2023-01-01", end="2023-12-31")
+    # Genera un intervallo di date
+    date_range = pd.date_range(start="2023-01-01", end="2023-12-31")
 
-        # Seleziona casualmente una data dall'intervallo
-        random_date = rng.choice(date_range)
+    # Seleziona casualmente una data dall'intervallo per ogni annuncio
+    indici_date = rng.integers(0, len(date_range), size=len(annunci))
 
-        annunci.at[i, "data_ultima_modifica_prezzo"] = random_date
+    annunci["data_ultima_modifica_prezzo"] = date_range[indici_date]
 
 
-def _filtra_per_raggio(df, lat_centrale, lon_centrale, raggio):
+def _filtra_annunci(annunci, args):
     """
-    Filtra il DataFrame in base alla distanza dal punto centrale specificato usando geopy.
+    Applica agli annunci i filtri passati da linea di comando.
+
+    Usa `statistiche.maschera_filtri`, la stessa maschera della modalità streaming, degli scenari batch e del servizio
+    di query, per cui tutte le modalità misurano il raggio con la stessa distanza e includono gli stessi annunci.
 
-    :param df: DataFrame originale con colonne 'lat' e 'lon'.
-    :param lat_centrale: Latitudine del punto centrale.
-    :param lon_centrale: Longitudine del punto centrale.
-    :param raggio: Raggio in km entro il quale filtrare.
+    :param annunci: DataFrame degli annunci.
+    :param args: Argomenti della linea di comando.
     :return: DataFrame filtrato.
     """
+    return annunci[maschera_filtri(annunci, prezzo_minimo=args.prezzo_minimo, prezzo_massimo=args.prezzo_massimo,
+                                   latitudine=args.latitudine, longitudine=args.longitudine, raggio=args.raggio,
+                                   agenzia=args.agenzia, zona=args.zona)]
 
-    # Definire il punto centrale come una tupla di latitudine e longitudine
-    centro = (lat_centrale, lon_centrale)
 
-    # Applica una funzione a ciascuna riga del DataFrame.
-    # Per ogni riga, calcola la distanza tra le coordinate dell'annuncio e il punto centrale.
-    # Se la distanza è minore o uguale al raggio specificato, restituisce True (l'annuncio è entro il raggio).
-    # Altrimenti, restituisce False (l'annuncio è fuori dal raggio).
-    maschera = df.apply(
-        lambda riga: geodesic((riga['latitudine'], riga['longitudine']), centro).km <= raggio, axis=1
+def _calcola_statistiche(annunci):
+    """
+    Calcola le statistiche sui prezzi di un DataFrame di annunci già filtrato.
+
+    :param annunci: DataFrame contenente gli annunci.
+    :return: Dizionario con media, mediana, deviazione standard, minimo e massimo del prezzo.
+    :rtype: dict
+    """
+    return {
+        "media": annunci["prezzo"].mean(),
+        "mediana": annunci["prezzo"].median(),
+        "deviazione_standard": annunci["prezzo"].std(),
+        "minimo": annunci["prezzo"].min(),
+        "massimo": annunci["prezzo"].max(),
+    }
+
+
+def _stampa_statistiche(statistiche):
+    """
+    Stampa le statistiche sui prezzi.
+
+    :param statistiche: Dizionario delle statistiche, come restituito da `_calcola_statistiche` o
+                        `calcola_statistiche_streaming`.
+    """
+    print(f"Media prezzo: € {statistiche['media']:.2f}")
+    print(f"Mediana prezzo: € {statistiche['mediana']:.2f}")
+    print(f"Derivazione standard prezzo: € {statistiche['deviazione_standard']:.2f}")
+    print(f"Prezzo minimo: € {statistiche['minimo']:.2f}")
+    print(f"Prezzo massimo: € {statistiche['massimo']:.2f}")
+
+    for quantile, valore in statistiche.get("percentili", {}).items():
+        print(f"Percentile {quantile * 100:.0f}° prezzo: € {valore:.2f}")
+
+    if statistiche.get("errore_rango_quantili"):
+        print(f"Errore di rango dei quantili: ±{statistiche['errore_rango_quantili'] * 100:.2f}%")
+
+
+def _calcola_statistiche_per_zona(annunci):
+    """
+    Calcola le statistiche sui prezzi di ogni zona. Gli annunci fuori da tutte le zone sono esclusi.
+
+    :param annunci: DataFrame degli annunci con la colonna 'zona'.
+    :return: DataFrame con una riga per zona, ordinato per numero di annunci decrescente.
+    :rtype: pd.DataFrame
+    """
+    statistiche = annunci.groupby("zona")["prezzo"].agg(
+        conteggio="count", media="mean", mediana="median", deviazione_standard="std", minimo="min", massimo="max"
     )
+    return statistiche.sort_values("conteggio", ascending=False)
 
-    # Usa la maschera booleana per filtrare il DataFrame e restituire solo gli annunci entro il raggio specificato.
-    return df[maschera]
 
+def _stampa_risultato(risultato):
+    """
+    Stampa le statistiche di una query.
 
-def main():
+    :param risultato: Dizionario con le chiavi 'statistiche' ed eventualmente 'statistiche_per_zona'.
     """
-    Funzione principale che esegue l'analisi sugli annunci e mostra vari grafici.
+    _stampa_statistiche(risultato["statistiche"])
+
+    if risultato.get("statistiche_per_zona") is not None:
+        print(risultato["statistiche_per_zona"].to_string(float_format=lambda valore: f"{valore:.2f}"))
+
+
+def _carica_annunci(args):
+    """
+    Carica gli annunci e applica le trasformazioni richieste che precedono i filtri: le date casuali, la rimozione
+    degli annunci duplicati e l'assegnazione delle zone.
+
+    :param args: Argomenti da linea di comando.
+    :return: DataFrame degli annunci.
     """
-    args = _get_args()
     annunci = _get_annunci_join_tipologie()
-    _edita_date_annunci(annunci)
+    if args.date_casuali:
+        _edita_date_annunci(annunci, args.seed)
+
+    if args.deduplica:
+        proprieta = leggi_proprieta()
+        if proprieta is None:
+            proprieta = deduplica(annunci)
+        annunci = rimuovi_duplicati(annunci, proprieta)
 
-    if args.prezzo_minimo:
-        annunci = annunci[annunci["prezzo"] >= args.prezzo_minimo]
-    if args.prezzo_massimo:
-        annunci = annunci[annunci["prezzo"] <= args.prezzo_massimo]
+    if args.file_zone:
+        annunci["zona"] = aggiorna_zone_annunci(annunci, args.file_zone)
 
-    if all([args.latitudine, args.longitudine, args.raggio]):
-        annunci = _filtra_per_raggio(annunci, args.latitudine, args.longitudine, args.raggio)
+    return annunci
+
+
+def _get_livello_griglia(livello):
+    """
+    Restituisce un livello della griglia dei prezzi salvata da `scraper.py`, oppure lo calcola dagli annunci se la
+    griglia non è ancora stata salvata.
+
+    :param livello: Livello della griglia.
+    :return: Le righe della griglia del livello.
+    :rtype: pd.DataFrame
+    """
+    griglia = leggi_griglia(livello)
+    if griglia is None:
+        annunci = leggi_annunci(FILE_ANNUNCI_CSV, colonne=["latitudine", "longitudine", "prezzo", "mq"])
+        griglia = calcola_griglia(annunci, livelli=[livello])
+
+    return griglia
+
+
+def _mostra_mappa_prezzi(args):
+    """
+    Mostra la mappa di calore dei prezzi. Se è specificata un'area (latitudine, longitudine e raggio) la mappa viene
+    ristretta all'area e, se non è indicato un livello, si usa il più fine adatto alla sua ampiezza. Della griglia
+    vengono letti solo il livello disegnato e, senza area, il livello più grossolano per calcolarne l'estensione.
+
+    :param args: Argomenti da linea di comando.
+    """
+    if args.raggio:
+        delta_latitudine = args.raggio / 111.32
+        delta_longitudine = delta_latitudine / np.cos(np.radians(args.latitudine))
+        estensione = (args.latitudine - delta_latitudine, args.latitudine + delta_latitudine,
+                      args.longitudine - delta_longitudine, args.longitudine + delta_longitudine)
+    else:
+        celle = _get_livello_griglia(0)
+        lato = get_lato_cella(0)
+        estensione = (celle["cella_latitudine"].min() * lato, (celle["cella_latitudine"].max() + 1) * lato,
+                      celle["cella_longitudine"].min() * lato, (celle["cella_longitudine"].max() + 1) * lato)
+
+    livello = args.livello_griglia if args.livello_griglia is not None else scegli_livello(*estensione)
+    plot_mappa_prezzi(_get_livello_griglia(livello), livello, args.valore_mappa, estensione if args.raggio else None)
+
+
+def _get_indice_prezzi(args, annunci):
+    """
+    Restituisce l'indice edonico dei prezzi. Se non sono stati applicati filtri o trasformazioni agli annunci, si usano
+    le statistiche salvate da `scraper.py`; altrimenti l'indice viene calcolato sugli annunci passati. In entrambi i
+    casi ogni annuncio conta una sola volta, con il prezzo attuale.
+
+    :param args: Argomenti da linea di comando.
+    :param annunci: DataFrame degli annunci già filtrati.
+    :return: L'indice dei prezzi.
+    :rtype: pd.DataFrame
+    """
+    annunci_modificati = any([args.prezzo_minimo, args.prezzo_massimo, args.raggio, args.agenzia, args.date_casuali,
+                              args.deduplica, args.file_zone])
+    statistiche = None if annunci_modificati else StatisticheIndicePrezzi.carica()
+    if statistiche is None:
+        return calcola_indice_prezzi(annunci)
 
-    media_prezzo = annunci["prezzo"].mean()
-    print(f"Media prezzo: € {media_prezzo:.2f}")
+    return statistiche.calcola_indice()
 
-    mediana_prezzo = annunci["prezzo"].median()
-    print(f"Mediana prezzo: € {mediana_prezzo:.2f}")
 
-    derivazione_standard_prezzo = annunci["prezzo"].std()
-    print(f"Derivazione standard prezzo: € {derivazione_standard_prezzo:.2f}")
+def _cattura_figure(nome):
+    """
+    Converte in PNG e chiude tutte le figure aperte.
+
+    :param nome: Nome del grafico, usato per i nomi dei file.
+    :return: Dizionario nome del file -> contenuto PNG.
+    :rtype: dict
+    """
+    immagini = {}
+    numeri_figure = plt.get_fignums()
+    for posizione, numero in enumerate(numeri_figure):
+        figura = plt.figure(numero)
+        contenuto = BytesIO()
+        figura.savefig(contenuto, format="png")
+        plt.close(figura)
 
-    prezzo_minimo = annunci["prezzo"].min()
-    print(f"Prezzo minimo: € {prezzo_minimo:.2f}")
+        nome_file = f"{nome}.png" if len(numeri_figure) == 1 else f"{nome}_{posizione + 1}.png"
+        immagini[nome_file] = contenuto.getvalue()
 
-    prezzo_massimo = annunci["prezzo"].max()
-    print(f"Prezzo massimo: € {prezzo_massimo:.2f}")
+    return immagini
+
+
+def _genera_grafici(args, annunci, cattura=False):
+    """
+    Genera i grafici dell'analisi.
+
+    :param args: Argomenti da linea di comando.
+    :param annunci: DataFrame degli annunci già filtrati.
+    :param cattura: Se True, i grafici non vengono mostrati ma restituiti come immagini PNG.
+    :return: Dizionario nome del file -> contenuto PNG (vuoto se `cattura` è False).
+    :rtype: dict
+    """
+    rollup = _get_rollup_join_tipologie(args.agenzia) if args.rollup else None
+    colonna_categoria = "zona" if args.per_zona else "nome_tipologia"
+
+    grafici = [
+        ("numero_annunci", lambda: plot_grafico_a_torta_numero_annunci(annunci, colonna="zona", colonna_etichetta=None)
+            if args.per_zona else plot_grafico_a_torta_numero_annunci(annunci)),
+        ("media_prezzi_nel_tempo", lambda: plot_grafico_media_prezzi_nel_tempo(annunci, rollup)),
+    ]
+    if args.indice_prezzi:
+        grafici.append(("indice_prezzi", lambda: plot_grafico_indice_prezzi(_get_indice_prezzi(args, annunci))))
+    grafici += [
+        ("media_prezzi_per_categoria", lambda: plot_grafico_media_prezzi_nel_tempo_per_categoria(
+            annunci, rollup, colonna_categoria=colonna_categoria)),
+        ("pairplot_agenzie", lambda: pairplot_agenzie(annunci)),
+        ("clusterizzazione", lambda: plot_clusterizazzione(annunci)),
+    ]
+
+    if not cattura:
+        for _, disegna in grafici:
+            disegna()
+        return {}
+
+    immagini = {}
+    backend = plt.get_backend()
+    plt.switch_backend("Agg")
+    try:
+        with warnings.catch_warnings():
+            # Con il backend Agg plt.show() non mostra nulla: le figure restano aperte e vengono catturate
+            warnings.filterwarnings("ignore", message=".*non-interactive.*")
+            for nome, disegna in grafici:
+                disegna()
+                immagini.update(_cattura_figure(nome))
+    finally:
+        plt.switch_backend(backend)
+
+    return immagini
+
+
+def _mostra_grafici(immagini, directory_grafici=None):
+    """
+    Salva nella directory indicata, oppure mostra, i grafici già convertiti in PNG.
+
+    :param immagini: Dizionario nome del file -> contenuto PNG.
+    :param directory_grafici: Directory in cui salvare i grafici. Se None, i grafici vengono mostrati.
+    """
+    if directory_grafici:
+        os.makedirs(directory_grafici, exist_ok=True)
+        for nome_file, contenuto in immagini.items():
+            with open(os.path.join(directory_grafici, nome_file), "wb") as file_immagine:
+                file_immagine.write(contenuto)
+        print(f"{len(immagini)} grafici salvati in {directory_grafici}")
+        return
+
+    for contenuto in immagini.values():
+        plt.figure(figsize=(12, 8))
+        plt.imshow(plt.imread(BytesIO(contenuto)))
+        plt.axis("off")
+        plt.tight_layout()
+        plt.show()
+
+
+def _esegui_batch(annunci, percorso_scenari, percorso_output):
+    """
+    Valuta tutti gli scenari di un file sugli stessi annunci e salva la tabella dei risultati.
+
+    :param annunci: DataFrame degli annunci, caricati una sola volta e già filtrati con i filtri della linea di
+                    comando.
+    :param percorso_scenari: Percorso del file CSV degli scenari.
+    :param percorso_output: Percorso del file CSV dei risultati.
+    """
+    scenari = leggi_scenari(percorso_scenari)
+    motore = MotoreScenari(annunci)
+
+    inizio = time.perf_counter()
+    risultati = motore.valuta(scenari)
+    durata = time.perf_counter() - inizio
+
+    risultati.to_csv(percorso_output, index=False)
+    print(f"Valutati {len(scenari)} scenari in {durata:.3f} s, risultati salvati in {percorso_output}")
+
+
+def _salva_comparabili(annunci, percorso_output, k):
+    """
+    Calcola i comparabili di tutti gli annunci e salva lo scostamento del prezzo al mq di ognuno dai suoi comparabili.
+
+    :param annunci: DataFrame degli annunci già filtrati.
+    :param percorso_output: Percorso del file CSV dei risultati.
+    :param k: Numero di comparabili per annuncio.
+    """
+    annunci = annunci.reset_index(drop=True)
+    posizioni, _ = calcola_comparabili(annunci, k=k)
+    deviazioni = calcola_deviazione_prezzo_mq(annunci, posizioni)
+
+    pd.concat([annunci[["riferimento", "agenzia", "prezzo", "mq"]], deviazioni.drop(columns="prezzo_mq")], axis=1) \
+        .to_csv(percorso_output, index=False)
+    print(f"Comparabili di {len(annunci)} annunci salvati in {percorso_output}")
+
+
+def main():
+    """
+    Funzione principale che esegue l'analisi sugli annunci e mostra vari grafici.
+    """
+    args = _get_args()
 
-    plot_grafico_a_torta_numero_annunci(annunci)
-    plot_grafico_media_prezzi_nel_tempo(annunci)
-    plot_grafico_media_prezzi_nel_tempo_per_categoria(annunci)
-    pairplot_agenzie(annunci)
-    plot_clusterizazzione(annunci)
+    if args.batch:
+        _esegui_batch(_filtra_annunci(_carica_annunci(args), args), args.batch, args.output)
+        return
+
+    cache = CacheRisultati() if args.cache else None
+    if cache is not None:
+        argomenti_query = {nome: valore for nome, valore in vars(args).items() if nome not in ARGOMENTI_ESCLUSI_CACHE}
+        chiave = get_chiave_query(argomenti_query, get_versione_dati([args.file_zone] if args.file_zone else []))
+        risultato = cache.leggi(chiave)
+        if risultato is not None:
+            _stampa_risultato(risultato)
+            _mostra_grafici(risultato.get("grafici", {}), args.directory_grafici)
+            return
+
+    if args.streaming:
+        statistiche = calcola_statistiche_streaming(
+            FILE_ANNUNCI_CSV,
+            dimensione_chunk=args.dimensione_chunk,
+            prezzo_minimo=args.prezzo_minimo,
+            prezzo_massimo=args.prezzo_massimo,
+            latitudine=args.latitudine,
+            longitudine=args.longitudine,
+            raggio=args.raggio,
+            agenzia=args.agenzia,
+        )
+        _stampa_statistiche(statistiche)
+        if cache is not None:
+            cache.scrivi(chiave, {"statistiche": statistiche})
+        return
+
+    if args.mappa_prezzi:
+        _mostra_mappa_prezzi(args)
+        return
+
+    annunci = _filtra_annunci(_carica_annunci(args), args)
+
+    if args.comparabili:
+        _salva_comparabili(annunci, args.comparabili, args.numero_comparabili)
+        return
+
+    risultato = {
+        "statistiche": _calcola_statistiche(annunci),
+        "statistiche_per_zona": _calcola_statistiche_per_zona(annunci) if args.per_zona else None,
+    }
+    _stampa_risultato(risultato)
+
+    cattura = cache is not None or bool(args.directory_grafici)
+    risultato["grafici"] = _genera_grafici(args, annunci, cattura)
+    if cattura:
+        _mostra_grafici(risultato["grafici"], args.directory_grafici)
+
+    if cache is not None:
+        cache.scrivi(chiave, risultato)
 
 
 if __name__ == '__main__':
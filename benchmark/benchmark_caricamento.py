@@ -0,0 +1,120 @@
+"""
+Benchmark della lettura del file degli annunci.
+
+Confronta la lettura originale (inferenza dei tipi e `pd.to_datetime` separato) con quella di `dati.leggi_csv`, con
+il motore C e con il motore pyarrow, e con la proiezione sulle sole colonne usate dalle statistiche. Va eseguito
+dalla radice del progetto con:
+
+    python -m benchmark.benchmark_caricamento
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from dati.caricamento import SCHEMA_ANNUNCI, leggi_csv
+
+COLONNE_PROIEZIONE = ["agenzia", "latitudine", "longitudine", "prezzo"]
+DIMENSIONE_BLOCCO_GENERAZIONE = 1_000_000
+
+
+def _genera_file_annunci(percorso, numero_righe, seed=0):
+    """
+    Scrive un file di annunci sintetici con le colonne di `SCHEMA_ANNUNCI`, a blocchi per limitare la memoria.
+
+    :param percorso: Percorso del file CSV da scrivere.
+    :param numero_righe: Numero di annunci da generare.
+    :param seed: Seed del generatore di numeri casuali.
+    """
+    rng = np.random.default_rng(seed)
+    for inizio in range(0, numero_righe, DIMENSIONE_BLOCCO_GENERAZIONE):
+        numero = min(DIMENSIONE_BLOCCO_GENERAZIONE, numero_righe - inizio)
+        riferimenti = np.arange(inizio, inizio + numero) + 100_000
+        blocco = pd.DataFrame({
+            "riferimento": riferimenti,
+            "agenzia": rng.choice(["GAB", "TEC", "REM"], numero),
+            "link": [f"https://www.gabetti.it/annuncio/{riferimento}" for riferimento in riferimenti],
+            "latitudine": 45.46 + rng.normal(0, 0.03, numero),
+            "longitudine": 9.19 + rng.normal(0, 0.04, numero),
+            "prezzo": np.where(rng.random(numero) < 0.05, np.nan, rng.lognormal(12.8, 0.6, numero).round()),
+            "mq": rng.integers(30, 250, numero).astype(float),
+            "locali": rng.integers(1, 7, numero),
+            "tipologia": rng.integers(0, 10, numero),
+            "data_ultima_modifica_prezzo": pd.Timestamp("2023-01-01") + pd.to_timedelta(
+                rng.integers(0, 365 * 24 * 3600, numero), unit="s"),
+        })
+        blocco.to_csv(percorso, mode="w" if inizio == 0 else "a", header=inizio == 0, index=False)
+
+
+def _leggi_originale(percorso):
+    """
+    Lettura originale di `analyzer.py`: tipi inferiti e conversione delle date in una passata separata.
+
+    :param percorso: Percorso del file CSV.
+    :return: DataFrame degli annunci.
+    """
+    annunci = pd.read_csv(percorso)
+    annunci["data_ultima_modifica_prezzo"] = pd.to_datetime(annunci["data_ultima_modifica_prezzo"])
+    return annunci
+
+
+def _misura(funzione, percorso, ripetizioni):
+    """
+    Misura il tempo minimo di lettura su più ripetizioni.
+
+    :param funzione: Funzione di lettura da misurare.
+    :param percorso: Percorso del file passato alla funzione.
+    :param ripetizioni: Numero di ripetizioni.
+    :return: Tempo minimo in secondi.
+    """
+    tempi = []
+    for _ in range(ripetizioni):
+        inizio = time.perf_counter()
+        funzione(percorso)
+        tempi.append(time.perf_counter() - inizio)
+
+    return min(tempi)
+
+
+def main():
+    """
+    Esegue il benchmark per ogni numero di righe e stampa una tabella dei tempi.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark della lettura degli annunci")
+    parser.add_argument('-r', '--righe', type=int, nargs='+', default=[1_000_000, 10_000_000],
+                        help='Numero di righe')
+    parser.add_argument('-n', '--ripetizioni', type=int, default=3, help='Ripetizioni per misura')
+    args = parser.parse_args()
+
+    letture = {
+        "originale": _leggi_originale,
+        "schema_c": lambda percorso: leggi_csv(percorso, SCHEMA_ANNUNCI, motore="c"),
+        "schema_pyarrow": lambda percorso: leggi_csv(percorso, SCHEMA_ANNUNCI, motore="pyarrow"),
+        "proiezione_pyarrow": lambda percorso: leggi_csv(percorso, SCHEMA_ANNUNCI, COLONNE_PROIEZIONE,
+                                                         motore="pyarrow"),
+    }
+
+    risultati = []
+    with tempfile.TemporaryDirectory() as directory:
+        for numero_righe in args.righe:
+            percorso = os.path.join(directory, f"annunci_{numero_righe}.csv")
+            _genera_file_annunci(percorso, numero_righe)
+
+            tempi = {nome: _misura(lettura, percorso, args.ripetizioni) for nome, lettura in letture.items()}
+            riga = {"righe": numero_righe, "cpu": os.cpu_count()}
+            for nome, tempo in tempi.items():
+                riga[f"{nome}_s"] = round(tempo, 3)
+                if nome != "originale":
+                    riga[f"speedup_{nome}"] = round(tempi["originale"] / tempo, 1)
+            risultati.append(riga)
+
+            os.remove(percorso)
+
+    print(pd.DataFrame(risultati).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
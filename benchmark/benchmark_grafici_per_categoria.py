@@ -0,0 +1,114 @@
+"""
+Benchmark della preparazione dei dati per i grafici della media prezzi per categoria.
+
+Confronta l'implementazione con un filtro per categoria (O(categorie × righe)) con quella basata su un unico groupby,
+al variare del numero di categorie e di righe. Va eseguito dalla radice del progetto con:
+
+    python -m benchmark.benchmark_grafici_per_categoria
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from grafici.grafico_media_prezzi_nel_tempo_per_categoria import prepara_dati, _get_categorie_con_abbastanza_dati
+
+
+def _genera_annunci(numero_righe, numero_categorie, seed=0):
+    """
+    Genera annunci sintetici con prezzi, date e categorie casuali.
+
+    :param numero_righe: Numero di annunci da generare.
+    :param numero_categorie: Numero di categorie distinte.
+    :param seed: Seed del generatore di numeri casuali.
+    :return: DataFrame degli annunci.
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "prezzo": rng.lognormal(12.8, 0.6, numero_righe),
+        "data_ultima_modifica_prezzo": pd.Timestamp("2023-01-01") + pd.to_timedelta(
+            rng.integers(0, 365, numero_righe), unit="D"),
+        "nome_tipologia": rng.integers(0, numero_categorie, numero_righe).astype(str),
+    })
+
+
+def _prepara_dati_per_categoria_con_filtri(annunci, soglia=5):
+    """
+    Implementazione precedente: media mobile sull'ordinamento globale e un filtro sull'intero DataFrame per ogni
+    categoria, sia per contare i dati sia per estrarre il subset da plottare.
+
+    :param annunci: DataFrame degli annunci.
+    :param soglia: Numero minimo di dati per categoria.
+    :return: Lista dei subset delle categorie con abbastanza dati.
+    """
+    dati = annunci.dropna(subset=["prezzo"]).copy()
+    dati.sort_values(by="data_ultima_modifica_prezzo", inplace=True)
+    dati["media_settimanale"] = dati["prezzo"].rolling(window=7, min_periods=1).mean()
+    dati = dati[dati["media_settimanale"] > 0]
+
+    categorie = [
+        categoria for categoria in dati["nome_tipologia"].unique()
+        if len(dati[dati["nome_tipologia"] == categoria]) > soglia
+    ]
+    return [dati[dati["nome_tipologia"] == categoria] for categoria in categorie]
+
+
+def _prepara_dati_per_categoria_con_groupby(annunci):
+    """
+    Implementazione attuale: un ordinamento e un groupby per media mobile, conteggi e subset.
+
+    :param annunci: DataFrame degli annunci.
+    :return: Lista di tuple (categoria, subset) delle categorie con abbastanza dati.
+    """
+    return _get_categorie_con_abbastanza_dati(prepara_dati(annunci))
+
+
+def _misura(funzione, annunci, ripetizioni):
+    """
+    Misura il tempo minimo di esecuzione di una funzione su più ripetizioni.
+
+    :param funzione: Funzione da misurare.
+    :param annunci: DataFrame passato alla funzione.
+    :param ripetizioni: Numero di ripetizioni.
+    :return: Tempo minimo in secondi.
+    """
+    tempi = []
+    for _ in range(ripetizioni):
+        inizio = time.perf_counter()
+        funzione(annunci)
+        tempi.append(time.perf_counter() - inizio)
+
+    return min(tempi)
+
+
+def main():
+    """
+    Esegue il benchmark su una griglia di numero di righe × numero di categorie e stampa una tabella dei tempi.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark dei grafici della media prezzi per categoria")
+    parser.add_argument('-r', '--righe', type=int, nargs='+', default=[100_000, 1_000_000], help='Numero di righe')
+    parser.add_argument('-c', '--categorie', type=int, nargs='+', default=[10, 100, 1000],
+                        help='Numero di categorie')
+    parser.add_argument('-n', '--ripetizioni', type=int, default=3, help='Ripetizioni per misura')
+    args = parser.parse_args()
+
+    risultati = []
+    for numero_righe in args.righe:
+        for numero_categorie in args.categorie:
+            annunci = _genera_annunci(numero_righe, numero_categorie)
+            tempo_filtri = _misura(_prepara_dati_per_categoria_con_filtri, annunci, args.ripetizioni)
+            tempo_groupby = _misura(_prepara_dati_per_categoria_con_groupby, annunci, args.ripetizioni)
+            risultati.append({
+                "righe": numero_righe,
+                "categorie": numero_categorie,
+                "filtri_s": round(tempo_filtri, 4),
+                "groupby_s": round(tempo_groupby, 4),
+                "speedup": round(tempo_filtri / tempo_groupby, 1),
+            })
+
+    print(pd.DataFrame(risultati).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
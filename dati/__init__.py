@@ -0,0 +1,2 @@
+from .caricamento import MOTORE_CSV, SCHEMA_AGENZIE, SCHEMA_ANNUNCI, SCHEMA_TIPOLOGIE, SCHEMA_TRANSAZIONI, \
+    leggi_agenzie, leggi_annunci, leggi_csv, leggi_parquet, leggi_tipologie, leggi_transazioni
@@ -0,0 +1,147 @@
+"""
+Lettura dei file CSV del progetto con schemi dichiarati.
+
+Ogni file ha uno schema che associa a ogni colonna il suo tipo: pandas non deve inferire i tipi (una seconda passata
+sui dati) e le date vengono convertite durante la lettura invece che con un `pd.to_datetime` separato. Se è
+installato pyarrow la lettura usa il suo motore CSV, che converte le date in modo nativo e divide il file in blocchi
+elaborati su più thread; altrimenti si ricade sul motore C di pandas con gli stessi tipi. Le transazioni possono
+essere lette anche da CSV compressi con gzip e da file Parquet, i formati prodotti da `generatore_csv_transazioni.py`.
+"""
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401 pylint: disable=unused-import
+
+    MOTORE_CSV = "pyarrow"
+except ImportError:
+    MOTORE_CSV = "c"
+
+FILE_ANNUNCI_CSV = "files/annunci.csv"
+FILE_AGENZIE_CSV = "files/agenzie.csv"
+FILE_TIPOLOGIE_CSV = "files/tipologie.csv"
+FILE_TRANSAZIONI_CSV = "files/transazioni.csv"
+# Tipo usato per le colonne di date dichiarate negli schemi
+DATA = "data"
+
+SCHEMA_ANNUNCI = {
+    "riferimento": "int64",
+    "agenzia": str,
+    "link": str,
+    "latitudine": "float64",
+    "longitudine": "float64",
+    "prezzo": "float64",
+    "mq": "float64",
+    # I locali possono mancare: il tipo float permette i NaN senza ricorrere ai tipi nullable
+    "locali": "float64",
+    "tipologia": "int64",
+    "data_ultima_modifica_prezzo": DATA,
+}
+SCHEMA_AGENZIE = {"id": str, "nome": str, "scraper": str}
+SCHEMA_TIPOLOGIE = {"id": "int64", "nome": str}
+SCHEMA_TRANSAZIONI = {
+    "id_transazione": "int64",
+    "acquirente": "category",
+    "venditore": "category",
+    "agenzia": "category",
+    "immobile": "category",
+    "prezzo": "int64",
+    "data": DATA,
+}
+
+
+def leggi_csv(percorso, schema, colonne=None, indice=None, motore=MOTORE_CSV):
+    """
+    Legge un file CSV con i tipi dichiarati nello schema, leggendo solo le colonne richieste.
+
+    :param percorso: Percorso del file CSV.
+    :param schema: Dizionario colonna -> tipo; le colonne di tipo `DATA` vengono convertite in date.
+    :param colonne: Colonne da leggere. Se None, tutte quelle dello schema.
+    :param indice: Colonna (opzionale) da usare come indice.
+    :param motore: Motore di lettura di pandas ('pyarrow' o 'c').
+    :return: DataFrame con le colonne nell'ordine del file.
+    :rtype: pd.DataFrame
+    """
+    colonne = list(schema) if colonne is None else list(colonne)
+    if indice is not None and indice not in colonne:
+        colonne.append(indice)
+
+    tipi = {colonna: schema[colonna] for colonna in colonne if schema[colonna] != DATA}
+    date = [colonna for colonna in colonne if schema[colonna] == DATA]
+
+    return pd.read_csv(percorso, usecols=colonne, dtype=tipi, parse_dates=date, index_col=indice, engine=motore)
+
+
+def leggi_parquet(percorso, schema, colonne=None):
+    """
+    Legge un file Parquet convertendo le colonne nei tipi dichiarati nello schema, in modo che il risultato sia
+    uguale a quello di `leggi_csv` sullo stesso contenuto.
+
+    :param percorso: Percorso del file Parquet.
+    :param schema: Dizionario colonna -> tipo; le colonne di tipo `DATA` vengono convertite in date.
+    :param colonne: Colonne da leggere. Se None, tutte quelle dello schema.
+    :return: DataFrame con le colonne richieste.
+    :rtype: pd.DataFrame
+    """
+    colonne = list(schema) if colonne is None else list(colonne)
+    dati = pd.read_parquet(percorso, columns=colonne)
+
+    tipi = {colonna: schema[colonna] for colonna in colonne if schema[colonna] != DATA}
+    dati = dati.astype(tipi)
+    for colonna in colonne:
+        if schema[colonna] == DATA:
+            dati[colonna] = pd.to_datetime(dati[colonna]).astype("datetime64[us]")
+
+    return dati
+
+
+def leggi_annunci(percorso=FILE_ANNUNCI_CSV, colonne=None, indice=None):
+    """
+    Legge gli annunci.
+
+    :param percorso: Percorso del file CSV degli annunci.
+    :param colonne: Colonne da leggere. Se None, tutte.
+    :param indice: Colonna (opzionale) da usare come indice, ad esempio 'riferimento'.
+    :return: DataFrame degli annunci.
+    :rtype: pd.DataFrame
+    """
+    return leggi_csv(percorso, SCHEMA_ANNUNCI, colonne, indice)
+
+
+def leggi_agenzie(percorso=FILE_AGENZIE_CSV, indice=None):
+    """
+    Legge le agenzie.
+
+    :param percorso: Percorso del file CSV delle agenzie.
+    :param indice: Colonna (opzionale) da usare come indice, ad esempio 'id'.
+    :return: DataFrame delle agenzie.
+    :rtype: pd.DataFrame
+    """
+    return leggi_csv(percorso, SCHEMA_AGENZIE, indice=indice)
+
+
+def leggi_tipologie(percorso=FILE_TIPOLOGIE_CSV, indice=None):
+    """
+    Legge le tipologie degli immobili.
+
+    :param percorso: Percorso del file CSV delle tipologie.
+    :param indice: Colonna (opzionale) da usare come indice, ad esempio 'id'.
+    :return: DataFrame delle tipologie.
+    :rtype: pd.DataFrame
+    """
+    return leggi_csv(percorso, SCHEMA_TIPOLOGIE, indice=indice)
+
+
+def leggi_transazioni(percorso=FILE_TRANSAZIONI_CSV, colonne=None):
+    """
+    Legge le transazioni immobiliari. Il formato è dedotto dall'estensione: `.parquet` per i file Parquet,
+    altrimenti CSV, eventualmente compresso (ad esempio `.csv.gz`).
+
+    :param percorso: Percorso del file delle transazioni.
+    :param colonne: Colonne da leggere. Se None, tutte.
+    :return: DataFrame delle transazioni.
+    :rtype: pd.DataFrame
+    """
+    if percorso.endswith(".parquet"):
+        return leggi_parquet(percorso, SCHEMA_TRANSAZIONI, colonne)
+
+    return leggi_csv(percorso, SCHEMA_TRANSAZIONI, colonne)
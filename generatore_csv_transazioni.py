@@ -2,39 +2,44 @@
 Genera un file CSV contenente informazioni sulle transazioni.
 """
 import argparse
+import concurrent.futures
+import functools
+import gzip
+import json
 import logging
+import math
+import os
 import random
+import shutil
 import string
+import time
 from datetime import datetime, timedelta
 
+import numpy as np
 import pandas as pd
-
-
-def _genera_cf():
-    """
-    Genera un Codice Fiscale (CF) casuale.
-
-    :return: str Il Codice Fiscale generato casualmente.
-    """
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=16))
-
-
-def _genera_id_agenzia():
-    """
-    Genera un ID casuale per un'agenzia.
-
-    :return: str L'ID dell'agenzia generato casualmente.
-    """
-    return ''.join(random.choices(string.ascii_uppercase, k=3))
-
-
-def _genera_id_immobile():
-    """
-    Genera un ID casuale per un immobile.
-
-    :return: str L'ID dell'immobile generato casualmente.
-    """
-    return f"Casa_{random.randint(0, 1000)}"
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+FILE_TRANSAZIONI_CSV = 'files/transazioni.csv'
+LUNGHEZZA_CF = 16
+LUNGHEZZA_ID_AGENZIA = 3
+COLONNE_TRANSAZIONI = ['id_transazione', 'acquirente', 'venditore', 'agenzia', 'immobile', 'prezzo', 'data']
+FORMATI_TRANSAZIONI = ["csv", "csv.gz", "parquet"]
+SCHEMA_PARQUET_TRANSAZIONI = pa.schema([
+    ('id_transazione', pa.int64()),
+    ('acquirente', pa.dictionary(pa.int32(), pa.string())),
+    ('venditore', pa.dictionary(pa.int32(), pa.string())),
+    ('agenzia', pa.dictionary(pa.int32(), pa.string())),
+    ('immobile', pa.dictionary(pa.int32(), pa.string())),
+    ('prezzo', pa.int64()),
+    ('data', pa.timestamp('ms')),
+])
+# Numero medio di transazioni per blocco nella generazione vettoriale
+DIMENSIONE_BLOCCO = 1_000_000
+# Chiavi con cui si derivano dal seed i semi di utenti e agenzie, della ripartizione in blocchi e dei singoli blocchi
+SEME_ENTITA = 0
+SEME_RIPARTIZIONE = 1
+SEME_BLOCCHI = 2
 
 
 def _genera_data(data_ultima_transazione=None):
@@ -99,6 +104,17 @@ def _get_args():
     parser.add_argument('-u', '--numero_utenti', type=int, help='Numero di utenti da generare', required=True)
     parser.add_argument('-a', '--numero_agenzie', type=int, help='Numero di agenzie da generare', required=True)
     parser.add_argument('-nC', '--numero_case', type=int, help='Numero di case da generare', required=True)
+    parser.add_argument('-m', '--modalita', type=str, choices=["sequenziale", "vettoriale"], default="sequenziale",
+                        help='Modalità di generazione: una transazione alla volta o per catene di vendite vettoriali')
+    parser.add_argument('-s', '--seed', type=int, default=None, help='Seed per rendere riproducibile la generazione')
+    parser.add_argument('-p', '--processi', type=int, default=1,
+                        help='Numero di processi che generano i blocchi (solo in modalità vettoriale)')
+    parser.add_argument('-b', '--dimensione_blocco', type=int, default=DIMENSIONE_BLOCCO,
+                        help='Numero medio di transazioni per blocco (solo in modalità vettoriale)')
+    parser.add_argument('-d', '--data_finale', type=str, default=None,
+                        help='Data massima delle transazioni in formato AAAA-MM-GG (solo in modalità vettoriale)')
+    parser.add_argument('-f', '--formato', type=str, choices=FORMATI_TRANSAZIONI, default="csv",
+                        help='Formato del file delle transazioni')
 
     args = parser.parse_args()
 
@@ -110,78 +126,179 @@ def _get_args():
         parser.error("Il numero di case non può essere maggiore del numero di record")
     if args.numero_case > args.numero_utenti:
         parser.error("Il numero di case non può essere maggiore del numero di utenti")
+    if args.processi < 1:
+        parser.error("Il numero di processi deve essere almeno 1")
+    if args.processi > 1 and args.modalita != "vettoriale":
+        parser.error("La generazione su più processi è disponibile solo in modalità vettoriale")
+    if args.dimensione_blocco < 1:
+        parser.error("La dimensione dei blocchi deve essere almeno 1")
+    if args.processi > args.numero_case:
+        parser.error("Il numero di processi non può essere maggiore del numero di case")
+    if args.modalita == "vettoriale" and args.numero_utenti < 3:
+        parser.error("La modalità vettoriale richiede almeno 3 utenti")
+    if args.data_finale is not None:
+        if args.modalita != "vettoriale":
+            parser.error("La data finale è supportata solo in modalità vettoriale")
+        try:
+            data_finale = np.datetime64(args.data_finale, "D")
+        except ValueError:
+            parser.error(f"Data finale non valida: {args.data_finale}")
+        if data_finale <= np.datetime64("1920-12-31"):
+            parser.error("La data finale deve essere successiva al 1920")
 
     return args
 
 
-def _cerca_elemento_in_sottoliste(dizionario, elemento):
+class IndiceProprieta:
     """
-    Cerca un elemento all'interno delle sottoliste di un dizionario.
+    Indice delle proprietà delle case, con aggiornamenti e scelte casuali in tempo costante.
 
-    :param dizionario: Un dizionario le cui sottoliste verranno esaminate alla ricerca dell'elemento.
-    :type dizionario: dict
-    :param elemento: L'elemento da cercare all'interno delle sottoliste del dizionario.
-    :type elemento: Any
-    :return: True se l'elemento è presente in almeno una delle sottoliste, altrimenti False.
-    :rtype: bool
+    Tiene la mappa casa → proprietario, le case di ogni proprietario, l'elenco delle case non ancora assegnate e
+    l'elenco dei proprietari con almeno una casa. Gli elenchi sono liste accompagnate dalla posizione di ogni elemento,
+    per cui un elemento si rimuove scambiandolo con l'ultimo e una scelta casuale uniforme è un accesso per indice.
     """
-    for lista in dizionario.values():
-        if elemento in lista:
-            return True
-
-    return False
 
+    def __init__(self, case, case_utenti):
+        """
+        :param case: Sequenza delle case esistenti.
+        :param case_utenti: Dizionario che associa ogni utente alla lista delle case che possiede inizialmente. Una
+                            casa già assegnata a un altro utente viene ignorata.
+        """
+        self.proprietario = {}
+        self.case_utente = {}
+        self._posizione_casa = {}
+        self.proprietari = []
+        self._posizione_proprietario = {}
+        self.case_non_assegnate = []
+        self._posizione_non_assegnata = {}
+
+        for utente, case_iniziali in case_utenti.items():
+            for casa in case_iniziali:
+                if casa not in self.proprietario:
+                    self._assegna(casa, utente)
+
+        for casa in case:
+            if casa not in self.proprietario and casa not in self._posizione_non_assegnata:
+                _aggiungi(self.case_non_assegnate, self._posizione_non_assegnata, casa)
+
+    def sono_case_tutte_assegnate(self):
+        """
+        :return: True se tutte le case hanno un proprietario.
+        :rtype: bool
+        """
+        return not self.case_non_assegnate
+
+    def scegli_casa_assegnata(self):
+        """
+        Sceglie un proprietario a caso tra quelli con almeno una casa e una delle sue case.
+
+        :return: Una tupla (proprietario, casa), oppure (None, None) se nessuna casa è assegnata.
+        :rtype: tuple
+        """
+        if not self.proprietari:
+            return None, None
+
+        proprietario = random.choice(self.proprietari)
+        return proprietario, random.choice(self.case_utente[proprietario])
+
+    def scegli_casa_non_assegnata(self):
+        """
+        :return: Una casa a caso tra quelle senza proprietario, oppure None se sono tutte assegnate.
+        :rtype: str
+        """
+        return random.choice(self.case_non_assegnate) if self.case_non_assegnate else None
+
+    def trasferisci(self, casa, acquirente):
+        """
+        Trasferisce una casa al nuovo proprietario, togliendola al precedente o dalle case non assegnate.
+
+        :param casa: La casa venduta.
+        :param acquirente: Il nuovo proprietario.
+        """
+        proprietario = self.proprietario.get(casa)
+        if proprietario is None:
+            _rimuovi(self.case_non_assegnate, self._posizione_non_assegnata, casa)
+        else:
+            case_proprietario = self.case_utente[proprietario]
+            _rimuovi(case_proprietario, self._posizione_casa, casa)
+            if not case_proprietario:
+                del self.case_utente[proprietario]
+                _rimuovi(self.proprietari, self._posizione_proprietario, proprietario)
+
+        self._assegna(casa, acquirente)
+
+    def _assegna(self, casa, utente):
+        """
+        Registra una casa senza proprietario come posseduta da un utente.
+
+        :param casa: La casa da assegnare.
+        :param utente: Il proprietario.
+        """
+        self.proprietario[casa] = utente
+        if utente not in self.case_utente:
+            self.case_utente[utente] = []
+            _aggiungi(self.proprietari, self._posizione_proprietario, utente)
+        _aggiungi(self.case_utente[utente], self._posizione_casa, casa)
+
+
+def _aggiungi(elenco, posizioni, elemento):
+    """
+    Aggiunge un elemento in fondo a una lista, registrandone la posizione.
 
-def _sono_case_tutte_assegnate(case, case_utenti):
+    :param elenco: La lista.
+    :param posizioni: Dizionario elemento → posizione nella lista.
+    :param elemento: L'elemento da aggiungere.
     """
-    Verifica se tutte le case nella lista sono state assegnate agli utenti.
+    posizioni[elemento] = len(elenco)
+    elenco.append(elemento)
+
 
-    :param case: Una lista di case da controllare.
-    :type case: list
-    :param case_utenti: Un dizionario che associa ogni venditore alle case che ha in vendita.
-    :type case_utenti: dict
-    :return: True se tutte le case sono assegnate, altrimenti False.
-    :rtype: bool
+def _rimuovi(elenco, posizioni, elemento):
     """
-    for casa in case:
-        if not _cerca_elemento_in_sottoliste(case_utenti, casa):
-            return False
+    Rimuove un elemento da una lista in tempo costante, spostando l'ultimo elemento al suo posto.
 
-    return True
+    :param elenco: La lista.
+    :param posizioni: Dizionario elemento → posizione nella lista.
+    :param elemento: L'elemento da rimuovere.
+    """
+    posizione = posizioni.pop(elemento)
+    ultimo = elenco.pop()
+    if ultimo != elemento:
+        elenco[posizione] = ultimo
+        posizioni[ultimo] = posizione
 
 
-def _scegli_venditore_e_casa(case, case_utenti, utenti):
+def _scegli_venditore_e_casa(indice_proprieta, utenti):
     """
     Seleziona un venditore e una casa, basandosi sulle assegnazioni attuali e una probabilità casuale.
 
-    :param case: Una lista di case disponibili.
-    :type case: list
-    :param case_utenti: Un dizionario che associa ogni venditore alle case che ha in vendita.
-    :type case_utenti: dict
+    Con probabilità dell'80%, o sempre se tutte le case sono assegnate, vende un proprietario scelto a caso tra quelli
+    con almeno una casa; altrimenti un utente qualsiasi vende una casa non ancora assegnata.
+
+    :param indice_proprieta: L'indice delle proprietà delle case.
+    :type indice_proprieta: IndiceProprieta
     :param utenti: Una lista di utenti tra cui scegliere il venditore.
     :type utenti: list
-    :return: Una tupla contenente il venditore selezionato e la casa corrispondente.
+    :return: Una tupla contenente il venditore selezionato e la casa corrispondente, oppure (None, None) se non ci
+             sono case.
     :rtype: tuple
     """
-    if _sono_case_tutte_assegnate(case, case_utenti) or random.random() < 0.8 or len(case) == 0:
-        while True:
-            venditore, case_utente = random.choice(list(case_utenti.items()))
-            if case_utente:
-                casa = random.choice(case_utente)
-                break
-    else:
-        venditore = random.choice(utenti)
-        while True:
-            casa = random.choice(case)
-            if not _cerca_elemento_in_sottoliste(case_utenti, casa):
-                break
+    if indice_proprieta.sono_case_tutte_assegnate() or random.random() < 0.8 or not indice_proprieta.proprietari:
+        venditore, casa = indice_proprieta.scegli_casa_assegnata()
+        if casa is not None:
+            return venditore, casa
+
+    casa = indice_proprieta.scegli_casa_non_assegnata()
+    if casa is None:
+        return None, None
 
-        print(f"Venditore: {venditore}, casa: {casa}")
+    venditore = random.choice(utenti)
+    logging.debug(f"Venditore: {venditore}, casa: {casa}")
 
     return venditore, casa
 
 
-def _scegli_acquirente(venditore, utenti, transazioni_casa):
+def _scegli_acquirente(venditore, utenti, ultimo_venditore=None):
     """
     Seleziona un acquirente diverso dal venditore, che non sia l'ultimo venditore della casa.
 
@@ -189,49 +306,545 @@ def _scegli_acquirente(venditore, utenti, transazioni_casa):
     :type venditore: str
     :param utenti: Una lista di utenti tra cui scegliere l'acquirente.
     :type utenti: list
-    :param transazioni_casa: DataFrame delle transazioni per una specifica casa.
-    :type transazioni_casa: pd.DataFrame
+    :param ultimo_venditore: Il venditore dell'ultima transazione della casa, oppure None se la casa non è mai stata
+                             venduta.
+    :type ultimo_venditore: str
     :return: L'acquirente selezionato per la transazione.
     :rtype: str
     """
-    ultima_transazione = transazioni_casa.groupby('immobile').last()
-    if ultima_transazione.empty:
-        ultimo_venditore = None
-    else:
-        ultimo_venditore = ultima_transazione['venditore'].iloc[0]
-
     while True:
         acquirente = random.choice(utenti)
-        if acquirente != venditore:
-            if len(ultima_transazione) == 0 or ultimo_venditore != acquirente:
-                return acquirente
+        if acquirente != venditore and acquirente != ultimo_venditore:
+            return acquirente
 
 
-def _calcola_prezzo_e_data(transazioni, casa):
+def _calcola_prezzo_e_data(ultima_transazione=None):
     """
-    Calcola il prezzo e la data dell'ultima transazione per una determinata casa.
+    Calcola il prezzo di una nuova transazione per una casa e restituisce la data della sua ultima transazione.
 
-    :param transazioni: DataFrame contenente le transazioni immobiliari.
-    :type transazioni: pd.DataFrame
-    :param casa: La casa per cui calcolare il prezzo e la data dell'ultima transazione.
-    :type casa: str
+    :param ultima_transazione: Tupla (prezzo, data, venditore) dell'ultima transazione della casa, oppure None se la
+                               casa non è mai stata venduta.
+    :type ultima_transazione: tuple
     :return: Il prezzo calcolato e la data dell'ultima transazione (se presente).
     :rtype: tuple
     """
-    transazioni_casa = transazioni[transazioni['immobile'] == casa]
-    if len(transazioni_casa) == 0:
+    if ultima_transazione is None:
         prezzo = random.randint(100000, 10000000)
         data_ultima_transazione = None
     else:
-        ultima_transazione = transazioni_casa.groupby('immobile').last()
-        prezzo_ultima_transazione = ultima_transazione['prezzo'].iloc[0]
-        data_ultima_transazione = ultima_transazione['data'].iloc[0]
+        prezzo_ultima_transazione, data_ultima_transazione, _ = ultima_transazione
         variazione_percentuale = random.uniform(-0.30, 0.30)
         prezzo = round(prezzo_ultima_transazione * (1 + variazione_percentuale))
 
     return prezzo, data_ultima_transazione
 
 
+def _genera_transazioni_sequenziale(numero_record, numero_utenti, numero_agenzie, numero_case, rng):
+    """
+    Genera le transazioni una alla volta, scegliendo a ogni passo venditore, casa e acquirente.
+
+    Utenti, agenzie e case sono rappresentati dal loro numero nelle tabelle dei codici, convertite in colonne
+    categoriche solo alla fine. Lo stato dell'ultima transazione di ogni casa (prezzo, data e venditore) è tenuto in
+    un dizionario e le righe sono raccolte in array preallocati per colonna, mentre le proprietà delle case sono
+    tenute in un `IndiceProprieta`: ogni record costa un tempo costante indipendente dal numero di transazioni già
+    generate, di utenti e di case.
+
+    :param numero_record: Numero di transazioni da generare.
+    :param numero_utenti: Numero di utenti.
+    :param numero_agenzie: Numero di agenzie.
+    :param numero_case: Numero di case.
+    :param rng: Generatore di numeri casuali NumPy per le tabelle dei codici.
+    :return: DataFrame delle transazioni, con le colonne `COLONNE_TRANSAZIONI`.
+    :rtype: pd.DataFrame
+    """
+    codici_utenti, codici_agenzie = genera_entita(rng, numero_utenti, numero_agenzie)
+    codici_case = genera_case(numero_case)
+    utenti = range(numero_utenti)
+    case = range(numero_case)
+
+    # Metà degli utenti possiede inizialmente una casa
+    case_univoche = random.sample(case, min(numero_utenti // 2, numero_case))
+    case_utenti = {utente: [casa] for utente, casa in enumerate(case_univoche)}
+    indice_proprieta = IndiceProprieta(case, case_utenti)
+
+    # Stato dell'ultima transazione di ogni casa: (prezzo, data, venditore)
+    ultime_transazioni = {}
+    # Array delle colonne, preallocati e convertiti in DataFrame una sola volta alla fine
+    acquirenti = np.empty(numero_record, dtype=np.int64)
+    venditori = np.empty(numero_record, dtype=np.int64)
+    agenzie = np.empty(numero_record, dtype=np.int64)
+    immobili = np.empty(numero_record, dtype=np.int64)
+    prezzi = np.empty(numero_record, dtype=np.int64)
+    date = np.empty(numero_record, dtype="datetime64[s]")
+    numero_transazioni = 0
+
+    for i in range(numero_record):
+        venditore, casa = _scegli_venditore_e_casa(indice_proprieta, utenti)
+        if casa is None:
+            logging.warning("Non ci sono case disponibili")
+            break
+
+        ultima_transazione = ultime_transazioni.get(casa)
+        ultimo_venditore = ultima_transazione[2] if ultima_transazione is not None else None
+        acquirente = _scegli_acquirente(venditore, utenti, ultimo_venditore)
+        prezzo, data_ultima_transazione = _calcola_prezzo_e_data(ultima_transazione)
+        data = _genera_data(data_ultima_transazione)
+
+        indice_proprieta.trasferisci(casa, acquirente)
+
+        ultime_transazioni[casa] = (prezzo, data, venditore)
+        acquirenti[i], venditori[i], immobili[i], prezzi[i], date[i] = acquirente, venditore, casa, prezzo, data
+        agenzie[i] = random.randrange(numero_agenzie)
+        numero_transazioni += 1
+
+    return pd.DataFrame({
+        'id_transazione': np.arange(numero_transazioni),
+        'acquirente': pd.Categorical.from_codes(acquirenti[:numero_transazioni], codici_utenti),
+        'venditore': pd.Categorical.from_codes(venditori[:numero_transazioni], codici_utenti),
+        'agenzia': pd.Categorical.from_codes(agenzie[:numero_transazioni], codici_agenzie),
+        'immobile': pd.Categorical.from_codes(immobili[:numero_transazioni], codici_case),
+        'prezzo': prezzi[:numero_transazioni],
+        'data': date[:numero_transazioni],
+    })
+
+
+def _codifica(numeri, alfabeto, lunghezza):
+    """
+    Scrive dei numeri interi non negativi in base `len(alfabeto)`, con le cifre prese dall'alfabeto.
+
+    :param numeri: Array NumPy di interi minori di `len(alfabeto) ** lunghezza`.
+    :param alfabeto: Caratteri usati come cifre.
+    :param lunghezza: Numero di cifre di ogni codice.
+    :return: Array NumPy di stringhe di lunghezza fissa.
+    :rtype: np.ndarray
+    """
+    cifre = np.empty((len(numeri), lunghezza), dtype=np.int64)
+    resto = np.asarray(numeri, dtype=np.int64)
+    for posizione in range(lunghezza - 1, -1, -1):
+        resto, cifre[:, posizione] = np.divmod(resto, len(alfabeto))
+
+    return np.ascontiguousarray(np.array(list(alfabeto))[cifre]).view(f"<U{lunghezza}").ravel()
+
+
+def _genera_codici_univoci(rng, numero, alfabeto, lunghezza):
+    """
+    Genera codici casuali distinti di lunghezza fissa.
+
+    Se i codici possibili sono rappresentabili come interi a 64 bit se ne estraggono `numero` senza ripetizione e
+    li si scrive con `_codifica`; altrimenti (ad esempio i codici fiscali, con 36^16 valori) si estraggono i
+    caratteri e si ripete l'estrazione dei rari duplicati.
+
+    :param rng: Generatore di numeri casuali NumPy.
+    :param numero: Numero di codici da generare.
+    :param alfabeto: Caratteri ammessi.
+    :param lunghezza: Lunghezza di ogni codice.
+    :return: Array NumPy di stringhe distinte.
+    :rtype: np.ndarray
+    :raises ValueError: Se i codici possibili sono meno di quelli richiesti.
+    """
+    codici_possibili = len(alfabeto) ** lunghezza
+    if codici_possibili < numero:
+        raise ValueError(f"Non esistono {numero} codici distinti di {lunghezza} caratteri")
+
+    if codici_possibili < 2 ** 63:
+        return _codifica(rng.choice(codici_possibili, numero, replace=False), alfabeto, lunghezza)
+
+    caratteri = np.array(list(alfabeto))
+    codici = np.empty(0, dtype=f"<U{lunghezza}")
+    while len(codici) < numero:
+        estratti = caratteri[rng.integers(0, len(caratteri), (numero - len(codici), lunghezza))]
+        codici = np.concatenate([codici, np.ascontiguousarray(estratti).view(f"<U{lunghezza}").ravel()])
+        # Tiene la prima occorrenza di ogni codice, nell'ordine di estrazione
+        _, primi = np.unique(codici, return_index=True)
+        codici = codici[np.sort(primi)]
+
+    return codici
+
+
+def _estrai_acquirenti(rng, numero_utenti, venditori, ultimi_venditori):
+    """
+    Estrae un acquirente per ogni vendita, diverso dal venditore e dall'ultimo venditore della casa, come
+    `_scegli_acquirente`: le estrazioni non valide vengono ripetute finché non ne restano.
+
+    :param rng: Generatore di numeri casuali NumPy.
+    :param numero_utenti: Numero di utenti.
+    :param venditori: Codici dei venditori.
+    :param ultimi_venditori: Codici degli ultimi venditori delle case, -1 se la casa non è mai stata venduta.
+    :return: Codici degli acquirenti.
+    :rtype: np.ndarray
+    """
+    acquirenti = rng.integers(0, numero_utenti, len(venditori))
+    non_validi = np.flatnonzero((acquirenti == venditori) | (acquirenti == ultimi_venditori))
+    while len(non_validi):
+        acquirenti[non_validi] = rng.integers(0, numero_utenti, len(non_validi))
+        ancora = (acquirenti[non_validi] == venditori[non_validi]) | \
+                 (acquirenti[non_validi] == ultimi_venditori[non_validi])
+        non_validi = non_validi[ancora]
+
+    return acquirenti
+
+
+def genera_entita(rng, numero_utenti, numero_agenzie):
+    """
+    Genera le tabelle dei codici fiscali degli utenti e degli ID delle agenzie, tutti distinti.
+
+    Le transazioni si riferiscono a utenti e agenzie con il numero della loro riga in queste tabelle, per cui ogni
+    codice esiste in memoria una sola volta. I codici fiscali hanno 16 caratteri alfanumerici; gli ID delle agenzie
+    hanno 3 lettere finché bastano, altrimenti il minimo numero di lettere sufficiente.
+
+    :param rng: Generatore di numeri casuali NumPy.
+    :param numero_utenti: Numero di utenti.
+    :param numero_agenzie: Numero di agenzie.
+    :return: Una tupla (utenti, agenzie) di array NumPy di stringhe.
+    :rtype: tuple
+    """
+    lunghezza_id_agenzia = LUNGHEZZA_ID_AGENZIA
+    while len(string.ascii_uppercase) ** lunghezza_id_agenzia < numero_agenzie:
+        lunghezza_id_agenzia += 1
+
+    utenti = _genera_codici_univoci(rng, numero_utenti, string.ascii_uppercase + string.digits, LUNGHEZZA_CF)
+    agenzie = _genera_codici_univoci(rng, numero_agenzie, string.ascii_uppercase, lunghezza_id_agenzia)
+
+    return utenti, agenzie
+
+
+def genera_case(numero_case, prima_casa=0):
+    """
+    Genera la tabella degli ID delle case, numerati in sequenza e quindi distinti per qualsiasi numero di case.
+
+    :param numero_case: Numero di case.
+    :param prima_casa: Numero della prima casa.
+    :return: Array NumPy di stringhe `Casa_<numero>`.
+    :rtype: np.ndarray
+    """
+    return np.char.add("Casa_", np.arange(prima_casa, prima_casa + numero_case).astype(str))
+
+
+def genera_transazioni_vettoriale(numero_record, numero_case, utenti, agenzie, rng, prima_casa=0,
+                                  primo_id_transazione=0, data_finale=None):
+    """
+    Genera le transazioni simulando in forma vettoriale la catena di vendite di ogni casa.
+
+    Il numero di vendite di ogni casa è estratto con una multinomiale uniforme. Le case sono ordinate per numero di
+    vendite decrescente, per cui al passo k le case con almeno k + 1 vendite sono le prime: ogni passo calcola con
+    operazioni NumPy la k-esima vendita di tutte queste case, con le stesse regole del generatore sequenziale. La
+    prima vendita avviene tra il 1900 e il 1920 a un prezzo tra 100.000 e 10.000.000; ogni vendita successiva avviene
+    con probabilità del 90% tra 5 e 10 anni dopo la precedente (se l'intervallo non supera `data_finale`) e
+    altrimenti in un giorno qualsiasi fino a `data_finale`, con un prezzo che varia del ±30% rispetto al precedente.
+    Il venditore di ogni vendita è l'acquirente della precedente e il primo venditore è un utente a caso.
+
+    Le transazioni sono ordinate per data e utenti, agenzie e case sono colonne categoriche, per cui la memoria
+    richiesta è di poche decine di byte per transazione.
+
+    Le case sono numerate a partire da `prima_casa` e le transazioni da `primo_id_transazione`, per cui più parti
+    generate indipendentemente su intervalli disgiunti hanno ID distinti.
+
+    :param numero_record: Numero di transazioni da generare.
+    :param numero_case: Numero di case.
+    :param utenti: Codici degli utenti, almeno 3, come restituiti da `genera_entita`.
+    :param agenzie: Codici delle agenzie, come restituiti da `genera_entita`.
+    :param rng: Generatore di numeri casuali NumPy, unica sorgente di casualità.
+    :param prima_casa: Numero della prima casa.
+    :param primo_id_transazione: ID della prima transazione.
+    :param data_finale: Data massima delle transazioni, successiva al 1920 (data o stringa ISO). Se None, la data
+                        odierna: il risultato dipende allora anche dal giorno in cui viene generato.
+    :return: DataFrame delle transazioni, con le colonne `COLONNE_TRANSAZIONI`.
+    :rtype: pd.DataFrame
+    """
+    numero_utenti = len(utenti)
+    vendite_per_casa = rng.multinomial(numero_record, np.full(numero_case, 1 / numero_case))
+    ordine_case = np.argsort(-vendite_per_casa, kind="stable")
+    vendite_per_casa = vendite_per_casa[ordine_case]
+    inizio_case = np.concatenate([[0], np.cumsum(vendite_per_casa)[:-1]])
+
+    immobili = np.repeat(ordine_case, vendite_per_casa)
+    venditori = np.empty(numero_record, dtype=np.int64)
+    acquirenti = np.empty(numero_record, dtype=np.int64)
+    prezzi = np.empty(numero_record, dtype=np.int64)
+    giorni = np.empty(numero_record, dtype=np.int64)
+
+    oggi = np.datetime64("today" if data_finale is None else data_finale, "D").astype(np.int64)
+    inizio_periodo_iniziale = np.datetime64("1900-01-01", "D").astype(np.int64)
+    fine_periodo_iniziale = np.datetime64("1920-12-31", "D").astype(np.int64)
+    cinque_anni = 5 * 365
+
+    # Il numero di case attive al passo k è il numero di case con più di k vendite
+    case_attive = np.searchsorted(-vendite_per_casa, -np.arange(vendite_per_casa.max(initial=0)), side="left")
+    ultimi_venditori = np.full(numero_case, -1, dtype=np.int64)
+    for passo, numero_attive in enumerate(case_attive):
+        posizioni = inizio_case[:numero_attive] + passo
+        if passo == 0:
+            venditori[posizioni] = rng.integers(0, numero_utenti, numero_attive)
+            prezzi[posizioni] = rng.integers(100000, 10000000, numero_attive, endpoint=True)
+            giorni[posizioni] = rng.integers(inizio_periodo_iniziale, fine_periodo_iniziale, numero_attive,
+                                             endpoint=True)
+        else:
+            precedenti = posizioni - 1
+            venditori[posizioni] = acquirenti[precedenti]
+            variazioni = rng.uniform(-0.30, 0.30, numero_attive)
+            prezzi[posizioni] = np.rint(prezzi[precedenti] * (1 + variazioni)).astype(np.int64)
+
+            ultime_date = giorni[precedenti]
+            nell_intervallo = (ultime_date + 2 * cinque_anni <= oggi) & (rng.random(numero_attive) < 0.9)
+            giorni[posizioni] = np.where(
+                nell_intervallo,
+                ultime_date + cinque_anni + rng.integers(0, cinque_anni, numero_attive, endpoint=True),
+                ultime_date + rng.integers(0, oggi - ultime_date, endpoint=True),
+            )
+
+        acquirenti[posizioni] = _estrai_acquirenti(rng, numero_utenti, venditori[posizioni],
+                                                   ultimi_venditori[:numero_attive])
+        ultimi_venditori[:numero_attive] = venditori[posizioni]
+
+    codici_agenzie = rng.integers(0, len(agenzie), numero_record)
+    ordine = np.argsort(giorni, kind="stable")
+    case = genera_case(numero_case, prima_casa)
+
+    return pd.DataFrame({
+        'id_transazione': np.arange(primo_id_transazione, primo_id_transazione + numero_record),
+        'acquirente': pd.Categorical.from_codes(acquirenti[ordine], utenti),
+        'venditore': pd.Categorical.from_codes(venditori[ordine], utenti),
+        'agenzia': pd.Categorical.from_codes(codici_agenzie, agenzie),
+        'immobile': pd.Categorical.from_codes(immobili[ordine], case),
+        'prezzo': prezzi[ordine],
+        'data': giorni[ordine].astype("datetime64[D]"),
+    })
+
+
+@functools.lru_cache(maxsize=1)
+def _get_entita(seed, numero_utenti, numero_agenzie):
+    """
+    Restituisce utenti e agenzie generati dal seme comune, calcolandoli una sola volta per processo.
+
+    :param seed: Entropia della generazione.
+    :param numero_utenti: Numero di utenti.
+    :param numero_agenzie: Numero di agenzie.
+    :return: Una tupla (utenti, agenzie), come restituita da `genera_entita`.
+    :rtype: tuple
+    """
+    seme_entita = np.random.SeedSequence(seed, spawn_key=(SEME_ENTITA,))
+    return genera_entita(np.random.default_rng(seme_entita), numero_utenti, numero_agenzie)
+
+
+def _scrivi_blocco(transazioni, percorso, formato):
+    """
+    Scrive un blocco di transazioni senza intestazione, con un nome temporaneo rinominato solo a scrittura completata:
+    un blocco interrotto non viene mai scambiato per un blocco completo.
+
+    :param transazioni: DataFrame del blocco.
+    :param percorso: Percorso del file del blocco.
+    :param formato: Uno tra `FORMATI_TRANSAZIONI`.
+    """
+    percorso_temporaneo = f"{percorso}.tmp"
+    if formato == "parquet":
+        # Le categorie sono tutti gli utenti e tutte le case: senza restringerle ogni row group del file finale
+        # conterrebbe i dizionari completi
+        categoriche = transazioni.select_dtypes("category").columns
+        transazioni = transazioni.assign(**{colonna: transazioni[colonna].cat.remove_unused_categories()
+                                            for colonna in categoriche})
+        tabella = pa.Table.from_pandas(transazioni, preserve_index=False).cast(SCHEMA_PARQUET_TRANSAZIONI)
+        pq.write_table(tabella, percorso_temporaneo)
+    else:
+        transazioni.to_csv(percorso_temporaneo, index=False, header=False,
+                           compression="gzip" if formato == "csv.gz" else None)
+    os.replace(percorso_temporaneo, percorso)
+
+
+def _genera_blocco(percorso_blocco, formato, blocco, numero_record, numero_case, prima_casa, primo_id_transazione,
+                   numero_utenti, numero_agenzie, seed, data_finale):
+    """
+    Genera un blocco di transazioni e lo scrive su disco. Può essere eseguita in un processo separato.
+
+    Utenti e agenzie sono generati in ogni processo dallo stesso seme, per cui tutti i blocchi usano gli stessi codici
+    senza doverli scambiare.
+
+    :param percorso_blocco: Percorso del file del blocco.
+    :param formato: Uno tra `FORMATI_TRANSAZIONI`.
+    :param blocco: Numero del blocco, da cui deriva il suo seme.
+    :param numero_record: Numero di transazioni del blocco.
+    :param numero_case: Numero di case del blocco.
+    :param prima_casa: Numero della prima casa del blocco.
+    :param primo_id_transazione: ID della prima transazione del blocco.
+    :param numero_utenti: Numero di utenti complessivo.
+    :param numero_agenzie: Numero di agenzie complessivo.
+    :param seed: Entropia della generazione.
+    :param data_finale: Data massima delle transazioni, in formato ISO.
+    :return: Il numero di transazioni scritte.
+    :rtype: int
+    """
+    utenti, agenzie = _get_entita(seed, numero_utenti, numero_agenzie)
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(SEME_BLOCCHI, blocco)))
+    transazioni = genera_transazioni_vettoriale(numero_record, numero_case, utenti, agenzie, rng, prima_casa,
+                                                primo_id_transazione, data_finale)
+    _scrivi_blocco(transazioni, percorso_blocco, formato)
+
+    return numero_record
+
+
+def _unisci_blocchi(percorsi_blocchi, percorso, formato):
+    """
+    Unisce i file dei blocchi nel file finale, leggendone uno alla volta. I file CSV, anche compressi, sono
+    concatenati byte per byte dopo l'intestazione; ogni blocco Parquet diventa un row group del file finale.
+
+    :param percorsi_blocchi: Percorsi dei file dei blocchi, nell'ordine in cui unirli.
+    :param percorso: Percorso del file finale.
+    :param formato: Uno tra `FORMATI_TRANSAZIONI`.
+    """
+    percorso_temporaneo = f"{percorso}.tmp"
+    if formato == "parquet":
+        with pq.ParquetWriter(percorso_temporaneo, SCHEMA_PARQUET_TRANSAZIONI) as writer:
+            for percorso_blocco in percorsi_blocchi:
+                writer.write_table(pq.read_table(percorso_blocco))
+    else:
+        intestazione = (",".join(COLONNE_TRANSAZIONI) + "\n").encode("utf-8")
+        with open(percorso_temporaneo, "wb") as file_finale:
+            # Un file gzip può contenere più membri concatenati, per cui anche l'intestazione è un membro a sé
+            file_finale.write(gzip.compress(intestazione) if formato == "csv.gz" else intestazione)
+            for percorso_blocco in percorsi_blocchi:
+                with open(percorso_blocco, "rb") as file_blocco:
+                    shutil.copyfileobj(file_blocco, file_finale)
+    os.replace(percorso_temporaneo, percorso)
+
+
+def _prepara_directory_blocchi(directory_blocchi, parametri, seed, data_finale):
+    """
+    Prepara la directory dei blocchi. Se contiene una generazione interrotta con gli stessi parametri, la riprende
+    con lo stesso seme e la stessa data finale; altrimenti la svuota e registra i parametri, il seme e la data finale
+    della nuova generazione. La data finale viene fissata una sola volta, per cui una generazione ripresa in un altro
+    giorno non mescola blocchi generati con date massime diverse.
+
+    :param directory_blocchi: Directory dei file dei blocchi.
+    :param parametri: Dizionario dei parametri che determinano il risultato, escluso il seed.
+    :param seed: Seed richiesto, oppure None per riprendere una generazione interrotta o sceglierne uno a caso.
+    :param data_finale: Data massima richiesta in formato ISO, oppure None per riprendere una generazione interrotta o
+                        usare la data odierna.
+    :return: Tupla (entropia, data finale in formato ISO) della generazione.
+    :rtype: tuple
+    """
+    percorso_parametri = os.path.join(directory_blocchi, "parametri.json")
+    try:
+        with open(percorso_parametri, encoding="utf-8") as file_parametri:
+            salvati = json.load(file_parametri)
+    except (OSError, ValueError):
+        salvati = None
+
+    if salvati is not None and salvati["parametri"] == parametri and seed in (None, salvati["seed"]) and \
+            "data_finale" in salvati and data_finale in (None, salvati["data_finale"]):
+        logging.info(f"Ripresa della generazione interrotta in {directory_blocchi}")
+        return salvati["seed"], salvati["data_finale"]
+
+    shutil.rmtree(directory_blocchi, ignore_errors=True)
+    os.makedirs(directory_blocchi)
+    seed = np.random.SeedSequence(seed).entropy
+    data_finale = str(np.datetime64("today" if data_finale is None else data_finale, "D"))
+    with open(percorso_parametri, "w", encoding="utf-8") as file_parametri:
+        json.dump({"parametri": parametri, "seed": seed, "data_finale": data_finale}, file_parametri)
+
+    return seed, data_finale
+
+
+def _registra_avanzamento(risultati, numero_blocchi, transazioni_da_generare):
+    """
+    Consuma i risultati dei blocchi man mano che sono completati, registrando avanzamento e velocità.
+
+    :param risultati: Iterabile del numero di transazioni di ogni blocco completato.
+    :param numero_blocchi: Numero di blocchi da completare.
+    :param transazioni_da_generare: Numero di transazioni da generare.
+    """
+    inizio = time.perf_counter()
+    generate = 0
+    for completati, numero_transazioni in enumerate(risultati, start=1):
+        generate += numero_transazioni
+        durata = time.perf_counter() - inizio
+        logging.info(f"Blocco {completati}/{numero_blocchi}: {generate}/{transazioni_da_generare} transazioni, "
+                     f"{generate / durata:,.0f} transazioni/s")
+
+
+def genera_transazioni_a_blocchi(numero_record, numero_utenti, numero_agenzie, numero_case, percorso,
+                                 formato="csv", dimensione_blocco=DIMENSIONE_BLOCCO, numero_processi=1, seed=None,
+                                 data_finale=None):
+    """
+    Genera le transazioni in modalità vettoriale a blocchi di case e le scrive su disco, con memoria indipendente dal
+    numero di transazioni.
+
+    Le case sono divise in blocchi contigui con in media `dimensione_blocco` transazioni ciascuno: il numero di blocchi
+    dipende solo da numero di transazioni, numero di case e dimensione dei blocchi, e i processi si limitano a
+    prelevare i blocchi da generare da questo elenco fisso. Ogni blocco ha un proprio seme derivato da `seed` e un
+    intervallo disgiunto di case e di ID delle transazioni calcolato in anticipo, per cui i blocchi possono essere
+    generati in qualsiasi ordine, anche da `numero_processi` processi in parallelo, con ID univoci e un risultato che
+    dipende solo dal seed, dalla data finale e dalla dimensione dei blocchi, non dal numero di processi. La data
+    finale, se non indicata, è quella del giorno in cui la generazione inizia. Ogni blocco è ordinato
+    per data e scritto in un proprio file nella directory `<percorso>.blocchi`; al termine i blocchi sono uniti nel
+    file finale e la directory viene eliminata. Se la generazione si interrompe, rieseguirla con gli stessi parametri
+    riprende dal primo blocco non completato.
+
+    :param numero_record: Numero di transazioni da generare.
+    :param numero_utenti: Numero di utenti, almeno 3.
+    :param numero_agenzie: Numero di agenzie.
+    :param numero_case: Numero di case.
+    :param percorso: Percorso del file finale.
+    :param formato: Uno tra `FORMATI_TRANSAZIONI`.
+    :param dimensione_blocco: Numero medio di transazioni per blocco.
+    :param numero_processi: Numero di processi che generano i blocchi.
+    :param seed: Seed dei numeri casuali, oppure None.
+    :param data_finale: Data massima delle transazioni (data o stringa ISO), oppure None per la data odierna.
+    """
+    directory_blocchi = f"{percorso}.blocchi"
+    numero_blocchi = min(numero_case, max(1, math.ceil(numero_record / dimensione_blocco)))
+    parametri = {
+        "numero_record": numero_record,
+        "numero_utenti": numero_utenti,
+        "numero_agenzie": numero_agenzie,
+        "numero_case": numero_case,
+        "formato": formato,
+        "dimensione_blocco": dimensione_blocco,
+        # Ridondante con i parametri precedenti, ma impedisce di riprendere una directory divisa in altro modo
+        "numero_blocchi": numero_blocchi,
+    }
+    seed, data_finale = _prepara_directory_blocchi(directory_blocchi, parametri, seed, data_finale)
+
+    case_per_blocco = np.full(numero_blocchi, numero_case // numero_blocchi)
+    case_per_blocco[:numero_case % numero_blocchi] += 1
+    rng_ripartizione = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(SEME_RIPARTIZIONE,)))
+    record_per_blocco = rng_ripartizione.multinomial(numero_record, case_per_blocco / numero_case)
+    prime_case = np.concatenate([[0], np.cumsum(case_per_blocco)[:-1]])
+    primi_id = np.concatenate([[0], np.cumsum(record_per_blocco)[:-1]])
+    percorsi_blocchi = [os.path.join(directory_blocchi, f"blocco_{blocco:06d}.{formato}")
+                        for blocco in range(numero_blocchi)]
+
+    da_generare = [blocco for blocco in range(numero_blocchi) if not os.path.exists(percorsi_blocchi[blocco])]
+    transazioni_da_generare = int(record_per_blocco[da_generare].sum())
+    logging.info(f"{numero_blocchi} blocchi, {numero_blocchi - len(da_generare)} già completati, "
+                 f"{transazioni_da_generare} transazioni da generare")
+
+    argomenti = [
+        (percorsi_blocchi[blocco], formato, blocco, int(record_per_blocco[blocco]), int(case_per_blocco[blocco]),
+         int(prime_case[blocco]), int(primi_id[blocco]), numero_utenti, numero_agenzie, seed, data_finale)
+        for blocco in da_generare
+    ]
+    if numero_processi > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=numero_processi) as executor:
+            futures = [executor.submit(_genera_blocco, *argomenti_blocco) for argomenti_blocco in argomenti]
+            _registra_avanzamento((future.result() for future in concurrent.futures.as_completed(futures)),
+                                  len(argomenti), transazioni_da_generare)
+    else:
+        _registra_avanzamento((_genera_blocco(*argomenti_blocco) for argomenti_blocco in argomenti), len(argomenti),
+                              transazioni_da_generare)
+
+    _unisci_blocchi(percorsi_blocchi, percorso, formato)
+    shutil.rmtree(directory_blocchi)
+    logging.info(f"Transazioni scritte in {percorso}")
+
+
+def get_percorso_transazioni(formato):
+    """
+    :param formato: Uno tra `FORMATI_TRANSAZIONI`.
+    :return: Il percorso del file delle transazioni nel formato richiesto.
+    :rtype: str
+    """
+    return f"{os.path.splitext(FILE_TRANSAZIONI_CSV)[0]}.{formato}"
+
+
 def main():
     """
     Funzione principale per generare un file CSV contenente informazioni sulle transazioni.
@@ -245,49 +858,25 @@ def main():
     numero_utenti = int(args.numero_utenti)
     numero_agenzie = int(args.numero_agenzie)
     numero_case = int(args.numero_case)
+    percorso = get_percorso_transazioni(args.formato)
 
-    # Generazione case
-    case = [_genera_id_immobile() for _ in range(numero_case)]
-
-    # Generazione utenti
-    utenti = [_genera_cf() for _ in range(numero_utenti)]
-    case_univoche = random.sample(case, numero_utenti // 2)
-    case_utenti = {utenti[i]: [case_univoche[i]] for i in range(numero_utenti // 2)}
-
-    # Generazione agenzie
-    agenzie = [_genera_id_agenzia() for _ in range(numero_agenzie)]
-
-    transazioni = pd.DataFrame(
-        columns=['id_transazione', 'acquirente', 'venditore', 'agenzia', 'immobile', 'prezzo', 'data']
-    )
-
-    for i in range(numero_record):
-        venditore, casa = _scegli_venditore_e_casa(case, case_utenti, utenti)
-        transazioni_casa = transazioni[transazioni['immobile'] == casa]
-        if casa is None:
-            logging.warning("Non ci sono case disponibili")
-            break
+    if args.modalita == "vettoriale":
+        genera_transazioni_a_blocchi(numero_record, numero_utenti, numero_agenzie, numero_case, percorso,
+                                     args.formato, args.dimensione_blocco, args.processi, args.seed, args.data_finale)
+        return
 
-        acquirente = _scegli_acquirente(venditore, utenti, transazioni_casa)
-        prezzo, data_ultima_transazione = _calcola_prezzo_e_data(transazioni, casa)
-        agenzia = random.choice(agenzie)
+    if args.seed is not None:
+        random.seed(args.seed)
+    transazioni = _genera_transazioni_sequenziale(numero_record, numero_utenti, numero_agenzie, numero_case,
+                                                  np.random.default_rng(args.seed))
 
-        case_utenti.setdefault(acquirente, []).append(casa)
-        if venditore in case_utenti and casa in case_utenti[venditore]:
-            case_utenti[venditore].remove(casa)
-
-        transazioni.loc[i] = {
-            'id_transazione': i,
-            'acquirente': acquirente,
-            'venditore': venditore,
-            'agenzia': agenzia,
-            'immobile': casa,
-            'prezzo': prezzo,
-            'data': _genera_data(data_ultima_transazione)
-        }
-
-    transazioni.to_csv('files/transazioni.csv', index=False)
+    if args.formato == "parquet":
+        transazioni.to_parquet(percorso, index=False)
+    else:
+        transazioni.to_csv(percorso, index=False)
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
     main()
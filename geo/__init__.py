@@ -0,0 +1,4 @@
+from .comparabili import MotoreComparabili, calcola_comparabili, calcola_deviazione_prezzo_mq
+from .deduplicazione import aggiorna_proprieta, deduplica, leggi_proprieta, rimuovi_duplicati
+from .griglia import aggiorna_griglia, calcola_griglia, leggi_griglia, riepiloga_griglia, scegli_livello
+from .zone import assegna_zone, aggiorna_zone_annunci, carica_zone
@@ -0,0 +1,256 @@
+"""
+Ricerca degli annunci comparabili: per ogni annuncio, o punto di interrogazione, i k annunci più simili e vicini.
+"""
+import concurrent.futures
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from statistiche.filtri import RAGGIO_TERRESTRE_KM
+
+PESO_MQ = 1.0
+PESO_LOCALI = 0.5
+
+# Stato dei processi worker, inizializzato una sola volta per processo da `_inizializza_worker`
+_motore_worker = None
+
+
+def coordinate_cartesiane(latitudini, longitudini):
+    """
+    Converte latitudine e longitudine in coordinate cartesiane (in km) sulla sfera terrestre.
+
+    Per distanze di pochi km la distanza euclidea tra questi punti coincide in pratica con la distanza sulla
+    superficie, per cui può essere indicizzata con un KD-tree.
+
+    :param latitudini: Array delle latitudini.
+    :param longitudini: Array delle longitudini.
+    :return: Array di forma (n, 3).
+    :rtype: np.ndarray
+    """
+    lat = np.radians(np.asarray(latitudini, dtype=float))
+    lon = np.radians(np.asarray(longitudini, dtype=float))
+
+    return RAGGIO_TERRESTRE_KM * np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+class MotoreComparabili:
+    """
+    Indice degli annunci per la ricerca dei comparabili.
+
+    I candidati vengono estratti con un KD-tree sulle coordinate (i `k_candidati` più vicini entro `raggio_km`) e poi
+    ordinati per una distanza che combina la distanza geografica, normalizzata sul raggio, con la differenza di
+    metri quadrati (in scala logaritmica) e di locali, normalizzate sulla loro deviazione standard. Un comparabile
+    deve avere la stessa tipologia dell'annuncio di riferimento.
+
+    Sono indicizzati solo gli annunci con coordinate, prezzo e metri quadrati validi, dato che un comparabile senza
+    prezzo al mq non serve alla valutazione.
+    """
+
+    def __init__(self, annunci, raggio_km=2.0, k_candidati=50, peso_mq=PESO_MQ, peso_locali=PESO_LOCALI):
+        """
+        Costruisce l'indice.
+
+        :param annunci: DataFrame con le colonne 'latitudine', 'longitudine', 'prezzo', 'mq', 'locali' e 'tipologia'.
+        :param raggio_km: Distanza massima (in km) di un comparabile.
+        :param k_candidati: Numero di vicini geografici tra cui scegliere i comparabili.
+        :param peso_mq: Peso della differenza di metri quadrati.
+        :param peso_locali: Peso della differenza di locali.
+        """
+        validi = (annunci[["latitudine", "longitudine", "prezzo"]].notna().all(axis=1) & (annunci["mq"] > 0))
+
+        self.raggio_km = raggio_km
+        self.k_candidati = k_candidati
+        self.peso_mq = peso_mq
+        self.peso_locali = peso_locali
+
+        # Posizione, nel DataFrame originale, di ogni annuncio indicizzato
+        self.posizioni = np.flatnonzero(validi.to_numpy())
+        indicizzati = annunci.iloc[self.posizioni]
+
+        self._albero = cKDTree(coordinate_cartesiane(indicizzati["latitudine"], indicizzati["longitudine"]))
+        self._log_mq = np.log(indicizzati["mq"].to_numpy(dtype=float))
+        self._locali = indicizzati["locali"].to_numpy(dtype=float)
+        self._tipologie = indicizzati["tipologia"].to_numpy()
+        # Senza annunci indicizzati le scale non servono a `cerca` e la deviazione standard non è definita
+        vuoto = len(self.posizioni) == 0
+        self._scala_mq = 1.0 if vuoto else np.nanstd(self._log_mq) or 1.0
+        self._scala_locali = 1.0 if vuoto else np.nanstd(self._locali) or 1.0
+
+    def cerca(self, latitudini, longitudini, mq, locali, tipologie, k=10, posizioni_escluse=None):
+        """
+        Cerca i k comparabili di un insieme di punti, in forma vettoriale.
+
+        :param latitudini: Array delle latitudini dei punti.
+        :param longitudini: Array delle longitudini dei punti.
+        :param mq: Array dei metri quadrati dei punti.
+        :param locali: Array del numero di locali dei punti (NaN se sconosciuto).
+        :param tipologie: Array delle tipologie dei punti.
+        :param k: Numero di comparabili per punto.
+        :param posizioni_escluse: Array opzionale con, per ogni punto, la posizione di un annuncio da escludere
+                                  (l'annuncio stesso quando si cercano i comparabili degli annunci indicizzati).
+        :return: Tupla (posizioni, punteggi) di forma (n, k). Le posizioni si riferiscono al DataFrame usato per
+                 costruire l'indice e valgono -1 (con punteggio infinito) se ci sono meno di k comparabili, e per
+                 tutti i k comparabili dei punti con latitudine o longitudine mancante o se nessun annuncio è
+                 indicizzato.
+        """
+        numero_indicizzati = len(self.posizioni)
+        if numero_indicizzati == 0:
+            numero_punti = len(np.atleast_1d(latitudini))
+            return np.full((numero_punti, k), -1), np.full((numero_punti, k), np.inf)
+
+        k_candidati = min(self.k_candidati + 1, max(numero_indicizzati, 1))
+        punti = coordinate_cartesiane(latitudini, longitudini)
+
+        # I punti senza coordinate valide non vengono interrogati e restano senza vicini, come quelli isolati
+        finiti = np.isfinite(punti).all(axis=1)
+        distanze = np.full((len(punti), k_candidati), np.inf)
+        candidati = np.full((len(punti), k_candidati), numero_indicizzati)
+        distanze_finiti, candidati_finiti = self._albero.query(punti[finiti], k=k_candidati,
+                                                               distance_upper_bound=self.raggio_km)
+        distanze[finiti] = distanze_finiti.reshape(-1, k_candidati)
+        candidati[finiti] = candidati_finiti.reshape(-1, k_candidati)
+
+        # I vicini mancanti hanno indice pari al numero di punti indicizzati
+        validi = candidati < numero_indicizzati
+        candidati = np.where(validi, candidati, 0)
+
+        log_mq = np.log(np.asarray(mq, dtype=float))[:, None]
+        locali = np.asarray(locali, dtype=float)[:, None]
+        differenza_mq = np.nan_to_num((self._log_mq[candidati] - log_mq) / self._scala_mq)
+        differenza_locali = np.nan_to_num((self._locali[candidati] - locali) / self._scala_locali)
+
+        punteggi = np.sqrt(
+            (distanze / self.raggio_km) ** 2 + self.peso_mq * differenza_mq ** 2 +
+            self.peso_locali * differenza_locali ** 2
+        )
+        validi &= self._tipologie[candidati] == np.asarray(tipologie)[:, None]
+
+        posizioni = self.posizioni[candidati]
+        if posizioni_escluse is not None:
+            validi &= posizioni != np.asarray(posizioni_escluse)[:, None]
+
+        punteggi = np.where(validi, punteggi, np.inf)
+        ordine = np.argsort(punteggi, axis=1, kind="stable")[:, :k]
+        punteggi = np.take_along_axis(punteggi, ordine, axis=1)
+        posizioni = np.where(np.isinf(punteggi), -1, np.take_along_axis(posizioni, ordine, axis=1))
+
+        return posizioni, punteggi
+
+    def cerca_annunci(self, annunci, k=10, escludi_se_stessi=True):
+        """
+        Cerca i comparabili di tutte le righe di un DataFrame di annunci.
+
+        :param annunci: DataFrame degli annunci da valutare (con le stesse colonne usate per l'indice).
+        :param k: Numero di comparabili per annuncio.
+        :param escludi_se_stessi: Se True, le righe sono le stesse dell'indice e ogni annuncio viene escluso dai propri
+                                  comparabili.
+        :return: Tupla (posizioni, punteggi), come restituita da `cerca`.
+        """
+        return self.cerca(
+            annunci["latitudine"].to_numpy(dtype=float),
+            annunci["longitudine"].to_numpy(dtype=float),
+            annunci["mq"].to_numpy(dtype=float),
+            annunci["locali"].to_numpy(dtype=float),
+            annunci["tipologia"].to_numpy(),
+            k=k,
+            posizioni_escluse=np.arange(len(annunci)) if escludi_se_stessi else None,
+        )
+
+
+def _inizializza_worker(annunci, raggio_km, k_candidati):
+    """
+    Costruisce l'indice dei comparabili una sola volta per processo worker.
+
+    :param annunci: DataFrame degli annunci.
+    :param raggio_km: Distanza massima di un comparabile.
+    :param k_candidati: Numero di vicini geografici tra cui scegliere.
+    """
+    global _motore_worker
+    _motore_worker = (annunci, MotoreComparabili(annunci, raggio_km, k_candidati))
+
+
+def _cerca_blocco(inizio, fine, k):
+    """
+    Cerca i comparabili di un blocco di annunci nel processo worker.
+
+    :param inizio: Posizione del primo annuncio del blocco.
+    :param fine: Posizione successiva all'ultimo annuncio del blocco.
+    :param k: Numero di comparabili per annuncio.
+    :return: Tupla (posizioni, punteggi) del blocco.
+    """
+    annunci, motore = _motore_worker
+    blocco = annunci.iloc[inizio:fine]
+
+    return motore.cerca(
+        blocco["latitudine"].to_numpy(dtype=float),
+        blocco["longitudine"].to_numpy(dtype=float),
+        blocco["mq"].to_numpy(dtype=float),
+        blocco["locali"].to_numpy(dtype=float),
+        blocco["tipologia"].to_numpy(),
+        k=k,
+        posizioni_escluse=np.arange(inizio, fine),
+    )
+
+
+def calcola_comparabili(annunci, k=10, raggio_km=2.0, k_candidati=50, processi=None, dimensione_blocco=50_000):
+    """
+    Calcola i k comparabili di tutti gli annunci, suddividendoli in blocchi elaborati in parallelo da più processi.
+
+    Ogni processo costruisce il proprio indice una sola volta e poi elabora blocchi interi in forma vettoriale.
+
+    :param annunci: DataFrame degli annunci.
+    :param k: Numero di comparabili per annuncio.
+    :param raggio_km: Distanza massima di un comparabile.
+    :param k_candidati: Numero di vicini geografici tra cui scegliere i comparabili.
+    :param processi: Numero di processi (default: numero di CPU). Con 1 il calcolo avviene nel processo corrente.
+    :param dimensione_blocco: Numero di annunci per blocco.
+    :return: Tupla (posizioni, punteggi) di forma (len(annunci), k), come restituita da `MotoreComparabili.cerca`.
+    """
+    annunci = annunci.reset_index(drop=True)
+    processi = processi or os.cpu_count() or 1
+    blocchi = [(inizio, min(inizio + dimensione_blocco, len(annunci)))
+               for inizio in range(0, len(annunci), dimensione_blocco)]
+
+    if processi == 1 or len(blocchi) <= 1:
+        _inizializza_worker(annunci, raggio_km, k_candidati)
+        risultati = [_cerca_blocco(inizio, fine, k) for inizio, fine in blocchi]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processi, initializer=_inizializza_worker,
+                                                    initargs=(annunci, raggio_km, k_candidati)) as executor:
+            futures = [executor.submit(_cerca_blocco, inizio, fine, k) for inizio, fine in blocchi]
+            risultati = [future.result() for future in futures]
+
+    if not risultati:
+        return np.empty((0, k), dtype=int), np.empty((0, k))
+
+    return np.vstack([posizioni for posizioni, _ in risultati]), np.vstack([punteggi for _, punteggi in risultati])
+
+
+def calcola_deviazione_prezzo_mq(annunci, posizioni):
+    """
+    Calcola, per ogni annuncio, lo scostamento del prezzo al mq dalla mediana dei suoi comparabili.
+
+    :param annunci: DataFrame degli annunci usato per calcolare i comparabili.
+    :param posizioni: Posizioni dei comparabili, come restituite da `calcola_comparabili`.
+    :return: DataFrame con le colonne 'prezzo_mq', 'numero_comparabili', 'prezzo_mq_comparabili' (mediana) e
+             'deviazione_prezzo_mq' (scostamento relativo), con lo stesso indice di `annunci`.
+    :rtype: pd.DataFrame
+    """
+    prezzo_mq = (annunci["prezzo"] / annunci["mq"].where(annunci["mq"] > 0)).to_numpy(dtype=float)
+
+    validi = posizioni >= 0
+    prezzo_mq_comparabili = np.where(validi, prezzo_mq[np.where(validi, posizioni, 0)], np.nan)
+    numero_comparabili = validi.sum(axis=1)
+
+    mediana = np.full(len(annunci), np.nan)
+    con_comparabili = numero_comparabili > 0
+    mediana[con_comparabili] = np.nanmedian(prezzo_mq_comparabili[con_comparabili], axis=1)
+
+    return pd.DataFrame({
+        "prezzo_mq": prezzo_mq,
+        "numero_comparabili": numero_comparabili,
+        "prezzo_mq_comparabili": mediana,
+        "deviazione_prezzo_mq": (prezzo_mq - mediana) / mediana,
+    }, index=annunci.index)
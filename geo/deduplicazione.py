@@ -0,0 +1,323 @@
+"""
+Riconoscimento degli annunci duplicati: lo stesso immobile pubblicato più volte, ad esempio da agenzie diverse.
+
+Per evitare di confrontare tutte le coppie di annunci (O(n²)) si usa il blocking: ogni annuncio appartiene a un blocco
+identificato da tipologia, cella di una griglia geografica e fascia di metri quadrati, e vengono confrontate solo le
+coppie nello stesso blocco o in blocchi adiacenti. Le coppie con punteggio di somiglianza sufficiente vengono unite
+in gruppi, dalla più simile alla meno simile e di default senza mai riunire due annunci della stessa agenzia: ogni
+gruppo è un immobile con un identificativo canonico.
+"""
+import itertools
+import os
+
+import numpy as np
+import pandas as pd
+
+from statistiche.filtri import distanza_haversine_km
+
+FILE_PROPRIETA_CSV = "files/proprieta.csv"
+
+DIMENSIONE_CELLA_GRADI = 0.0005  # circa 55 m di latitudine e 40 m di longitudine a Milano
+AMPIEZZA_FASCIA_MQ = 0.1  # fasce logaritmiche di metri quadrati larghe circa il 10%
+SOGLIA_SOMIGLIANZA = 0.75
+
+DISTANZA_MASSIMA_M = 100
+TOLLERANZA_MQ = 0.1
+TOLLERANZA_PREZZO = 0.15
+PESI_SOMIGLIANZA = {"distanza": 0.35, "mq": 0.25, "locali": 0.15, "prezzo": 0.25}
+
+
+def _calcola_blocchi(annunci, dimensione_cella):
+    """
+    Calcola le chiavi di blocco di ogni annuncio.
+
+    :param annunci: DataFrame degli annunci con indice posizionale.
+    :param dimensione_cella: Lato (in gradi) delle celle della griglia geografica.
+    :return: DataFrame con le colonne 'posizione', 'tipologia', 'cella_lat', 'cella_lon' e 'fascia_mq'.
+    """
+    validi = annunci[["latitudine", "longitudine"]].notna().all(axis=1) & (annunci["mq"] > 0)
+    annunci = annunci[validi]
+
+    return pd.DataFrame({
+        "posizione": annunci.index.to_numpy(),
+        "tipologia": annunci["tipologia"].to_numpy(),
+        "cella_lat": np.floor(annunci["latitudine"].to_numpy() / dimensione_cella).astype(np.int64),
+        "cella_lon": np.floor(annunci["longitudine"].to_numpy() / dimensione_cella).astype(np.int64),
+        "fascia_mq": np.floor(np.log(annunci["mq"].to_numpy(dtype=float)) / AMPIEZZA_FASCIA_MQ).astype(np.int64),
+    })
+
+
+def _codifica_blocchi(blocchi):
+    """
+    Codifica le chiavi di blocco in un unico intero. Ogni coordinata del blocco è traslata in modo da lasciare un
+    margine di uno su entrambi i lati, per cui il codice di un blocco adiacente si ottiene sommando a quello del blocco
+    lo spostamento di ogni coordinata moltiplicato per il suo passo.
+
+    :param blocchi: DataFrame come restituito da `_calcola_blocchi`.
+    :return: Tupla (array dei codici, array dei passi di 'cella_lat', 'cella_lon' e 'fascia_mq').
+    """
+    codici, _ = pd.factorize(blocchi["tipologia"], use_na_sentinel=False)
+    codici = codici.astype(np.int64)
+    passi = []
+    for colonna in ["cella_lat", "cella_lon", "fascia_mq"]:
+        valori = blocchi[colonna].to_numpy()
+        minimo, massimo = (valori.min(), valori.max()) if len(valori) else (0, 0)
+        dimensione = massimo - minimo + 3
+        codici = codici * dimensione + valori - minimo + 1
+        passi = [passo * dimensione for passo in passi] + [1]
+
+    return codici, np.array(passi, dtype=np.int64)
+
+
+def genera_coppie_candidate(annunci, posizioni_nuove=None, dimensione_cella=DIMENSIONE_CELLA_GRADI):
+    """
+    Genera le coppie di annunci da confrontare, cioè quelle nello stesso blocco o in blocchi adiacenti.
+
+    I codici dei blocchi di tutti gli annunci vengono ordinati una sola volta; per ogni annuncio da confrontare si
+    cercano poi nell'ordinamento i 27 blocchi vicini, in ordine crescente di codice. Se sono indicate le posizioni
+    degli annunci nuovi vengono cercati solo i loro vicini, per cui vengono generate solo le coppie che ne contengono
+    almeno uno. Ogni coppia compare una sola volta.
+
+    :param annunci: DataFrame degli annunci con indice posizionale (0..n-1).
+    :param posizioni_nuove: Array opzionale delle posizioni degli annunci nuovi.
+    :param dimensione_cella: Lato (in gradi) delle celle della griglia geografica.
+    :return: Tupla di due array (posizioni sinistre, posizioni destre).
+    """
+    blocchi = _calcola_blocchi(annunci, dimensione_cella)
+    codici, passi = _codifica_blocchi(blocchi)
+    ordine = np.argsort(codici, kind="stable")
+    codici_ordinati, posizioni_ordinate = codici[ordine], blocchi["posizione"].to_numpy()[ordine]
+
+    if posizioni_nuove is None:
+        nuovi = np.ones(len(annunci), dtype=bool)
+    else:
+        nuovi = np.zeros(len(annunci), dtype=bool)
+        nuovi[posizioni_nuove] = True
+    da_confrontare = nuovi[posizioni_ordinate]
+    codici_sinistri, posizioni_sinistre = codici_ordinati[da_confrontare], posizioni_ordinate[da_confrontare]
+
+    coppie_sinistre, coppie_destre = [], []
+    for spostamento in itertools.product([-1, 0, 1], repeat=3):
+        codici_vicini = codici_sinistri + np.dot(spostamento, passi)
+        inizi = np.searchsorted(codici_ordinati, codici_vicini, side="left")
+        lunghezze = np.searchsorted(codici_ordinati, codici_vicini, side="right") - inizi
+
+        # Ogni annuncio viene ripetuto per il numero di annunci del blocco vicino, che occupano un tratto contiguo
+        sinistre = np.repeat(posizioni_sinistre, lunghezze)
+        scostamenti = np.arange(len(sinistre)) - np.repeat(np.cumsum(lunghezze) - lunghezze, lunghezze)
+        destre = posizioni_ordinate[np.repeat(inizi, lunghezze) + scostamenti]
+
+        # Una coppia tra due annunci nuovi viene generata da entrambi i lati: si tiene solo quella ordinata
+        tenute = (sinistre != destre) & (~nuovi[destre] | (sinistre < destre))
+        coppie_sinistre.append(sinistre[tenute])
+        coppie_destre.append(destre[tenute])
+
+    return np.concatenate(coppie_sinistre), np.concatenate(coppie_destre)
+
+
+def _somiglianza_relativa(valori_sinistri, valori_destri, tolleranza):
+    """
+    Somiglianza tra 1 (valori uguali) e 0 (differenza relativa pari o superiore alla tolleranza), 0.5 se un valore
+    manca.
+
+    :param valori_sinistri: Array dei valori del primo annuncio di ogni coppia.
+    :param valori_destri: Array dei valori del secondo annuncio di ogni coppia.
+    :param tolleranza: Differenza relativa oltre la quale la somiglianza è nulla.
+    :return: Array delle somiglianze.
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        differenza = np.abs(valori_sinistri - valori_destri) / np.maximum(valori_sinistri, valori_destri)
+
+    return np.where(np.isnan(differenza), 0.5, np.clip(1 - differenza / tolleranza, 0, 1))
+
+
+def calcola_somiglianza(annunci, sinistre, destre):
+    """
+    Calcola il punteggio di somiglianza di un insieme di coppie, come media pesata delle somiglianze di posizione,
+    metri quadrati, locali e prezzo.
+
+    :param annunci: DataFrame degli annunci con indice posizionale.
+    :param sinistre: Posizioni del primo annuncio di ogni coppia.
+    :param destre: Posizioni del secondo annuncio di ogni coppia.
+    :return: Array dei punteggi, compresi tra 0 e 1.
+    """
+    latitudini = annunci["latitudine"].to_numpy(dtype=float)
+    longitudini = annunci["longitudine"].to_numpy(dtype=float)
+    mq = annunci["mq"].to_numpy(dtype=float)
+    locali = annunci["locali"].to_numpy(dtype=float)
+    prezzi = annunci["prezzo"].to_numpy(dtype=float)
+
+    # La distanza è calcolata per coppia: l'emisenoverso accetta un centro diverso per ogni elemento
+    distanze_m = 1000 * distanza_haversine_km(latitudini[sinistre], longitudini[sinistre], latitudini[destre],
+                                              longitudini[destre])
+    locali_sinistri, locali_destri = locali[sinistre], locali[destre]
+
+    somiglianze = {
+        "distanza": np.clip(1 - distanze_m / DISTANZA_MASSIMA_M, 0, 1),
+        "mq": _somiglianza_relativa(mq[sinistre], mq[destre], TOLLERANZA_MQ),
+        "locali": np.where(np.isnan(locali_sinistri) | np.isnan(locali_destri), 0.5,
+                           (locali_sinistri == locali_destri).astype(float)),
+        "prezzo": _somiglianza_relativa(prezzi[sinistre], prezzi[destre], TOLLERANZA_PREZZO),
+    }
+
+    return sum(PESI_SOMIGLIANZA[nome] * somiglianza for nome, somiglianza in somiglianze.items())
+
+
+def _trova_radice(genitori, posizione):
+    """
+    Restituisce il rappresentante del gruppo di un annuncio, dimezzando il cammino percorso.
+
+    :param genitori: Lista del genitore di ogni annuncio nella foresta dei gruppi.
+    :param posizione: Posizione dell'annuncio.
+    :return: Posizione del rappresentante.
+    :rtype: int
+    """
+    while genitori[posizione] != posizione:
+        genitori[posizione] = genitori[genitori[posizione]]
+        posizione = genitori[posizione]
+
+    return posizione
+
+
+def _unisci_coppie(genitori, sinistre, destre, punteggi, agenzie=None):
+    """
+    Unisce i gruppi collegati dalle coppie di duplicati, dalla più simile alla meno simile. Se sono indicate le
+    agenzie, due gruppi che contengono annunci della stessa agenzia non vengono uniti: altrimenti una catena di coppie
+    tra agenzie diverse potrebbe riunire nello stesso immobile due annunci della stessa agenzia.
+
+    :param genitori: Array del genitore di ogni annuncio, in cui ogni gruppo già noto ha un unico rappresentante.
+    :param sinistre: Posizioni del primo annuncio di ogni coppia.
+    :param destre: Posizioni del secondo annuncio di ogni coppia.
+    :param punteggi: Punteggi di somiglianza delle coppie.
+    :param agenzie: Array opzionale dell'agenzia di ogni annuncio.
+    :return: Array del rappresentante del gruppo di ogni annuncio.
+    """
+    agenzie_gruppi = {}
+    if agenzie is not None:
+        # Agenzie dei gruppi già noti con più annunci; gli altri gruppi hanno solo l'agenzia del rappresentante
+        membri = pd.DataFrame({"radice": genitori, "agenzia": agenzie})
+        membri = membri[membri.duplicated("radice", keep=False)]
+        agenzie_gruppi = membri.groupby("radice")["agenzia"].agg(set).to_dict()
+
+    genitori = genitori.tolist()
+    ordine = np.argsort(-punteggi, kind="stable")
+    for sinistra, destra in zip(sinistre[ordine].tolist(), destre[ordine].tolist()):
+        radice_sinistra, radice_destra = _trova_radice(genitori, sinistra), _trova_radice(genitori, destra)
+        if radice_sinistra == radice_destra:
+            continue
+
+        if agenzie is not None:
+            agenzie_sinistre = agenzie_gruppi.get(radice_sinistra, {agenzie[radice_sinistra]})
+            agenzie_destre = agenzie_gruppi.get(radice_destra, {agenzie[radice_destra]})
+            if not agenzie_sinistre.isdisjoint(agenzie_destre):
+                continue
+            agenzie_gruppi[radice_sinistra] = agenzie_sinistre | agenzie_destre
+            agenzie_gruppi.pop(radice_destra, None)
+
+        genitori[radice_destra] = radice_sinistra
+
+    genitori = np.array(genitori, dtype=np.int64)
+    while not np.array_equal(genitori[genitori], genitori):
+        genitori = genitori[genitori]
+
+    return genitori
+
+
+def deduplica(annunci, riferimenti_nuovi=None, proprieta_esistenti=None, solo_agenzie_diverse=True,
+              soglia=SOGLIA_SOMIGLIANZA):
+    """
+    Assegna a ogni annuncio l'identificativo canonico dell'immobile a cui si riferisce.
+
+    In modalità incrementale vengono confrontate solo le coppie che contengono almeno un annuncio nuovo; i gruppi già
+    noti in `proprieta_esistenti` vengono mantenuti e, se un annuncio nuovo li collega, uniti. I gruppi che contengono
+    un annuncio modificato vengono invece sciolti e i loro annunci confrontati di nuovo, perché l'annuncio potrebbe non
+    essere più simile a quelli a cui era stato associato.
+
+    :param annunci: DataFrame degli annunci con la colonna 'riferimento'.
+    :param riferimenti_nuovi: Riferimenti degli annunci nuovi o modificati. Se None vengono confrontati tutti.
+    :param proprieta_esistenti: Serie riferimento → id_proprieta calcolata in precedenza (opzionale).
+    :param solo_agenzie_diverse: Se True, due annunci della stessa agenzia non sono mai considerati lo stesso immobile,
+                                 nemmeno attraverso annunci di altre agenzie.
+    :param soglia: Punteggio minimo di somiglianza per considerare due annunci lo stesso immobile.
+    :return: Serie con indice 'riferimento' e valore 'id_proprieta', pari al riferimento più piccolo del gruppo.
+    :rtype: pd.Series
+    """
+    annunci = annunci.reset_index(drop=True)
+    riferimenti = annunci["riferimento"].to_numpy()
+    genitori = np.arange(len(annunci))
+
+    posizioni_nuove = None
+    if riferimenti_nuovi is not None:
+        nuovi = annunci["riferimento"].isin(riferimenti_nuovi).to_numpy()
+
+        # I gruppi già noti diventano alberi con radice nel primo annuncio del gruppo ancora valido
+        if proprieta_esistenti is not None and len(proprieta_esistenti):
+            gruppi = proprieta_esistenti.reindex(riferimenti).to_numpy(dtype=float)
+            nuovi = nuovi | np.isin(gruppi, gruppi[nuovi & ~np.isnan(gruppi)])
+            posizioni_note = np.flatnonzero(~np.isnan(gruppi) & ~nuovi)
+            genitori[posizioni_note] = pd.Series(posizioni_note).groupby(gruppi[posizioni_note]).transform("min")
+
+        posizioni_nuove = np.flatnonzero(nuovi)
+
+    sinistre, destre = genera_coppie_candidate(annunci, posizioni_nuove)
+    agenzie = annunci["agenzia"].to_numpy() if solo_agenzie_diverse else None
+    if solo_agenzie_diverse:
+        diverse = agenzie[sinistre] != agenzie[destre]
+        sinistre, destre = sinistre[diverse], destre[diverse]
+
+    punteggi = calcola_somiglianza(annunci, sinistre, destre)
+    duplicati = punteggi >= soglia
+    componenti = _unisci_coppie(genitori, sinistre[duplicati], destre[duplicati], punteggi[duplicati], agenzie)
+
+    id_proprieta = pd.Series(riferimenti).groupby(componenti).transform("min").to_numpy()
+    return pd.Series(id_proprieta, index=pd.Index(riferimenti, name="riferimento"), name="id_proprieta")
+
+
+def leggi_proprieta(percorso_proprieta=FILE_PROPRIETA_CSV):
+    """
+    Legge l'associazione tra annunci e immobili salvata su file.
+
+    :param percorso_proprieta: Percorso del file CSV.
+    :return: Serie riferimento → id_proprieta, oppure None se il file non esiste.
+    """
+    if not os.path.exists(percorso_proprieta):
+        return None
+
+    return pd.read_csv(percorso_proprieta, index_col="riferimento")["id_proprieta"]
+
+
+def aggiorna_proprieta(annunci, riferimenti_nuovi=None, percorso_proprieta=FILE_PROPRIETA_CSV):
+    """
+    Aggiorna l'associazione salvata tra annunci e immobili confrontando solo gli annunci nuovi o modificati.
+
+    :param annunci: DataFrame di tutti gli annunci, con la colonna 'riferimento'.
+    :param riferimenti_nuovi: Riferimenti degli annunci nuovi o modificati. Se None, o se l'associazione non è ancora
+                              stata salvata, viene ricalcolata da zero.
+    :param percorso_proprieta: Percorso del file CSV.
+    :return: La serie riferimento → id_proprieta aggiornata.
+    :rtype: pd.Series
+    """
+    proprieta_esistenti = leggi_proprieta(percorso_proprieta) if riferimenti_nuovi is not None else None
+    if proprieta_esistenti is None:
+        # Senza un'associazione salvata le coppie tra annunci già presenti non sono mai state confrontate
+        riferimenti_nuovi = None
+    proprieta = deduplica(annunci, riferimenti_nuovi, proprieta_esistenti)
+    proprieta.to_csv(percorso_proprieta)
+
+    return proprieta
+
+
+def rimuovi_duplicati(annunci, proprieta):
+    """
+    Mantiene un solo annuncio per immobile: quello con la data di ultima modifica prezzo più recente.
+
+    :param annunci: DataFrame degli annunci con le colonne 'riferimento' e 'data_ultima_modifica_prezzo'.
+    :param proprieta: Serie riferimento → id_proprieta.
+    :return: DataFrame degli annunci senza duplicati, con la colonna aggiuntiva 'id_proprieta'.
+    :rtype: pd.DataFrame
+    """
+    annunci = annunci.assign(id_proprieta=annunci["riferimento"].map(proprieta).fillna(annunci["riferimento"]))
+    ultimi = annunci.sort_values("data_ultima_modifica_prezzo", kind="stable") \
+        .drop_duplicates("id_proprieta", keep="last").index
+
+    return annunci[annunci.index.isin(ultimi)]
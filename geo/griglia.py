@@ -0,0 +1,272 @@
+"""
+Griglia geografica multi-risoluzione dei prezzi degli annunci.
+
+Latitudine e longitudine vengono quantizzate in celle quadrate (in gradi) a più livelli di risoluzione, annidati tra
+loro: ogni cella di un livello è divisa in `FATTORE_LIVELLO` × `FATTORE_LIVELLO` celle del livello successivo. Per
+ogni cella la griglia conserva un riassunto compatto del prezzo e del prezzo al mq: un istogramma su pochi intervalli
+logaritmici di ampiezza relativa costante, con il numero e la somma dei valori di ogni intervallo. Dagli intervalli si
+ricavano esattamente conteggio e media della cella e, come media dell'intervallo che la contiene, la mediana, con un
+errore relativo inferiore a `BASE_INTERVALLO - 1`. Gli istogrammi si possono sommare e sottrarre, per cui la griglia
+viene aggiornata in modo incrementale a ogni merge (aggiungendo gli annunci nuovi e togliendo la versione precedente di
+quelli con prezzo modificato). Ogni livello è salvato in un file separato, in modo che la mappa legga solo il livello
+che disegna.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from dati import leggi_annunci
+from dati.caricamento import FILE_ANNUNCI_CSV
+
+DIRECTORY_GRIGLIA = "files/griglia_prezzi"
+NUMERO_LIVELLI = 4
+FATTORE_LIVELLO = 4
+# Lato (in gradi) delle celle del livello più fine, circa 110 m in latitudine
+LATO_CELLA_MINIMO_GRADI = 0.001
+# Rapporto tra gli estremi di ogni intervallo degli istogrammi
+BASE_INTERVALLO = 1.1
+CELLE_MASSIME_MAPPA = 20_000
+GRANDEZZE = ["prezzo", "prezzo_mq"]
+CHIAVI_GRIGLIA = ["livello", "cella_latitudine", "cella_longitudine", "grandezza", "intervallo"]
+# Colonne salvate nel file di ogni livello, separatamente per ogni grandezza, con il tipo usato nel file
+TIPI_FILE_GRIGLIA = {
+    "cella_latitudine": np.int32,
+    "cella_longitudine": np.int32,
+    "intervallo": np.int16,
+    "conteggio": np.int32,
+    "somma": np.float64,
+}
+
+
+def get_lato_cella(livello):
+    """
+    Restituisce il lato in gradi delle celle di un livello. Il livello 0 è il più grossolano.
+
+    :param livello: Livello della griglia, tra 0 e `NUMERO_LIVELLI` - 1.
+    :return: Lato della cella in gradi.
+    :rtype: float
+    """
+    return LATO_CELLA_MINIMO_GRADI * FATTORE_LIVELLO ** (NUMERO_LIVELLI - 1 - livello)
+
+
+def _get_intervalli(valori):
+    """
+    Restituisce l'indice dell'intervallo logaritmico degli istogrammi a cui appartiene ogni valore.
+
+    :param valori: Array di valori positivi.
+    :return: Array di interi.
+    """
+    return np.floor(np.log(valori) / np.log(BASE_INTERVALLO)).astype(np.int64)
+
+
+def get_percorso_livello(livello, directory_griglia=DIRECTORY_GRIGLIA):
+    """
+    Restituisce il percorso del file in cui è salvato un livello della griglia.
+
+    :param livello: Livello della griglia.
+    :param directory_griglia: Directory dei file della griglia.
+    :return: Percorso del file npz del livello.
+    :rtype: str
+    """
+    return os.path.join(directory_griglia, f"livello_{livello}.npz")
+
+
+def calcola_griglia(annunci, segno=1, livelli=None):
+    """
+    Calcola gli istogrammi di prezzo e prezzo al mq di ogni cella, ai livelli indicati, per un insieme di annunci.
+    Gli annunci senza coordinate o senza prezzo vengono ignorati.
+
+    :param annunci: DataFrame con le colonne 'latitudine', 'longitudine', 'prezzo' e 'mq'.
+    :param segno: 1 per aggiungere gli annunci alla griglia, -1 per toglierli.
+    :param livelli: Livelli da calcolare; di default tutti.
+    :return: DataFrame con le colonne di `CHIAVI_GRIGLIA`, 'conteggio' e 'somma' (dei valori dell'intervallo).
+    :rtype: pd.DataFrame
+    """
+    annunci = annunci.dropna(subset=["latitudine", "longitudine", "prezzo"])
+    annunci = annunci[annunci["prezzo"] > 0]
+
+    celle_latitudine = np.floor(annunci["latitudine"].to_numpy(dtype=float) / LATO_CELLA_MINIMO_GRADI).astype(np.int64)
+    celle_longitudine = np.floor(annunci["longitudine"].to_numpy(dtype=float) / LATO_CELLA_MINIMO_GRADI) \
+        .astype(np.int64)
+    prezzi = annunci["prezzo"].to_numpy(dtype=float)
+    mq = annunci["mq"].to_numpy(dtype=float)
+    mq_validi = mq > 0
+
+    valori = {
+        "prezzo": (prezzi, np.ones(len(prezzi), dtype=bool)),
+        "prezzo_mq": (prezzi[mq_validi] / mq[mq_validi], mq_validi),
+    }
+
+    osservazioni = []
+    for livello in range(NUMERO_LIVELLI) if livelli is None else livelli:
+        fattore = FATTORE_LIVELLO ** (NUMERO_LIVELLI - 1 - livello)
+        for grandezza, (valori_grandezza, validi) in valori.items():
+            osservazioni.append(pd.DataFrame({
+                "livello": livello,
+                "cella_latitudine": celle_latitudine[validi] // fattore,
+                "cella_longitudine": celle_longitudine[validi] // fattore,
+                "grandezza": grandezza,
+                "intervallo": _get_intervalli(valori_grandezza),
+                "conteggio": segno,
+                "somma": segno * valori_grandezza,
+            }))
+
+    return pd.concat(osservazioni).groupby(CHIAVI_GRIGLIA, as_index=False)[["conteggio", "somma"]].sum()
+
+
+def unisci_griglia(griglia, griglia_nuova):
+    """
+    Somma due griglie, eliminando gli intervalli rimasti vuoti.
+
+    :param griglia: Griglia esistente.
+    :param griglia_nuova: Griglia da aggiungere (con conteggi e somme negativi per gli annunci da togliere).
+    :return: La griglia combinata.
+    :rtype: pd.DataFrame
+    """
+    griglia = pd.concat([griglia, griglia_nuova]).groupby(CHIAVI_GRIGLIA, as_index=False)[["conteggio", "somma"]].sum()
+    return griglia[griglia["conteggio"] > 0].reset_index(drop=True)
+
+
+def leggi_griglia(livello, directory_griglia=DIRECTORY_GRIGLIA):
+    """
+    Legge un livello della griglia salvata su file, senza leggere gli altri.
+
+    :param livello: Livello da leggere.
+    :param directory_griglia: Directory dei file della griglia.
+    :return: Le righe della griglia del livello, oppure None se il file non esiste.
+    :rtype: pd.DataFrame or None
+    """
+    percorso = get_percorso_livello(livello, directory_griglia)
+    if not os.path.exists(percorso):
+        return None
+
+    with np.load(percorso) as dati:
+        parti = [
+            pd.DataFrame({colonna: dati[f"{grandezza}_{colonna}"] for colonna in TIPI_FILE_GRIGLIA})
+            .assign(livello=livello, grandezza=grandezza)
+            for grandezza in GRANDEZZE
+        ]
+
+    return pd.concat(parti, ignore_index=True)[CHIAVI_GRIGLIA + ["conteggio", "somma"]]
+
+
+def _salva_livello(griglia, livello, directory_griglia=DIRECTORY_GRIGLIA):
+    """
+    Salva un livello della griglia nel suo file, con una serie di array per ogni grandezza.
+
+    :param griglia: Righe della griglia del livello.
+    :param livello: Livello da salvare.
+    :param directory_griglia: Directory dei file della griglia.
+    """
+    array = {}
+    for grandezza in GRANDEZZE:
+        righe = griglia[griglia["grandezza"] == grandezza]
+        for colonna, tipo in TIPI_FILE_GRIGLIA.items():
+            array[f"{grandezza}_{colonna}"] = righe[colonna].to_numpy(dtype=tipo)
+
+    np.savez_compressed(get_percorso_livello(livello, directory_griglia), **array)
+
+
+def aggiorna_griglia(annunci_aggiunti, annunci_rimossi=None, directory_griglia=DIRECTORY_GRIGLIA, ricostruisci=False,
+                     percorso_annunci=FILE_ANNUNCI_CSV):
+    """
+    Aggiorna la griglia salvata con gli annunci nuovi o modificati dall'ultimo merge e la salva, un livello alla
+    volta.
+
+    Se la griglia non è ancora stata salvata ma il file degli annunci esiste, viene ricostruita da tutti gli annunci
+    salvati invece che dal solo delta, che toglierebbe la versione precedente di annunci mai aggiunti.
+
+    :param annunci_aggiunti: DataFrame degli annunci nuovi o con prezzo modificato, nella versione aggiornata.
+    :param annunci_rimossi: DataFrame (opzionale) con la versione precedente degli annunci con prezzo modificato, da
+                            togliere dalla griglia.
+    :param directory_griglia: Directory dei file della griglia.
+    :param ricostruisci: Se True, la griglia esistente viene scartata e ricalcolata dai soli annunci aggiunti.
+    :param percorso_annunci: Percorso del file CSV di tutti gli annunci, già aggiornato con il merge.
+    """
+    salvata = all(os.path.exists(get_percorso_livello(livello, directory_griglia)) for livello in range(NUMERO_LIVELLI))
+    if not salvata and not ricostruisci and os.path.exists(percorso_annunci):
+        annunci_aggiunti, annunci_rimossi = leggi_annunci(percorso_annunci), None
+    ricostruisci = ricostruisci or not salvata
+
+    os.makedirs(directory_griglia, exist_ok=True)
+    for livello in range(NUMERO_LIVELLI):
+        delta = calcola_griglia(annunci_aggiunti, livelli=[livello])
+        if annunci_rimossi is not None:
+            delta = pd.concat([delta, calcola_griglia(annunci_rimossi, segno=-1, livelli=[livello])])
+
+        griglia = delta.iloc[0:0] if ricostruisci else leggi_griglia(livello, directory_griglia)
+        _salva_livello(unisci_griglia(griglia, delta), livello, directory_griglia)
+
+
+def scegli_livello(latitudine_minima, latitudine_massima, longitudine_minima, longitudine_massima,
+                   celle_massime=CELLE_MASSIME_MAPPA):
+    """
+    Sceglie il livello più fine per cui l'area indicata è coperta da al massimo `celle_massime` celle: allargando
+    l'area della mappa si passa a un livello più grossolano, restringendola a uno più fine.
+
+    :param latitudine_minima: Latitudine minima dell'area.
+    :param latitudine_massima: Latitudine massima dell'area.
+    :param longitudine_minima: Longitudine minima dell'area.
+    :param longitudine_massima: Longitudine massima dell'area.
+    :param celle_massime: Numero massimo di celle da disegnare.
+    :return: Il livello della griglia.
+    :rtype: int
+    """
+    for livello in reversed(range(NUMERO_LIVELLI)):
+        lato = get_lato_cella(livello)
+        numero_celle = np.ceil((latitudine_massima - latitudine_minima) / lato) * \
+            np.ceil((longitudine_massima - longitudine_minima) / lato)
+        if numero_celle <= celle_massime:
+            return livello
+
+    return 0
+
+
+def _calcola_mediane(istogrammi):
+    """
+    Calcola conteggio, media e mediana di ogni cella a partire dagli istogrammi di una grandezza. Come valore
+    dell'intervallo che contiene la mediana si usa la media dei valori dell'intervallo.
+
+    :param istogrammi: Righe della griglia di un solo livello e di una sola grandezza.
+    :return: Tupla (Serie dei conteggi, Serie delle medie, Serie delle mediane), indicizzate per cella.
+    """
+    celle = ["cella_latitudine", "cella_longitudine"]
+    istogrammi = istogrammi.sort_values(celle + ["intervallo"])
+    gruppi = istogrammi.groupby(celle, sort=False)
+
+    cumulati = gruppi["conteggio"].cumsum()
+    totali = gruppi["conteggio"].transform("sum")
+    intervalli_mediana = istogrammi[2 * cumulati >= totali].groupby(celle).first()
+    conteggi = gruppi["conteggio"].sum()
+
+    return (conteggi, gruppi["somma"].sum() / conteggi,
+            intervalli_mediana["somma"] / intervalli_mediana["conteggio"])
+
+
+def riepiloga_griglia(griglia, livello):
+    """
+    Riassume le celle di un livello della griglia con il numero di annunci e le medie e le mediane del prezzo e del
+    prezzo al mq.
+
+    :param griglia: La griglia, come restituita da `leggi_griglia` o `calcola_griglia`.
+    :param livello: Livello da riassumere.
+    :return: DataFrame con una riga per cella e le colonne 'cella_latitudine', 'cella_longitudine', 'latitudine',
+             'longitudine' (il centro della cella), 'conteggio', 'media_prezzo', 'mediana_prezzo', 'media_prezzo_mq'
+             e 'mediana_prezzo_mq'.
+    :rtype: pd.DataFrame
+    """
+    griglia = griglia[griglia["livello"] == livello]
+    conteggi, medie_prezzo, mediane_prezzo = _calcola_mediane(griglia[griglia["grandezza"] == "prezzo"])
+    _, medie_prezzo_mq, mediane_prezzo_mq = _calcola_mediane(griglia[griglia["grandezza"] == "prezzo_mq"])
+
+    celle = pd.DataFrame({"conteggio": conteggi, "media_prezzo": medie_prezzo, "mediana_prezzo": mediane_prezzo})
+    celle["media_prezzo_mq"] = medie_prezzo_mq
+    celle["mediana_prezzo_mq"] = mediane_prezzo_mq
+    celle = celle.reset_index()
+
+    lato = get_lato_cella(livello)
+    celle["latitudine"] = (celle["cella_latitudine"] + 0.5) * lato
+    celle["longitudine"] = (celle["cella_longitudine"] + 0.5) * lato
+
+    return celle
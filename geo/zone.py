@@ -0,0 +1,122 @@
+"""
+Assegnazione degli annunci alle zone (ad esempio i NIL o i municipi di Milano) definite in un file GeoJSON.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import shape
+
+FILE_ZONE_ANNUNCI_CSV = "files/zone_annunci.csv"
+CAMPI_NOME_ZONA = ["NIL", "nome", "name", "MUNICIPIO", "municipio"]
+
+
+def carica_zone(percorso_geojson, campo_nome=None):
+    """
+    Carica i poligoni delle zone da un file GeoJSON.
+
+    :param percorso_geojson: Percorso del file GeoJSON (FeatureCollection di poligoni o multipoligoni).
+    :param campo_nome: Proprietà delle feature da usare come nome della zona. Se None, si usa la prima proprietà
+                       presente tra quelle di `CAMPI_NOME_ZONA`, o la posizione della feature.
+    :return: Tupla (array dei nomi delle zone, array delle geometrie shapely).
+    """
+    with open(percorso_geojson, encoding="utf-8") as file_geojson:
+        feature = json.load(file_geojson)["features"]
+
+    nomi, geometrie = [], []
+    for posizione, elemento in enumerate(feature):
+        proprieta = elemento.get("properties") or {}
+        campi = [campo_nome] if campo_nome else [campo for campo in CAMPI_NOME_ZONA if campo in proprieta]
+        nomi.append(str(proprieta[campi[0]]) if campi else str(posizione))
+        geometrie.append(shape(elemento["geometry"]))
+
+    return np.array(nomi, dtype=object), np.array(geometrie, dtype=object)
+
+
+def assegna_zone(latitudini, longitudini, nomi, geometrie):
+    """
+    Assegna ogni punto alla zona che lo contiene con un'unica interrogazione di un indice STR-tree.
+
+    L'STR-tree scarta in blocco i poligoni il cui rettangolo di ingombro non contiene il punto, per cui il test esatto
+    di intersezione viene eseguito solo sui pochi poligoni rimasti. Se un punto cade in più zone sovrapposte viene
+    assegnato alla prima; i punti senza coordinate non cadono in alcuna zona.
+
+    :param latitudini: Array delle latitudini.
+    :param longitudini: Array delle longitudini.
+    :param nomi: Array dei nomi delle zone.
+    :param geometrie: Array delle geometrie delle zone, nello stesso ordine dei nomi.
+    :return: Array con il nome della zona di ogni punto (None se il punto non cade in alcuna zona).
+    :rtype: np.ndarray
+    """
+    albero = shapely.STRtree(geometrie)
+    punti = shapely.points(np.asarray(longitudini, dtype=float), np.asarray(latitudini, dtype=float))
+
+    indici_punti, indici_zone = albero.query(punti, predicate="intersects")
+
+    zone = np.full(len(punti), None, dtype=object)
+    # Le coppie sono ordinate per punto: in caso di zone sovrapposte si tiene la prima
+    primi = np.unique(indici_punti, return_index=True)[1]
+    zone[indici_punti[primi]] = nomi[indici_zone[primi]]
+
+    return zone
+
+
+def _get_versione_zone(percorso_geojson):
+    """
+    Identifica la versione del file delle zone, così che la cache venga ricalcolata quando il file cambia.
+
+    :param percorso_geojson: Percorso del file GeoJSON.
+    :return: Stringa con dimensione e data di modifica del file.
+    """
+    informazioni = os.stat(percorso_geojson)
+    return f"{informazioni.st_size}-{informazioni.st_mtime_ns}"
+
+
+def aggiorna_zone_annunci(annunci, percorso_geojson, percorso_cache=FILE_ZONE_ANNUNCI_CSV):
+    """
+    Restituisce la zona di ogni annuncio, usando la cache su file e ricalcolando solo gli annunci nuovi, quelli con
+    coordinate cambiate o tutti se il file delle zone è cambiato.
+
+    Gli annunci ricalcolati vengono uniti alla cache, che conserva anche gli annunci non passati (ad esempio quelli
+    esclusi da filtri o dalla deduplicazione). Gli annunci senza coordinate sono salvati senza zona e non vengono
+    ricalcolati finché le coordinate mancano.
+
+    :param annunci: DataFrame con le colonne 'riferimento', 'latitudine' e 'longitudine'.
+    :param percorso_geojson: Percorso del file GeoJSON delle zone.
+    :param percorso_cache: Percorso del file CSV della cache.
+    :return: Array con la zona di ogni annuncio, nello stesso ordine di `annunci`.
+    :rtype: np.ndarray
+    """
+    versione = _get_versione_zone(percorso_geojson)
+    coordinate = annunci[["riferimento", "latitudine", "longitudine"]].reset_index(drop=True)
+
+    cache = None
+    if os.path.exists(percorso_cache):
+        cache = pd.read_csv(percorso_cache, dtype={"zona": object})
+        cache = cache[cache["versione_zone"] == versione].drop_duplicates("riferimento", keep="last")
+
+    if cache is None or cache.empty:
+        confronto = coordinate.assign(zona=None, latitudine_cache=np.nan, longitudine_cache=np.nan, _merge="left_only")
+    else:
+        confronto = coordinate.merge(cache, on="riferimento", how="left", suffixes=("", "_cache"), indicator=True)
+
+    # Coordinate mancanti in entrambe le versioni contano come uguali: l'annuncio resta senza zona
+    da_calcolare = (confronto["_merge"] != "both").to_numpy() | \
+        ~(np.isclose(confronto["latitudine"], confronto["latitudine_cache"], equal_nan=True) &
+          np.isclose(confronto["longitudine"], confronto["longitudine_cache"], equal_nan=True))
+
+    # Gli annunci fuori da ogni zona hanno zona None, anche quando vengono letti dalla cache
+    zone = confronto["zona"].astype(object).where(confronto["zona"].notna(), None).to_numpy(dtype=object, copy=True)
+    if da_calcolare.any():
+        nomi, geometrie = carica_zone(percorso_geojson)
+        nuovi = confronto[da_calcolare]
+        zone[da_calcolare] = assegna_zone(nuovi["latitudine"], nuovi["longitudine"], nomi, geometrie)
+
+        aggiornate = coordinate.assign(zona=zone, versione_zone=versione)
+        if cache is not None:
+            aggiornate = pd.concat([cache[~cache["riferimento"].isin(coordinate["riferimento"])], aggiornate])
+        aggiornate.to_csv(percorso_cache, index=False)
+
+    return zone
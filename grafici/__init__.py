@@ -1,8 +1,10 @@
 from .grafico_a_torta_numero_annunci import plot_grafico_a_torta_numero_annunci
-from .grafico_frequenza_gradi import plot_grafico_frequenza_gradi
+from .grafico_frequenza_gradi import plot_grafico_frequenza_gradi, plot_istogramma_gradi
 from .grafico_funzione_prezzo_transazioni_immobili import plot_grafico_funzione_prezzo_transazioni_immobili
+from .grafico_indice_prezzi import plot_grafico_indice_prezzi
 from .grafico_media_prezzi_nel_tempo import plot_grafico_media_prezzi_nel_tempo
 from .grafico_media_prezzi_nel_tempo_per_categoria import plot_grafico_media_prezzi_nel_tempo_per_categoria
 from .grafico_transazioni_per_anno import plot_grafico_transazioni_per_anno
+from .mappa_prezzi import plot_mappa_prezzi
 from .pairplot_agenzie import pairplot_agenzie
 from .plot_clusterizazzione import plot_clusterizazzione
@@ -1,21 +1,30 @@
 from matplotlib import pyplot as plt
 
 
-def plot_grafico_a_torta_numero_annunci(annunci):
+def plot_grafico_a_torta_numero_annunci(annunci, colonna="agenzia", colonna_etichetta="nome_agenzia"):
     """
     Visualizza un grafico a torta che mostra la distribuzione percentuale degli annunci immobiliari per agenzia.
 
     La funzione raggruppa gli annunci in base al nome dell'agenzia e calcola il conteggio degli annunci per ogni agenzia.
     Il grafico a torta risultante visualizza la percentuale degli annunci di ciascuna agenzia rispetto al totale.
 
+    Con `colonna` si può raggruppare per un'altra chiave, ad esempio 'zona'.
+
     :param annunci: DataFrame contenente gli annunci immobiliari, con le colonne 'agenzia' e 'nome_agenzia'.
     :type annunci: pd.DataFrame
+    :param colonna: Colonna in base alla quale raggruppare gli annunci (default 'agenzia').
+    :type colonna: str
+    :param colonna_etichetta: Colonna da cui leggere le etichette dei gruppi. Se None, si usa il valore di `colonna`.
+    :type colonna_etichetta: str or None
     :return: None. La funzione genera un grafico a torta come output e non restituisce alcun valore.
     """
-    grouped_by_agenzia = annunci.groupby("agenzia")
+    grouped_by_agenzia = annunci.groupby(colonna)
     plt.figure(figsize=(10, 6))
 
-    labels = [group[1]['nome_agenzia'].iloc[0] for group in grouped_by_agenzia]
+    if colonna_etichetta is None:
+        labels = [group[0] for group in grouped_by_agenzia]
+    else:
+        labels = [group[1][colonna_etichetta].iloc[0] for group in grouped_by_agenzia]
     plt.pie(grouped_by_agenzia["riferimento"].count(), autopct='%1.1f%%', labels=labels)
 
     plt.show()
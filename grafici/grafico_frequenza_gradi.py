@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from matplotlib import pyplot as plt
 
@@ -24,3 +25,27 @@ def plot_grafico_frequenza_gradi(grafo):
 
     plt.tight_layout()
     plt.show()
+
+
+def plot_istogramma_gradi(gradi):
+    """
+    Visualizza un istogramma del numero di nodi per ogni grado.
+
+    A differenza di `plot_grafico_frequenza_gradi`, che disegna una barra per nodo, il numero di barre dipende solo dal
+    grado massimo: il grafico resta disegnabile anche con milioni di nodi, ad esempio per `grafo.GrafoSparso`.
+
+    :param gradi: Array con il grado di ogni nodo, come restituito da `GrafoSparso.gradi`.
+    :type gradi: np.ndarray
+    :return: None. La funzione visualizza un grafico a barre e non restituisce alcun valore.
+    """
+    numero_nodi_per_grado = np.bincount(gradi)
+    gradi_presenti = np.flatnonzero(numero_nodi_per_grado)
+
+    plt.figure()
+    plt.bar(gradi_presenti, numero_nodi_per_grado[gradi_presenti], width=1.0)
+    plt.xlabel('Grado')
+    plt.ylabel('Numero di nodi')
+    plt.title('Distribuzione dei gradi dei nodi del grafo delle transazioni')
+
+    plt.tight_layout()
+    plt.show()
@@ -0,0 +1,23 @@
+from matplotlib import pyplot as plt
+
+
+def plot_grafico_indice_prezzi(indice):
+    """
+    Plotta l'indice edonico dei prezzi nel tempo, confrontato con l'indice grezzo delle medie dei prezzi.
+
+    La distanza tra le due curve misura quanto l'andamento della media è dovuto al cambiamento delle caratteristiche
+    degli annunci (metri quadrati, locali, tipologia e zona) invece che dei prezzi.
+
+    :param indice: DataFrame con le colonne 'periodo', 'indice' e 'indice_grezzo', come restituito da
+                   `statistiche.calcola_indice_prezzi`.
+    """
+    plt.figure(figsize=(10, 6))
+    plt.plot(indice["periodo"], indice["indice"], marker="o", label="Indice edonico")
+    plt.plot(indice["periodo"], indice["indice_grezzo"], linestyle="--", label="Indice grezzo")
+    plt.axhline(100, color="grey", linewidth=0.8)
+    plt.title("Indice dei prezzi (primo periodo = 100)")
+    plt.xlabel("Periodo")
+    plt.ylabel("Indice")
+    plt.legend()
+    plt.tight_layout()
+    plt.show()
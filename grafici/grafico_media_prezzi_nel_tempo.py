@@ -1,7 +1,9 @@
 from matplotlib import pyplot as plt
 
+from statistiche.rollup import calcola_media_mobile_rollup
 
-def plot_grafico_media_prezzi_nel_tempo(annunci):
+
+def plot_grafico_media_prezzi_nel_tempo(annunci, rollup=None):
     """
     Plotta un grafico che rappresenta la media mobile settimanale dei prezzi degli annunci nel tempo.
 
@@ -16,9 +18,21 @@ def plot_grafico_media_prezzi_nel_tempo(annunci):
     L'interpolazione lineare viene applicata per gestire eventuali valori NaN nella serie temporale,
     assicurando che il grafico sia continuo e che le tendenze siano facilmente visibili.
 
+    Se viene passato il rollup giornaliero, la media mobile viene calcolata sugli aggregati per giorno, pesati per il
+    numero di osservazioni, invece che sugli annunci.
+
     :param annunci: DataFrame degli annunci immobiliari. Deve contenere le colonne "prezzo" e
                     "data_ultima_modifica_prezzo".
+    :param rollup: Rollup giornaliero dei prezzi (opzionale), come restituito da `statistiche.leggi_rollup`.
     """
+    if rollup is not None:
+        serie = calcola_media_mobile_rollup(rollup)
+        serie.plot(x='data', y='media_settimanale')
+        plt.title("Media prezzi nel tempo")
+        plt.tight_layout()
+        plt.show()
+        return
+
     annunci_senza_prezzi_nan = annunci.dropna(subset=["prezzo"], inplace=False).copy()
     annunci_senza_prezzi_nan.sort_values(by="data_ultima_modifica_prezzo", inplace=True)
     annunci_senza_prezzi_nan["media_settimanale"] = annunci_senza_prezzi_nan["prezzo"].rolling(window=7,
@@ -1,27 +1,47 @@
 from matplotlib import pyplot as plt
 
+from statistiche.rollup import calcola_media_mobile_rollup
+
 
 # Funzione per preparare i dati
-def prepara_dati(annunci):
+def prepara_dati(annunci, colonna_categoria="nome_tipologia"):
     """
-    Prepara i dati degli annunci immobiliari eliminando le righe con prezzo NaN, calcolando la media mobile
-    settimanale e interpolando i dati mancanti.
+    Prepara i dati degli annunci immobiliari eliminando le righe con prezzo NaN e calcolando la media mobile
+    settimanale separatamente per ogni categoria.
 
-    La funzione elimina gli annunci senza prezzo e ordina gli annunci in base alla data di ultima modifica
-    del prezzo. Calcola poi la media mobile settimanale e gestisce eventuali valori NaN attraverso un'interpolazione
-    lineare. Viene infine filtrato il dataset per mantenere solo le righe con una media settimanale maggiore di 0.
+    Gli annunci vengono ordinati una sola volta per categoria e data di ultima modifica del prezzo; la media mobile e
+    il numero di osservazioni vengono poi calcolati con un unico groupby, per cui il costo non dipende dal numero di
+    categorie. Viene infine filtrato il dataset per mantenere solo le righe con una media settimanale maggiore di 0.
 
     :param annunci: DataFrame degli annunci immobiliari.
-                    Deve contenere le colonne "prezzo" e "data_ultima_modifica_prezzo".
-    :return: DataFrame degli annunci preparato.
+                    Deve contenere le colonne "prezzo", "data_ultima_modifica_prezzo" e `colonna_categoria`.
+    :param colonna_categoria: Colonna in base alla quale raggruppare gli annunci.
+    :return: DataFrame degli annunci preparato, con le colonne aggiuntive "media_settimanale" e "conteggio".
+    """
+    annunci_preparati = annunci.dropna(subset=["prezzo", colonna_categoria])
+    annunci_preparati = annunci_preparati.sort_values(by=[colonna_categoria, "data_ultima_modifica_prezzo"],
+                                                      kind="stable")
+
+    # Il groupby restituisce le categorie nello stesso ordine del DataFrame appena ordinato
+    media_settimanale = annunci_preparati.groupby(colonna_categoria)["prezzo"].rolling(window=7, min_periods=1).mean()
+    annunci_preparati = annunci_preparati.assign(media_settimanale=media_settimanale.to_numpy(), conteggio=1)
+
+    return annunci_preparati[annunci_preparati["media_settimanale"] > 0]
+
+
+def prepara_dati_da_rollup(rollup, colonna_categoria="nome_tipologia"):
+    """
+    Prepara la media mobile settimanale per categoria a partire dal rollup giornaliero, con le stesse colonne
+    restituite da `prepara_dati`.
+
+    :param rollup: Rollup giornaliero dei prezzi. Deve contenere la colonna `colonna_categoria`.
+    :param colonna_categoria: Colonna in base alla quale raggruppare gli aggregati.
+    :return: DataFrame con una riga per categoria e giorno.
     """
-    annunci_preparati = annunci.dropna(subset=["prezzo"]).copy()
-    annunci_preparati.sort_values(by="data_ultima_modifica_prezzo", inplace=True)
-    annunci_preparati["media_settimanale"] = annunci_preparati["prezzo"].rolling(window=7, min_periods=1).mean()
-    annunci_preparati["media_settimanale"].interpolate(method="linear", inplace=True)
-    annunci_preparati = annunci_preparati[annunci_preparati["media_settimanale"] > 0]
+    dati_preparati = calcola_media_mobile_rollup(rollup, per=colonna_categoria)
+    dati_preparati = dati_preparati.rename(columns={"data": "data_ultima_modifica_prezzo"})
 
-    return annunci_preparati
+    return dati_preparati[dati_preparati["media_settimanale"] > 0]
 
 
 # Funzione per plottare il grafico per una singola categoria
@@ -47,25 +67,26 @@ def plot_categoria(ax, dati_categoria, nome_categoria):
     ax.legend()
 
 
-def _get_categorie_con_abbastanza_dati(categorie, dati_preparati, soglia=5):
+def _get_categorie_con_abbastanza_dati(dati_preparati, colonna_categoria="nome_tipologia", soglia=5):
     """
-    Restituisce una lista delle categorie che hanno un numero di dati superiore alla soglia specificata.
+    Restituisce i dati di ciascuna categoria che ha un numero di osservazioni superiore alla soglia specificata.
 
     Questa funzione serve a filtrare le categorie che hanno pochi dati, dato che plottare un grafico con pochi
-    punti potrebbe non fornire informazioni significative.
+    punti potrebbe non fornire informazioni significative. I conteggi di tutte le categorie sono calcolati con un
+    solo groupby e i dati vengono suddivisi in un'unica passata.
 
-    :param categorie: Lista delle categorie da controllare.
-    :param dati_preparati: DataFrame contenente i dati preparati.
+    :param dati_preparati: DataFrame contenente i dati preparati, con la colonna "conteggio".
+    :param colonna_categoria: Colonna che identifica la categoria.
     :param soglia: Numero minimo di dati che una categoria deve avere per essere considerata (default è 5).
-    :return: Lista delle categorie che soddisfano la soglia.
+    :return: Lista di tuple (categoria, dati della categoria) per le categorie che soddisfano la soglia.
     """
-    return [
-        categoria for categoria in categorie if
-        len(dati_preparati[dati_preparati['nome_tipologia'] == categoria]) > soglia
-    ]
+    gruppi = dati_preparati.groupby(colonna_categoria, sort=False)
+    conteggi = gruppi["conteggio"].sum()
 
+    return [(categoria, dati_categoria) for categoria, dati_categoria in gruppi if conteggi[categoria] > soglia]
 
-def plot_grafico_media_prezzi_nel_tempo_per_categoria(annunci):
+
+def plot_grafico_media_prezzi_nel_tempo_per_categoria(annunci, rollup=None, colonna_categoria="nome_tipologia"):
     """
     Plotta un set di grafici rappresentanti la media mobile dei prezzi nel tempo per ciascuna categoria
     di annunci immobiliari.
@@ -74,10 +95,19 @@ def plot_grafico_media_prezzi_nel_tempo_per_categoria(annunci):
     per essere plottate. Ogni categoria viene poi visualizzata in un subplot dedicato.
 
     :param annunci: DataFrame degli annunci immobiliari.
-                    Deve contenere le colonne "prezzo", "data_ultima_modifica_prezzo" e "nome_tipologia".
+                    Deve contenere le colonne "prezzo", "data_ultima_modifica_prezzo" e `colonna_categoria`.
+    :param rollup: Rollup giornaliero dei prezzi con la colonna `colonna_categoria` (opzionale). Se presente, le medie
+                   vengono calcolate sugli aggregati giornalieri invece che sugli annunci.
+    :param colonna_categoria: Colonna in base alla quale suddividere i grafici (default "nome_tipologia").
     """
-    dati_preparati = prepara_dati(annunci)
-    categorie = _get_categorie_con_abbastanza_dati(dati_preparati['nome_tipologia'].unique(), dati_preparati)
+    if rollup is None:
+        dati_preparati = prepara_dati(annunci, colonna_categoria)
+    else:
+        dati_preparati = prepara_dati_da_rollup(rollup, colonna_categoria)
+
+    categorie = _get_categorie_con_abbastanza_dati(dati_preparati, colonna_categoria)
+    if not categorie:
+        return
 
     _, axs = plt.subplots(len(categorie), 1, figsize=(10, 3 * len(categorie)))
 
@@ -85,9 +115,8 @@ def plot_grafico_media_prezzi_nel_tempo_per_categoria(annunci):
     if len(categorie) == 1:
         axs = [axs]
 
-    for i, categoria in enumerate(categorie):
-        dati_categoria = dati_preparati[dati_preparati['nome_tipologia'] == categoria]
-        plot_categoria(axs[i], dati_categoria, categoria)
+    for ax, (categoria, dati_categoria) in zip(axs, categorie):
+        plot_categoria(ax, dati_categoria, categoria)
 
     plt.tight_layout()
     plt.show()
@@ -0,0 +1,58 @@
+import logging
+
+import numpy as np
+from matplotlib import pyplot as plt
+
+from geo.griglia import get_lato_cella, riepiloga_griglia
+
+TITOLI_MAPPA = {
+    "mediana_prezzo_mq": "Mediana prezzo al mq (€)",
+    "mediana_prezzo": "Mediana prezzo (€)",
+    "media_prezzo_mq": "Media prezzo al mq (€)",
+    "media_prezzo": "Media prezzo (€)",
+    "conteggio": "Numero di annunci",
+}
+
+
+def plot_mappa_prezzi(griglia, livello, valore="mediana_prezzo_mq", estensione=None):
+    """
+    Disegna la mappa di calore dei prezzi a partire dalla griglia geografica precalcolata.
+
+    Ogni cella del livello scelto è un pixel della mappa, per cui il costo del grafico dipende dal numero di celle e
+    non dal numero di annunci. Le celle senza annunci restano trasparenti.
+
+    :param griglia: Griglia dei prezzi, come restituita da `geo.leggi_griglia` o `geo.calcola_griglia`; basta che
+                    contenga il livello da disegnare.
+    :param livello: Livello della griglia da disegnare (0 è il più grossolano).
+    :param valore: Colonna da rappresentare: una delle chiavi di `TITOLI_MAPPA`.
+    :param estensione: Tupla opzionale (latitudine minima, latitudine massima, longitudine minima, longitudine massima)
+                       dell'area da mostrare.
+    """
+    celle = riepiloga_griglia(griglia, livello)
+    if estensione is not None:
+        latitudine_minima, latitudine_massima, longitudine_minima, longitudine_massima = estensione
+        celle = celle[celle["latitudine"].between(latitudine_minima, latitudine_massima) &
+                      celle["longitudine"].between(longitudine_minima, longitudine_massima)]
+
+    if celle.empty:
+        logging.warning("Nessuna cella della griglia nell'area richiesta")
+        return
+
+    righe = celle["cella_latitudine"] - celle["cella_latitudine"].min()
+    colonne = celle["cella_longitudine"] - celle["cella_longitudine"].min()
+    matrice = np.full((righe.max() + 1, colonne.max() + 1), np.nan)
+    matrice[righe.to_numpy(), colonne.to_numpy()] = celle[valore].to_numpy()
+
+    lato = get_lato_cella(livello)
+    bordi_latitudine = (celle["cella_latitudine"].min() + np.arange(matrice.shape[0] + 1)) * lato
+    bordi_longitudine = (celle["cella_longitudine"].min() + np.arange(matrice.shape[1] + 1)) * lato
+
+    plt.figure(figsize=(10, 8))
+    mesh = plt.pcolormesh(bordi_longitudine, bordi_latitudine, np.ma.masked_invalid(matrice), cmap="inferno")
+    plt.colorbar(mesh, label=TITOLI_MAPPA.get(valore, valore))
+    plt.gca().set_aspect(1 / np.cos(np.radians(np.mean(bordi_latitudine))))
+    plt.title(f"{TITOLI_MAPPA.get(valore, valore)} - {len(celle)} celle da {lato:g}°")
+    plt.xlabel("Longitudine")
+    plt.ylabel("Latitudine")
+    plt.tight_layout()
+    plt.show()
@@ -0,0 +1,153 @@
+"""
+Modello di clusterizzazione degli appartamenti persistito su file e aggiornato in modo incrementale.
+"""
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.preprocessing import StandardScaler
+
+from dati import leggi_annunci, leggi_tipologie
+from dati.caricamento import FILE_ANNUNCI_CSV
+
+FILE_MODELLO_CLUSTER = "files/modelli/cluster_appartamenti.joblib"
+NUMERO_CLUSTER = 6
+COLONNE_CLUSTER = ["prezzo", "mq"]
+NOME_TIPOLOGIA_APPARTAMENTO = "appartamento"
+
+
+class ModelloCluster:
+    """
+    Raggruppa gli appartamenti per prezzo e metri quadrati con un MiniBatchKMeans aggiornato in modo incrementale.
+
+    Il primo addestramento avviene su tutti gli appartamenti disponibili; le esecuzioni successive aggiornano scaler
+    e centroidi solo con gli annunci nuovi o con prezzo modificato, partendo dai centroidi precedenti. Gli ID dei
+    cluster restano quindi stabili tra un'esecuzione e l'altra e il costo dipende dal numero di annunci modificati,
+    non dal totale.
+    """
+
+    def __init__(self, numero_cluster=NUMERO_CLUSTER, seed=0):
+        """
+        Inizializza un modello non ancora addestrato.
+
+        :param numero_cluster: Numero di cluster da generare.
+        :param seed: Seed usato dal KMeans.
+        """
+        self.scaler = StandardScaler()
+        self.kmeans = MiniBatchKMeans(n_clusters=numero_cluster, n_init=10, random_state=seed)
+
+    @property
+    def addestrato(self):
+        """
+        Indica se il modello è già stato addestrato almeno una volta.
+
+        :rtype: bool
+        """
+        return hasattr(self.kmeans, "cluster_centers_")
+
+    @classmethod
+    def carica(cls, percorso=FILE_MODELLO_CLUSTER):
+        """
+        Carica il modello salvato, oppure ne crea uno nuovo se il file non esiste.
+
+        :param percorso: Percorso del file del modello.
+        :return: Il modello caricato o un nuovo modello.
+        :rtype: ModelloCluster
+        """
+        if os.path.exists(percorso):
+            return joblib.load(percorso)
+
+        return cls()
+
+    def salva(self, percorso=FILE_MODELLO_CLUSTER):
+        """
+        Salva il modello su file.
+
+        :param percorso: Percorso del file del modello.
+        """
+        os.makedirs(os.path.dirname(percorso), exist_ok=True)
+        joblib.dump(self, percorso)
+
+    def aggiorna(self, appartamenti):
+        """
+        Aggiorna scaler e centroidi con gli appartamenti nuovi o con prezzo modificato.
+
+        Prima di aggiornare lo scaler i centroidi vengono riportati nella scala originale e poi riproiettati nella
+        nuova, così che l'aggiornamento del KMeans parta dagli stessi centroidi nello spazio aggiornato.
+
+        :param appartamenti: DataFrame con le colonne 'prezzo' e 'mq', senza valori mancanti.
+        """
+        valori = appartamenti[COLONNE_CLUSTER].to_numpy(dtype=float)
+
+        if not self.addestrato:
+            if len(valori) < self.kmeans.n_clusters:
+                return
+
+            self.kmeans.fit(self.scaler.fit_transform(valori))
+        elif len(valori) > 0:
+            centri_scala_originale = self.scaler.inverse_transform(self.kmeans.cluster_centers_)
+            self.scaler.partial_fit(valori)
+            self.kmeans.cluster_centers_ = self.scaler.transform(centri_scala_originale)
+            self.kmeans.partial_fit(self.scaler.transform(valori))
+
+    def centri(self):
+        """
+        Centroidi del modello nella scala originale.
+
+        Dipendono solo dal modello salvato, per cui le etichette dei cluster ricavate da essi restano le stesse
+        qualunque siano i filtri applicati agli appartamenti da disegnare.
+
+        :return: DataFrame con una riga per cluster, indicizzato per ID del cluster, e le colonne `COLONNE_CLUSTER`.
+        :rtype: pd.DataFrame
+        """
+        return pd.DataFrame(self.scaler.inverse_transform(self.kmeans.cluster_centers_), columns=COLONNE_CLUSTER)
+
+    def assegna(self, appartamenti):
+        """
+        Assegna ogni appartamento al cluster con il centroide più vicino.
+
+        :param appartamenti: DataFrame con le colonne 'prezzo' e 'mq'.
+        :return: Array con l'ID del cluster di ogni appartamento.
+        :rtype: np.ndarray
+        """
+        if len(appartamenti) == 0:
+            return np.empty(0, dtype=int)
+
+        return self.kmeans.predict(self.scaler.transform(appartamenti[COLONNE_CLUSTER].to_numpy(dtype=float)))
+
+
+def aggiorna_modello_cluster(annunci_aggiunti, percorso_modello=FILE_MODELLO_CLUSTER, ricostruisci=False,
+                             percorso_annunci=FILE_ANNUNCI_CSV):
+    """
+    Aggiorna il modello salvato con gli appartamenti nuovi o con prezzo modificato e lo salva.
+
+    Viene chiamata da `scraper.py` dopo ogni merge con gli annunci che il merge ha inserito o aggiornato, per cui il
+    modello dipende solo dagli annunci raccolti e non dai filtri applicati nelle analisi, e un annuncio con prezzo
+    modificato viene appreso di nuovo con il nuovo prezzo. Se il modello non è ancora stato salvato ma il file degli
+    annunci esiste, il modello viene addestrato su tutti gli annunci salvati.
+
+    :param annunci_aggiunti: DataFrame degli annunci nuovi o con prezzo modificato, con le colonne 'tipologia',
+                             'prezzo', 'mq' e 'data_ultima_modifica_prezzo'.
+    :param percorso_modello: Percorso del file del modello.
+    :param ricostruisci: Se True, il modello esistente viene scartato e addestrato dai soli annunci aggiunti.
+    :param percorso_annunci: Percorso del file CSV di tutti gli annunci, già aggiornato con il merge.
+    :return: Il modello aggiornato.
+    :rtype: ModelloCluster
+    """
+    if not ricostruisci and not os.path.exists(percorso_modello) and os.path.exists(percorso_annunci):
+        annunci_aggiunti, ricostruisci = leggi_annunci(percorso_annunci), True
+
+    tipologie = leggi_tipologie(indice="id")
+    id_appartamento = tipologie.index[tipologie["nome"] == NOME_TIPOLOGIA_APPARTAMENTO]
+
+    appartamenti = annunci_aggiunti[annunci_aggiunti["tipologia"].isin(id_appartamento)].dropna(subset=COLONNE_CLUSTER)
+    appartamenti = appartamenti.sort_values(by="data_ultima_modifica_prezzo", key=pd.to_datetime)
+
+    modello = ModelloCluster() if ricostruisci else ModelloCluster.carica(percorso_modello)
+    modello.aggiorna(appartamenti)
+    if modello.addestrato:
+        modello.salva(percorso_modello)
+
+    return modello
@@ -1,14 +1,72 @@
 import matplotlib.pyplot as plt
+import numpy as np
 import seaborn as sb
 
+from grafici.rendering_aggregato import SOGLIA_PUNTI_AGGREGAZIONE, campiona_stratificato, disegna_densita
 
-def pairplot_agenzie(annunci):
+VARIABILI_PAIRPLOT = ["prezzo", "mq", "locali"]
+
+
+def _pairplot_aggregato(annunci, variabili, campione_per_agenzia=None, bins=100):
+    """
+    Disegna l'equivalente di un pairplot per grandi quantità di dati.
+
+    Sulla diagonale viene mostrato l'istogramma di ogni variabile per agenzia, fuori dalla diagonale la densità 2D di
+    tutti gli annunci. Se richiesto, alla densità viene sovrapposto un campione stratificato per agenzia.
+
+    :param annunci: DataFrame degli annunci.
+    :param variabili: Variabili da confrontare.
+    :param campione_per_agenzia: Numero di annunci per agenzia da sovrapporre alla densità (None per nessuno).
+    :param bins: Numero di intervalli per asse degli istogrammi.
+    :return: La figura matplotlib.
+    """
+    fig, axs = plt.subplots(len(variabili), len(variabili), figsize=(3 * len(variabili), 3 * len(variabili)))
+    campione = None
+    if campione_per_agenzia:
+        campione = campiona_stratificato(annunci, "agenzia", campione_per_agenzia)
+
+    for riga, variabile_y in enumerate(variabili):
+        for colonna, variabile_x in enumerate(variabili):
+            ax = axs[riga][colonna]
+
+            if riga == colonna:
+                for agenzia, annunci_agenzia in annunci.groupby("agenzia"):
+                    valori = annunci_agenzia[variabile_x].dropna().to_numpy()
+                    conteggi, bordi = np.histogram(valori, bins=bins)
+                    ax.stairs(conteggi, bordi, label=agenzia)
+            else:
+                disegna_densita(ax, annunci[variabile_x], annunci[variabile_y], bins=bins)
+                if campione is not None:
+                    for agenzia, campione_agenzia in campione.groupby("agenzia"):
+                        ax.scatter(campione_agenzia[variabile_x], campione_agenzia[variabile_y], s=2, alpha=0.5,
+                                   label=agenzia)
+
+            if riga == len(variabili) - 1:
+                ax.set_xlabel(variabile_x)
+            if colonna == 0:
+                ax.set_ylabel(variabile_y)
+
+    axs[0][0].legend(title="agenzia")
+    return fig
+
+
+def pairplot_agenzie(annunci, soglia_punti=SOGLIA_PUNTI_AGGREGAZIONE, campione_per_agenzia=None):
     """
     Crea un pairplot delle variabili 'prezzo', 'mq', e 'locali' colorato per 'agenzia'.
 
+    Oltre `soglia_punti` annunci il pairplot di seaborn, che disegna ogni punto, viene sostituito da una versione
+    aggregata con istogrammi e densità 2D, il cui tempo di rendering non dipende dal numero di annunci.
+
     :param annunci: DataFrame con almeno le colonne 'agenzia', 'prezzo', 'mq', e 'locali'.
+    :param soglia_punti: Numero di annunci oltre il quale usare il rendering aggregato.
+    :param campione_per_agenzia: Nel rendering aggregato, numero di annunci per agenzia da disegnare come punti sopra
+                                 la densità (None per nessuno).
     """
-    g = sb.pairplot(annunci, hue="agenzia", vars=["prezzo", "mq", "locali"])
-    g.fig.suptitle("Pairplot per agenzia")
+    if len(annunci) > soglia_punti:
+        fig = _pairplot_aggregato(annunci, VARIABILI_PAIRPLOT, campione_per_agenzia)
+    else:
+        fig = sb.pairplot(annunci, hue="agenzia", vars=VARIABILI_PAIRPLOT).fig
+
+    fig.suptitle("Pairplot per agenzia")
     plt.tight_layout()
     plt.show()
@@ -2,25 +2,28 @@ import locale
 import logging
 
 from matplotlib import pyplot as plt
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
 
+from grafici.modello_cluster import COLONNE_CLUSTER, FILE_MODELLO_CLUSTER, ModelloCluster
+from grafici.rendering_aggregato import SOGLIA_PUNTI_AGGREGAZIONE, campiona_stratificato, disegna_densita
 
-def _genera_clusters(appartamenti):
+
+def _assegna_clusters(appartamenti, percorso_modello=FILE_MODELLO_CLUSTER):
     """
-    Genera clusters utilizzando KMeans basato su prezzo e metri quadrati.
+    Assegna gli appartamenti ai cluster del modello salvato, senza modificarlo.
+
+    Il modello è addestrato e aggiornato da `scraper.py` su tutti gli annunci, così che gli ID dei cluster restino
+    stabili tra le esecuzioni e non dipendano dai filtri applicati agli appartamenti passati.
 
     :param appartamenti: DataFrame con le informazioni sugli appartamenti.
-    :return: Tuple (modello KMeans, oggetto StandardScaler).
+    :param percorso_modello: Percorso del file del modello persistito.
+    :return: Il modello caricato, non addestrato se non è ancora stato salvato.
+    :rtype: ModelloCluster
     """
-    scaler = StandardScaler()
-    appartamenti_standardizzati = scaler.fit_transform(appartamenti[["prezzo", "mq"]])
-
-    kmeans = KMeans(n_clusters=6, n_init=10)
-    kmeans.fit(appartamenti_standardizzati)
-    appartamenti["cluster"] = kmeans.labels_
+    modello = ModelloCluster.carica(percorso_modello)
+    if modello.addestrato:
+        appartamenti["cluster"] = modello.assegna(appartamenti)
 
-    return kmeans, scaler
+    return modello
 
 
 def _stampa_media_prezzi_per_mq(centri, scaler, media_prezzo_per_cluster):
@@ -52,9 +55,13 @@ def _get_label(cluster_id, media_prezzo_per_cluster, media_rapporto_prezzo_mq_pe
     Restituisce una descrizione del cluster in base al rapporto qualità-prezzo,
     al prezzo medio e ai metri quadrati medi del cluster.
 
+    Prezzi e rapporti vanno calcolati dai centroidi del modello salvato e non dagli appartamenti filtrati, così che
+    lo stesso cluster abbia sempre la stessa descrizione.
+
     :param cluster_id: ID del cluster di cui si vuole ottenere la descrizione.
-    :param media_prezzo_per_cluster: Serie contenente il prezzo medio per ogni cluster.
-    :param media_rapporto_prezzo_mq_per_cluster: Serie contenente il rapporto qualità-prezzo medio per ogni cluster.
+    :param media_prezzo_per_cluster: Serie contenente il prezzo del centroide di ogni cluster.
+    :param media_rapporto_prezzo_mq_per_cluster: Serie contenente il rapporto tra prezzo e metri quadrati del
+                                                 centroide di ogni cluster.
     :return: Stringa descrizione del cluster.
     """
     # Questo ci dà una comprensione di quali cluster hanno un buon valore rispetto al prezzo (basso prezzo per mq)
@@ -104,10 +111,9 @@ def _get_cluster_e_label_ordinate(appartamenti, media_prezzo_per_cluster, media_
     Args:
     - appartamenti (pd.DataFrame): DataFrame contenente informazioni sugli appartamenti, inclusa una colonna 'cluster'
      per l'ID del cluster.
-    - media_prezzo_per_cluster (pd.Series): Series con i cluster ID come indici e la media di prezzo come valore.
-    - media_mq_per_cluster (pd.Series): Series con i cluster ID come indici e la media di metri quadri come valore.
-    - media_rapporto_prezzo_mq_per_cluster (pd.Series): Series con i cluster ID come indici e la media del rapporto
-    tra prezzo e metri quadri come valore.
+    - media_prezzo_per_cluster (pd.Series): Series con i cluster ID come indici e il prezzo del centroide come valore.
+    - media_rapporto_prezzo_mq_per_cluster (pd.Series): Series con i cluster ID come indici e il rapporto tra prezzo e
+    metri quadri del centroide come valore.
 
     Returns:
     - list of tuple: Una lista di tuple, dove ogni tupla ha l'ID del cluster come primo elemento e l'etichetta come secondo elemento. La lista è ordinata in base alla priorità delle etichette.
@@ -133,30 +139,51 @@ def _get_cluster_e_label_ordinate(appartamenti, media_prezzo_per_cluster, media_
     )
 
 
-def _plot_cluster_data(appartamenti, cluster_e_etichette_ordinati):
+def _plot_cluster_data(appartamenti, cluster_e_etichette_ordinati, soglia_punti=SOGLIA_PUNTI_AGGREGAZIONE,
+                       campione_per_cluster=2000):
     """
     Plotta i dati degli appartamenti per ogni cluster.
 
+    Oltre `soglia_punti` appartamenti viene disegnata la densità di tutti i punti come immagine raster, con sopra un
+    campione stratificato di al massimo `campione_per_cluster` appartamenti per cluster, così che il tempo di
+    rendering resti costante e i cluster restino distinguibili.
+
     :param appartamenti: DataFrame degli appartamenti.
     :param cluster_e_etichette_ordinati: Lista di tuple con ID del cluster e etichetta associata.
+    :param soglia_punti: Numero di appartamenti oltre il quale usare il rendering aggregato.
+    :param campione_per_cluster: Numero massimo di appartamenti per cluster disegnati nel rendering aggregato.
     """
+    if len(appartamenti) > soglia_punti:
+        disegna_densita(plt.gca(), appartamenti["prezzo"], appartamenti["mq"], cmap="Greys")
+        appartamenti = campiona_stratificato(appartamenti, "cluster", campione_per_cluster)
+
     for cluster_id, label in cluster_e_etichette_ordinati:
         subset = appartamenti[appartamenti["cluster"] == cluster_id]
         plt.scatter(subset["prezzo"], subset["mq"], label=label, cmap='rainbow')
 
 
-def plot_clusterizazzione(annunci):
+def plot_clusterizazzione(annunci, soglia_punti=SOGLIA_PUNTI_AGGREGAZIONE):
+    """
+    Assegna gli appartamenti ai cluster per prezzo e metri quadrati del modello salvato da `scraper.py` e ne disegna il
+    grafico a dispersione, annotando il prezzo medio al mq di ogni cluster.
+
+    :param annunci: DataFrame degli annunci immobiliari.
+    :param soglia_punti: Numero di appartamenti oltre il quale il grafico usa il rendering aggregato.
+    """
     locale.setlocale(locale.LC_ALL, 'it_IT.UTF-8')
 
     appartamenti = annunci[annunci["nome_tipologia"] == "appartamento"].copy()
-    appartamenti_senza_prezzi_nan = appartamenti.dropna(subset=["prezzo"]).copy()
+    appartamenti_senza_prezzi_nan = appartamenti.dropna(subset=COLONNE_CLUSTER).copy()
     appartamenti_senza_prezzi_nan.sort_values(by="data_ultima_modifica_prezzo", inplace=True)
     if len(appartamenti_senza_prezzi_nan) <= 0:
         logging.warning("Non ci sono abbastanza dati per generare i cluster.")
         return
 
-    kmeans, scaler = _genera_clusters(appartamenti_senza_prezzi_nan)
-    if len(kmeans.cluster_centers_) < 6:
+    modello = _assegna_clusters(appartamenti_senza_prezzi_nan)
+    if not modello.addestrato:
+        logging.warning("Il modello dei cluster non è ancora stato addestrato: esegui scraper.py.")
+        return
+    if appartamenti_senza_prezzi_nan["cluster"].nunique() < 6:
         logging.warning("Non ci sono abbastanza dati per generare i cluster.")
         return
 
@@ -164,14 +191,16 @@ def plot_clusterizazzione(annunci):
     media_mq_per_cluster = appartamenti_senza_prezzi_nan.groupby("cluster")["mq"].mean()
     media_rapporto_prezzo_mq_per_cluster = (media_prezzo_per_cluster / media_mq_per_cluster).sort_values()
 
+    # Le etichette dipendono solo dai centroidi del modello salvato, non dagli appartamenti filtrati
+    centri = modello.centri()
+
     plt.figure(figsize=(12, 8))
 
-    cluster_e_etichette_ordinati = _get_cluster_e_label_ordinate(appartamenti_senza_prezzi_nan,
-                                                                 media_prezzo_per_cluster,
-                                                                 media_rapporto_prezzo_mq_per_cluster)
-    _plot_cluster_data(appartamenti_senza_prezzi_nan, cluster_e_etichette_ordinati)
+    cluster_e_etichette_ordinati = _get_cluster_e_label_ordinate(appartamenti_senza_prezzi_nan, centri["prezzo"],
+                                                                 centri["prezzo"] / centri["mq"])
+    _plot_cluster_data(appartamenti_senza_prezzi_nan, cluster_e_etichette_ordinati, soglia_punti)
 
-    _stampa_media_prezzi_per_mq(kmeans.cluster_centers_, scaler, media_rapporto_prezzo_mq_per_cluster)
+    _stampa_media_prezzi_per_mq(modello.kmeans.cluster_centers_, modello.scaler, media_rapporto_prezzo_mq_per_cluster)
 
     plt.legend()
     plt.xlabel("Prezzo")
@@ -0,0 +1,71 @@
+"""
+Funzioni di supporto per disegnare grafici a dispersione con molti punti.
+
+Oltre una certa soglia di punti disegnare ogni singolo marker è lento e produce grafici illeggibili per la
+sovrapposizione. In questi casi i punti vengono prima aggregati con NumPy in un istogramma 2D, disegnato come
+un'unica immagine di densità, ed eventualmente affiancati da un campione stratificato per gruppo.
+"""
+import numpy as np
+import pandas as pd
+from matplotlib.colors import LogNorm
+
+# Numero di punti oltre il quale i grafici passano al rendering aggregato
+SOGLIA_PUNTI_AGGREGAZIONE = 100_000
+
+
+def campiona_stratificato(df, colonna_gruppo, numero_per_gruppo, seed=0):
+    """
+    Estrae un campione casuale di al massimo `numero_per_gruppo` righe per ogni valore di `colonna_gruppo`.
+
+    A ogni riga viene assegnata una chiave casuale e si tengono, per ogni gruppo, le righe con le chiavi più basse:
+    il campionamento è quindi uniforme all'interno di ogni gruppo e richiede un solo groupby.
+
+    :param df: DataFrame da campionare.
+    :param colonna_gruppo: Colonna che identifica gli strati (ad esempio 'agenzia' o 'cluster').
+    :param numero_per_gruppo: Numero massimo di righe per gruppo.
+    :param seed: Seed del generatore di numeri casuali.
+    :return: DataFrame campionato.
+    :rtype: pd.DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    chiavi = pd.Series(rng.random(len(df)), index=df.index)
+    rango = chiavi.groupby(df[colonna_gruppo]).rank(method="first")
+
+    return df[rango <= numero_per_gruppo]
+
+
+def calcola_densita(x, y, bins=200, intervallo=None):
+    """
+    Calcola l'istogramma 2D dei punti (x, y), ignorando le coppie con valori mancanti.
+
+    :param x: Array delle ascisse.
+    :param y: Array delle ordinate.
+    :param bins: Numero di intervalli per asse.
+    :param intervallo: Estremi [[xmin, xmax], [ymin, ymax]] dell'istogramma. Se None, si usano minimo e massimo.
+    :return: Tupla (conteggi, bordi x, bordi y) come restituita da `np.histogram2d`.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    validi = ~(np.isnan(x) | np.isnan(y))
+
+    return np.histogram2d(x[validi], y[validi], bins=bins, range=intervallo)
+
+
+def disegna_densita(ax, x, y, bins=200, cmap="viridis", intervallo=None):
+    """
+    Disegna la densità dei punti (x, y) come un'immagine raster, con scala dei colori logaritmica.
+
+    :param ax: Asse matplotlib su cui disegnare.
+    :param x: Array delle ascisse.
+    :param y: Array delle ordinate.
+    :param bins: Numero di intervalli per asse.
+    :param cmap: Colormap da utilizzare.
+    :param intervallo: Estremi [[xmin, xmax], [ymin, ymax]] dell'istogramma. Se None, si usano minimo e massimo.
+    :return: L'oggetto QuadMesh disegnato, o None se non ci sono punti.
+    """
+    conteggi, bordi_x, bordi_y = calcola_densita(x, y, bins, intervallo)
+    if conteggi.sum() == 0:
+        return None
+
+    conteggi = np.ma.masked_equal(conteggi, 0)
+    return ax.pcolormesh(bordi_x, bordi_y, conteggi.T, cmap=cmap, norm=LogNorm(vmin=1, vmax=conteggi.max()))
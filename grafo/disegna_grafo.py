@@ -1,12 +1,19 @@
-from typing import Dict, List, Tuple, Any
+from typing import Any, Dict, List, Tuple
 
 import networkx as nx
 import numpy as np
 import pandas as pd
 from matplotlib import pyplot as plt
+from matplotlib.collections import PathCollection, PolyCollection
 from matplotlib.lines import Line2D
+from matplotlib.path import Path
 
-from grafo.genera_grafo import genera_grafo
+from grafo.genera_grafo import genera_grafo, get_indice_archi
+
+# Area dei nodi e dei cerchi delle prime transazioni, in punti al quadrato, e dimensione delle frecce in punti
+DIMENSIONE_NODO = 500
+DIMENSIONE_CERCHIO = 1000
+DIMENSIONE_FRECCIA = 20
 
 
 def disegna_grafico_grafi_per_immobile(transazioni: pd.DataFrame):
@@ -95,7 +102,9 @@ def disegna_archi_multipli(grafo: nx.MultiDiGraph, layout: dict, mappa_colori: D
 
     Questa funzione gestisce il rendering degli archi in un grafo dove possono esistere connessioni multiple tra
     la stessa coppia di nodi. Ogni arco viene disegnato con un colore che corrisponde all'immobile che rappresenta
-    e con una curvatura tale da evitare sovrapposizioni con altri archi simili.
+    e con una curvatura tale da evitare sovrapposizioni con altri archi simili. Gli archi di ogni immobile e il numero
+    di archi tra ogni coppia di nodi sono letti dall'indice del grafo, per cui il costo è lineare nel numero di archi;
+    tutti gli archi e tutti i cerchi delle prime transazioni sono disegnati insieme, con poche collezioni matplotlib.
 
     :param grafo: Il grafo da visualizzare.
     :param layout: Un dizionario che assegna a ogni nodo del grafo una posizione (x, y) sul piano del grafico.
@@ -106,58 +115,150 @@ def disegna_archi_multipli(grafo: nx.MultiDiGraph, layout: dict, mappa_colori: D
     :type mappa_colori: Dict[str, str]
     :type ax: matplotlib.axes._axes.Axes or None
     """
-    numero_cerchi_per_nodo = {}
+    if ax is None:
+        ax = plt.gca()
 
+    archi_per_immobile, numero_archi_tra_nodi = get_indice_archi(grafo)
+    archi = []
+    cerchi = []
     for immobile, color in mappa_colori.items():
-        archi_immobile = get_archi_immobile(grafo, immobile)
-        for indice_arco, (u, v, data) in enumerate(archi_immobile):
-            archi_specifici = [(u, v, k) for k in grafo[u][v]]
-            style = calcola_stile_arco(indice_arco, archi_specifici)
+        for indice_arco, (u, v, chiave) in enumerate(archi_per_immobile.get(immobile, [])):
+            archi.append((u, v, color, calcola_curvatura_arco(indice_arco, numero_archi_tra_nodi[(u, v)])))
 
-            if data['prima_transazione_immobile']:
-                disegna_cerchio_prima_transazione_immobile(u, color, layout, numero_cerchi_per_nodo, ax)
+            if grafo[u][v][chiave]['prima_transazione_immobile']:
+                cerchi.append((u, color))
 
-            nx.draw_networkx_edges(
-                grafo, layout,
-                edgelist=[(u, v)],
-                edge_color=color,
-                connectionstyle=style,
-                arrowsize=20,
-                ax=ax,
-            )
+    disegna_cerchi_prime_transazioni_immobili(cerchi, layout, ax)
+    disegna_archi_curvi(archi, layout, ax)
 
 
-def disegna_cerchio_prima_transazione_immobile(nodo, color, layout, numero_cerchi_per_nodo, ax=None):
+def disegna_cerchi_prime_transazioni_immobili(cerchi: List[Tuple[Any, str]], layout, ax) -> None:
     """
-    Disegna un cerchio attorno al nodo che rappresenta la prima transazione per un dato immobile.
+    Disegna con un unico scatter un cerchio attorno ai nodi che hanno effettuato la prima transazione di un immobile.
 
-    La funzione è pensata per evidenziare i nodi che hanno effettuato la prima transazione per un immobile,
-    disegnando attorno a essi un cerchio il cui raggio è proporzionale al numero di transazioni del nodo.
+    Attorno a un nodo con più prime transazioni i cerchi sono concentrici: ogni cerchio è più grande del precedente,
+    nell'ordine della lista.
 
-    :param nodo: Il nodo attorno al quale disegnare il cerchio.
-    :param color: Il colore del cerchio.
+    :param cerchi: Lista di tuple (nodo, colore), una per ogni prima transazione di un immobile.
     :param layout: Il layout dei nodi nel grafico.
-    :param numero_cerchi_per_nodo: Un dizionario che tiene traccia del numero di cerchi già disegnati per nodo.
-    :param ax: L'asse di matplotlib su cui disegnare il cerchio. Se None, usa l'asse corrente.
-    :type nodo: Any
-    :type color: str
+    :param ax: L'asse di matplotlib su cui disegnare i cerchi.
+    :type cerchi: List[Tuple[Any, str]]
     :type layout: Dict
-    :type numero_cerchi_per_nodo: Dict
-    :type ax: matplotlib.axes._axes.Axes or None
+    :type ax: matplotlib.axes._axes.Axes
     """
-    contatore_cerchi = numero_cerchi_per_nodo.get(nodo, 0)
-    offset = 1000 * contatore_cerchi
-    size = 1000 + offset
+    if not cerchi:
+        return
 
-    if ax is None:
-        ax = plt.gca()
+    numero_cerchi_per_nodo = {}
+    dimensioni = []
+    for nodo, _ in cerchi:
+        contatore_cerchi = numero_cerchi_per_nodo.get(nodo, 0)
+        dimensioni.append(DIMENSIONE_CERCHIO * (1 + contatore_cerchi))
+        numero_cerchi_per_nodo[nodo] = contatore_cerchi + 1
+
+    posizioni = np.array([layout[nodo] for nodo, _ in cerchi])
+    ax.scatter(posizioni[:, 0], posizioni[:, 1], s=dimensioni, facecolors='none',
+               edgecolors=[color for _, color in cerchi], linewidths=2)
+
+
+def _get_unita_per_punto(ax) -> np.ndarray:
+    """
+    Calcola quante unità dei dati corrispondono a un punto tipografico sugli assi x e y, con i limiti attuali.
+
+    :param ax: L'asse di matplotlib.
+    :return: Array [unità x per punto, unità y per punto].
+    :rtype: np.ndarray
+    """
+    ax.autoscale_view()
+    pixel_per_punto = ax.figure.dpi / 72
+    origine, punto = ax.transData.inverted().transform([(0, 0), (pixel_per_punto, pixel_per_punto)])
+
+    return np.abs(punto - origine)
+
+
+def _normalizza(vettori: np.ndarray) -> np.ndarray:
+    """
+    :param vettori: Array (n, 2) di vettori.
+    :return: I vettori divisi per la loro norma (i vettori nulli restano nulli).
+    :rtype: np.ndarray
+    """
+    norme = np.linalg.norm(vettori, axis=1, keepdims=True)
+    return np.divide(vettori, norme, out=np.zeros_like(vettori), where=norme > 0)
 
-    ax.scatter(layout[nodo][0], layout[nodo][1], s=size, facecolors='none', edgecolors=color, linewidths=2)
 
-    numero_cerchi_per_nodo[nodo] = numero_cerchi_per_nodo.get(nodo, 0) + 1
+def disegna_archi_curvi(archi: List[Tuple[Any, Any, str, float]], layout, ax) -> None:
+    """
+    Disegna tutti gli archi con due sole collezioni di matplotlib: una `PathCollection` di curve e una
+    `PolyCollection` di punte di freccia.
 
+    Ogni arco è una curva di Bézier quadratica con la stessa geometria dello stile di connessione 'arc3' usato da
+    NetworkX: il punto di controllo è spostato dal punto medio, perpendicolarmente al segmento, di `rad` volte la sua
+    lunghezza. La geometria è calcolata per tutti gli archi insieme in punti tipografici, come fa matplotlib con le
+    frecce, per cui la curvatura non dipende dalle proporzioni degli assi; le estremità sono accorciate del raggio
+    dei nodi e la punta della freccia segue la tangente della curva nel nodo di arrivo.
 
-def calcola_stile_arco(indice_arco: int, archi_specifici: List[Tuple[Any, Any, int]]) -> str:
+    :param archi: Lista di tuple (nodo di partenza, nodo di arrivo, colore, curvatura).
+    :param layout: Dizionario che mappa ogni nodo a una coppia di coordinate (x, y).
+    :param ax: L'asse di matplotlib su cui disegnare gli archi.
+    :type archi: List[Tuple[Any, Any, str, float]]
+    :type layout: Dict
+    :type ax: matplotlib.axes._axes.Axes
+    """
+    if not archi:
+        return
+
+    unita_per_punto = _get_unita_per_punto(ax)
+    partenze = np.array([layout[u] for u, _, _, _ in archi]) / unita_per_punto
+    arrivi = np.array([layout[v] for _, v, _, _ in archi]) / unita_per_punto
+    curvature = np.array([curvatura for _, _, _, curvatura in archi])[:, np.newaxis]
+    colori = [color for _, _, color, _ in archi]
+
+    # Punto di controllo di 'arc3': punto medio spostato perpendicolarmente di rad volte il segmento
+    differenze = arrivi - partenze
+    controlli = (partenze + arrivi) / 2 + curvature * np.column_stack([differenze[:, 1], -differenze[:, 0]])
+
+    raggio_nodo = np.sqrt(DIMENSIONE_NODO) / 2
+    inizi = partenze + raggio_nodo * _normalizza(controlli - partenze)
+    direzioni_arrivo = _normalizza(arrivi - controlli)
+    punte = arrivi - raggio_nodo * direzioni_arrivo
+
+    lunghezza_punta = 0.4 * DIMENSIONE_FRECCIA
+    basi = punte - lunghezza_punta * direzioni_arrivo
+    perpendicolari = 0.2 * DIMENSIONE_FRECCIA * np.column_stack([-direzioni_arrivo[:, 1], direzioni_arrivo[:, 0]])
+
+    curve = np.stack([inizi, controlli, basi], axis=1) * unita_per_punto
+    triangoli = np.stack([punte, basi + perpendicolari, basi - perpendicolari], axis=1) * unita_per_punto
+
+    codici = [Path.MOVETO, Path.CURVE3, Path.CURVE3]
+    ax.add_collection(PathCollection([Path(curva, codici) for curva in curve], facecolors='none',
+                                     edgecolors=colori, linewidths=1, zorder=1), autolim=False)
+    ax.add_collection(PolyCollection(triangoli, facecolors=colori, edgecolors=colori, linewidths=1, zorder=1),
+                      autolim=False)
+    # Il punto più esterno di ogni curva è quello a metà (t = 0.5), perché il controllo è sull'asse del segmento
+    punti_medi = 0.25 * curve[:, 0] + 0.5 * curve[:, 1] + 0.25 * curve[:, 2]
+    ax.update_datalim(np.concatenate([curve[:, 0], punti_medi, curve[:, 2]]))
+    ax.autoscale_view()
+
+
+def calcola_curvatura_arco(indice_arco: int, numero_archi_specifici: int) -> float:
+    """
+    Determina la curvatura di un arco, in modo che gli archi multipli tra gli stessi nodi non si sovrappongano.
+
+    :param indice_arco: Posizione dell'arco corrente nella sequenza di archi tra due nodi.
+    :type indice_arco: Int
+    :param numero_archi_specifici: Numero di archi tra i due nodi.
+    :type numero_archi_specifici: Int
+    :return: Lo spostamento radiale del punto di controllo dell'arco, in frazioni della distanza tra i nodi.
+    :rtype: Float
+    """
+    if numero_archi_specifici > 1:
+        # Lo spostamento radiale è calcolato per distanziare gli archi multipli in modo visibile.
+        return 0.1 + 0.1 * (indice_arco - numero_archi_specifici / 2)
+
+    return 0.1
+
+
+def calcola_stile_arco(indice_arco: int, numero_archi_specifici: int) -> str:
     """
     Determina lo stile di connessione per gli archi di un grafo, gestendo la sovrapposizione di archi multipli.
 
@@ -168,20 +269,13 @@ def calcola_stile_arco(indice_arco: int, archi_specifici: List[Tuple[Any, Any, i
 
     :param indice_arco: Posizione dell'arco corrente nella sequenza di archi tra due nodi.
     :type indice_arco: Int
-    :param archi_specifici: Lista di tuple rappresentanti gli archi tra due nodi.
-    :type archi_specifici: List[Tuple[Any, Any, int]]
+    :param numero_archi_specifici: Numero di archi tra i due nodi.
+    :type numero_archi_specifici: Int
     :return: Una stringa che definisce lo stile di connessione per matplotlib.
              Ad esempio, 'arc3,rad=0.2' indica uno stile di arco curvato con raggio 0.2.
     :rtype: String
     """
-    if len(archi_specifici) > 1:
-        # Lo spostamento radiale è calcolato per distanziare gli archi multipli in modo visibile.
-        rad_offset = 0.1 + 0.1 * (indice_arco - len(archi_specifici) / 2)
-        style = f'arc3,rad={rad_offset}'
-    else:
-        style = 'arc3,rad=0.1'
-
-    return style
+    return f'arc3,rad={calcola_curvatura_arco(indice_arco, numero_archi_specifici)}'
 
 
 def disegna_nodi_e_etichette(grafo: nx.MultiDiGraph, layout, ax=None) -> None:
@@ -198,7 +292,7 @@ def disegna_nodi_e_etichette(grafo: nx.MultiDiGraph, layout, ax=None) -> None:
 
     :return: None
     """
-    nx.draw_networkx_nodes(grafo, layout, ax=ax, node_size=500, node_color='skyblue', alpha=0.9)
+    nx.draw_networkx_nodes(grafo, layout, ax=ax, node_size=DIMENSIONE_NODO, node_color='skyblue', alpha=0.9)
     nx.draw_networkx_labels(grafo, layout, ax=ax)
 
 
@@ -256,7 +350,8 @@ def get_archi_immobile(grafo: nx.MultiDiGraph, immobile: str):
 
     Attraverso questa funzione è possibile estrarre gli archi che rappresentano le transazioni
     collegate a un singolo immobile. Gli archi vengono restituiti in una lista di tuple, dove ogni
-    tupla rappresenta una connessione (arco) nel grafo con i dati relativi.
+    tupla rappresenta una connessione (arco) nel grafo con i dati relativi, in ordine di data.
+    Gli archi sono letti dall'indice del grafo, per cui il costo dipende solo dal numero di archi dell'immobile.
 
     :param grafo: Il grafo diretto multiarco da cui estrarre le informazioni.
     :type grafo: nMultiDiGraph
@@ -266,6 +361,6 @@ def get_archi_immobile(grafo: nx.MultiDiGraph, immobile: str):
              Ogni tupla contiene il nodo di partenza, il nodo di arrivo e un dizionario degli attributi.
     :rtype: List[Tuple[Any, Any, dict]]
     """
-    archi_immobile = list(filter(lambda x: x[2]['immobile'] == immobile, grafo.edges(data=True)))
+    archi_per_immobile, _ = get_indice_archi(grafo)
 
-    return archi_immobile
+    return [(u, v, grafo[u][v][chiave]) for u, v, chiave in archi_per_immobile.get(immobile, [])]
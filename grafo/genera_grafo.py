@@ -1,9 +1,14 @@
-from typing import Tuple, Dict, List, Callable
+from typing import Any, Tuple, Dict, List
 
 import networkx as nx
+import numpy as np
 import pandas as pd
 from matplotlib import pyplot as plt
 
+# Chiavi degli attributi del grafo in cui `indicizza_archi` salva l'indice degli archi
+CHIAVE_ARCHI_PER_IMMOBILE = 'archi_per_immobile'
+CHIAVE_NUMERO_ARCHI_TRA_NODI = 'numero_archi_tra_nodi'
+
 
 def genera_grafo(transazioni) -> Tuple[nx.MultiDiGraph, Dict[str, str]]:
     """
@@ -11,6 +16,7 @@ def genera_grafo(transazioni) -> Tuple[nx.MultiDiGraph, Dict[str, str]]:
 
     Crea un grafo basato sui dati di un DataFrame che rappresenta le transazioni immobiliari. Ogni transazione
     è rappresentata come un arco in un grafo, e ogni arco è colorato in base all'immobile a cui si riferisce.
+    Il grafo contiene anche l'indice degli archi per immobile costruito da `indicizza_archi`.
 
     :param transazioni: Il DataFrame che contiene i dati delle transazioni immobiliari.
     :return: Una tupla contenente il grafo delle transazioni e la mappa dei colori per ogni immobile.
@@ -20,6 +26,7 @@ def genera_grafo(transazioni) -> Tuple[nx.MultiDiGraph, Dict[str, str]]:
     grafo_transazioni = nx.MultiDiGraph()
     mappa_colori = get_mappa_colori(transazioni)
     aggiungi_archi(grafo_transazioni, transazioni, mappa_colori)
+    indicizza_archi(grafo_transazioni)
 
     return grafo_transazioni, mappa_colori
 
@@ -55,58 +62,52 @@ def get_mappa_colori(transazioni: pd.DataFrame) -> Dict[str, str]:
     rappresentano colori. I colori sono scelti da una mappa di colore 'nipy_spectral' per avere una gamma ampia e
     distinta di colori.
     """
-
-    def rgba_to_hex(rgba):
-        return "#{:02x}{:02x}{:02x}".format(
-            int(rgba[0] * 255), int(rgba[1] * 255), int(rgba[2] * 255)
-        )
-
     immobili_unici = get_immobili_unici(transazioni)
-    return {immobile: rgba_to_hex(plt.get_cmap('nipy_spectral')(i / len(immobili_unici))) for i, immobile in
-            enumerate(immobili_unici)}
+    # Un'unica chiamata alla mappa di colore per tutti gli immobili
+    colori = plt.get_cmap('nipy_spectral')(np.arange(len(immobili_unici)) / max(len(immobili_unici), 1))
+    componenti = (colori[:, :3] * 255).astype(int)
 
+    return {immobile: "#{:02x}{:02x}{:02x}".format(*componenti[i]) for i, immobile in enumerate(immobili_unici)}
 
-def get_calcolatore_aumento_prezzo(transazioni: pd.DataFrame) -> Callable[[str, float, int], str]:
+
+def calcola_aumenti_prezzo(transazioni: pd.DataFrame) -> pd.Series:
     """
-    Restituisce una funzione interna che calcola l'aumento di prezzo di un'immobile basato sulle transazioni precedenti.
+    Calcola per ogni transazione l'aumento di prezzo rispetto alla transazione precedente dello stesso immobile.
 
-    La funzione interna `get_aumento_prezzo` calcola la differenza di prezzo tra l'ultima transazione registrata per un
-    dato immobile e il prezzo di una nuova transazione. Se non esistono transazioni precedenti per l'immobile,
-    l'aumento corrisponderà al prezzo della transazione attuale.
+    Le transazioni devono essere già ordinate per data. Per la prima transazione di un immobile l'aumento corrisponde
+    al prezzo della transazione stessa.
 
-    :param transazioni: DataFrame contenente le transazioni degli immobili.
-                        È necessario che il DataFrame abbia le colonne 'id_transazione' e 'prezzo'.
+    :param transazioni: DataFrame delle transazioni ordinato per data, con le colonne 'immobile' e 'prezzo'.
     :type transazioni: pd.DataFrame
-    :return: Una funzione callable che accetta come parametri una stringa che rappresenta l'immobile,
-             un float per il prezzo della transazione e un intero per l'id della transazione.
-             Restituisce una stringa che rappresenta l'aumento del prezzo in euro.
-    :rtype: Callable[[str, float, int], str]
-
-    Note:
-        La funzione restituita mantiene un registro interno delle ultime transazioni per ciascun immobile per calcolare
-        gli aumenti.
-
+    :return: Una serie, con lo stesso indice delle transazioni, degli aumenti di prezzo.
+    :rtype: pd.Series
     """
-    ultime_transazioni_per_immobile = {}
+    # La differenza introduce dei NaN e converte in float: dopo averli riempiti si torna al tipo dei prezzi
+    aumenti_prezzo = transazioni.groupby('immobile', observed=True)['prezzo'].diff().fillna(transazioni['prezzo'])
+    return aumenti_prezzo.astype(transazioni['prezzo'].dtype)
 
-    def get_aumento_prezzo(immobile, prezzo_transazione, id_transazione):
-        ultima_transazione_immobile_id = ultime_transazioni_per_immobile.get(immobile, None)
-        if ultima_transazione_immobile_id is not None:
-            ultima_transazione_immobile = transazioni[(transazioni['id_transazione'] == ultima_transazione_immobile_id)]
-            aumento_prezzo = (prezzo_transazione - ultima_transazione_immobile['prezzo']).iloc[0]
-        else:
-            aumento_prezzo = prezzo_transazione
 
-        if aumento_prezzo > 0:
-            aumento_prezzo = f"+{aumento_prezzo} €"
-        else:
-            aumento_prezzo = f"{aumento_prezzo} €"
-
-        ultime_transazioni_per_immobile[immobile] = id_transazione
+def get_etichette_archi(transazioni: pd.DataFrame, aumenti_prezzo: pd.Series, contatori: pd.Series) -> pd.Series:
+    """
+    Prepara le etichette degli archi: il numero della transazione per l'immobile, la data e l'aumento di prezzo in
+    euro, ad esempio "2. 01/03/1910\n+12000 €".
 
-        return aumento_prezzo
+    :param transazioni: DataFrame delle transazioni ordinato per data.
+    :type transazioni: pd.DataFrame
+    :param aumenti_prezzo: Aumenti di prezzo, come restituiti da `calcola_aumenti_prezzo`.
+    :type aumenti_prezzo: pd.Series
+    :param contatori: Numero progressivo di ogni transazione tra quelle del suo immobile, a partire da 1.
+    :type contatori: pd.Series
+    :return: Una serie delle etichette, con lo stesso indice delle transazioni.
+    :rtype: pd.Series
+    """
+    segni = np.where(aumenti_prezzo > 0, "+", "")
+    # Le date distinte sono molte meno delle transazioni: ognuna viene formattata una sola volta
+    codici_date, date_uniche = pd.factorize(transazioni['data'])
+    date = pd.Series(np.asarray(date_uniche.strftime('%d/%m/%Y'), dtype=object)[codici_date],
+                     index=transazioni.index)
 
-    return get_aumento_prezzo
+    return contatori.astype(str) + ". " + date + "\n" + segni + aumenti_prezzo.astype(str) + " €"
 
 
 def aggiungi_archi(grafo: nx.MultiDiGraph, transazioni: pd.DataFrame, mappa_colori: Dict[str, str]) -> None:
@@ -116,6 +117,9 @@ def aggiungi_archi(grafo: nx.MultiDiGraph, transazioni: pd.DataFrame, mappa_colo
     Gli archi vengono ordinati in base alla data delle transazioni, e ogni arco contiene attributi come l'identificatore
     dell'immobile, l'agenzia, la data e il prezzo della transazione.
 
+    Gli attributi sono calcolati per colonne su tutte le transazioni (aumento di prezzo, prima transazione di ogni
+    immobile, numero progressivo ed etichetta) e gli archi sono aggiunti con un'unica chiamata ad `add_edges_from`.
+
     :param grafo: Grafo diretto di NetworkX sul quale aggiungere gli archi.
     :type grafo: MultiDiGraph
     :param transazioni: DataFrame di pandas che contiene le transazioni con colonne per l'acquirente,
@@ -126,28 +130,73 @@ def aggiungi_archi(grafo: nx.MultiDiGraph, transazioni: pd.DataFrame, mappa_colo
 
     :return: None
     """
-    transazioni = transazioni.sort_values(by='data')
-    prime_transazioni_per_immobile = transazioni.groupby('immobile').first()
-    counter_immobili = {immobile: 1 for immobile in transazioni['immobile']}
-    funzione_calcolo_aumento_prezzo = get_calcolatore_aumento_prezzo(transazioni)
-
-    for _, transazione in transazioni.iterrows():
-        immobile = transazione['immobile']
-        id_transazione = transazione['id_transazione']
-        prima_transazione_immobile = prime_transazioni_per_immobile.loc[immobile]['id_transazione']
-        aumento_prezzo = funzione_calcolo_aumento_prezzo(immobile, transazione['prezzo'], id_transazione)
-
-        grafo.add_edge(
-            transazione['venditore'],
-            transazione['acquirente'],
-            key=id_transazione,
-            immobile=transazione['immobile'],
-            agenzia=transazione['agenzia'],
-            data=transazione['data'],
-            prezzo=transazione['prezzo'],
-            color=mappa_colori[transazione['immobile']],  # Assegna il colore qui,
-            prima_transazione_immobile=id_transazione == prima_transazione_immobile,
-            label=f"{counter_immobili[immobile]}. {transazione['data'].strftime('%d/%m/%Y')}\n{aumento_prezzo}"
+    transazioni = transazioni.sort_values(by='data', kind='stable')
+    posizioni_per_immobile = transazioni.groupby('immobile', observed=True).cumcount()
+    aumenti_prezzo = calcola_aumenti_prezzo(transazioni)
+    etichette = get_etichette_archi(transazioni, aumenti_prezzo, posizioni_per_immobile + 1)
+    colori = transazioni['immobile'].astype(object).map(mappa_colori)
+
+    grafo.add_edges_from(
+        (venditore, acquirente, id_transazione, {
+            'immobile': immobile,
+            'agenzia': agenzia,
+            'data': data,
+            'prezzo': prezzo,
+            'color': colore,
+            'prima_transazione_immobile': prima_transazione,
+            'label': etichetta,
+        })
+        for venditore, acquirente, id_transazione, immobile, agenzia, data, prezzo, colore, prima_transazione, etichetta
+        in zip(
+            transazioni['venditore'].tolist(),
+            transazioni['acquirente'].tolist(),
+            transazioni['id_transazione'].tolist(),
+            transazioni['immobile'].tolist(),
+            transazioni['agenzia'].tolist(),
+            transazioni['data'].tolist(),
+            transazioni['prezzo'].tolist(),
+            colori.tolist(),
+            (posizioni_per_immobile == 0).tolist(),
+            etichette.tolist(),
         )
+    )
+
+
+def indicizza_archi(grafo: nx.MultiDiGraph) -> None:
+    """
+    Costruisce l'indice degli archi del grafo e lo salva tra gli attributi del grafo (`grafo.graph`), in modo che
+    le interrogazioni per immobile e il disegno degli archi non debbano scorrere tutti gli archi per ogni immobile.
+
+    L'indice contiene, sotto `CHIAVE_ARCHI_PER_IMMOBILE`, la lista degli archi (venditore, acquirente, chiave) di ogni
+    immobile in ordine di data e, sotto `CHIAVE_NUMERO_ARCHI_TRA_NODI`, il numero di archi tra ogni coppia ordinata
+    di nodi. Va ricostruito se il grafo viene modificato.
+
+    :param grafo: Il grafo delle transazioni, con gli attributi 'immobile' e 'data' sugli archi.
+    :type grafo: nx.MultiDiGraph
+    :return: None
+    """
+    archi_per_immobile = {}
+    numero_archi_tra_nodi = {}
+    for u, v, chiave, dati in sorted(grafo.edges(keys=True, data=True), key=lambda arco: (arco[3]['data'], arco[2])):
+        archi_per_immobile.setdefault(dati['immobile'], []).append((u, v, chiave))
+        numero_archi_tra_nodi[(u, v)] = numero_archi_tra_nodi.get((u, v), 0) + 1
+
+    grafo.graph[CHIAVE_ARCHI_PER_IMMOBILE] = archi_per_immobile
+    grafo.graph[CHIAVE_NUMERO_ARCHI_TRA_NODI] = numero_archi_tra_nodi
+
+
+def get_indice_archi(
+        grafo: nx.MultiDiGraph
+) -> Tuple[Dict[Any, List[Tuple[Any, Any, Any]]], Dict[Tuple[Any, Any], int]]:
+    """
+    Restituisce l'indice degli archi del grafo, costruendolo se il grafo non lo contiene ancora.
+
+    :param grafo: Il grafo delle transazioni.
+    :type grafo: nx.MultiDiGraph
+    :return: Una tupla con il dizionario immobile -> archi in ordine di data e il dizionario (u, v) -> numero di archi.
+    :rtype: Tuple[Dict[Any, List[Tuple[Any, Any, Any]]], Dict[Tuple[Any, Any], int]]
+    """
+    if CHIAVE_ARCHI_PER_IMMOBILE not in grafo.graph:
+        indicizza_archi(grafo)
 
-        counter_immobili[immobile] += 1
+    return grafo.graph[CHIAVE_ARCHI_PER_IMMOBILE], grafo.graph[CHIAVE_NUMERO_ARCHI_TRA_NODI]
@@ -0,0 +1,225 @@
+"""
+Grafo delle transazioni in forma compatta, per dataset troppo grandi per un `nx.MultiDiGraph`.
+
+Acquirenti e venditori sono codificati come interi in un'unica tabella dei nodi e ogni transazione è un arco
+(venditore, acquirente) memorizzato in array NumPy paralleli, insieme a prezzo, data, immobile e agenzia: qualche
+decina di byte per transazione invece di un dizionario Python per arco. Le adiacenze sono matrici sparse CSR di
+scipy e gli archi di ogni immobile sono ordinati per data in un indice CSR, per cui grado, vicini e catena delle
+vendite di un immobile si calcolano senza scorrere tutte le transazioni. Solo i sottografi piccoli da disegnare
+vengono convertiti in NetworkX.
+"""
+from typing import Any, Iterable, List, Tuple, Union
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from grafo.genera_grafo import genera_grafo, indicizza_archi
+
+
+def _codifica(colonne: List[pd.Series]) -> Tuple[List[np.ndarray], pd.Index]:
+    """
+    Codifica una o più colonne con un'unica tabella di valori, usando i codici delle colonne categoriche quando
+    disponibili invece di confrontare le stringhe di ogni riga.
+
+    :param colonne: Colonne da codificare.
+    :type colonne: List[pd.Series]
+    :return: Una tupla con i codici di ogni colonna (interi, -1 per i valori mancanti) e la tabella dei valori.
+    :rtype: Tuple[List[np.ndarray], pd.Index]
+    """
+    valori_colonne = []
+    for colonna in colonne:
+        if isinstance(colonna.dtype, pd.CategoricalDtype):
+            valori_colonne.append((colonna.cat.codes.to_numpy(), colonna.cat.categories))
+        else:
+            codici, valori = pd.factorize(colonna)
+            valori_colonne.append((codici, pd.Index(valori)))
+
+    tabella = valori_colonne[0][1]
+    for _, valori in valori_colonne[1:]:
+        tabella = tabella.union(valori)
+
+    codici_colonne = []
+    for codici, valori in valori_colonne:
+        posizioni = tabella.get_indexer(valori).astype(np.int32)
+        codici_colonne.append(np.where(codici >= 0, posizioni[codici], -1).astype(np.int32))
+
+    return codici_colonne, tabella
+
+
+def _indice_csr(chiavi: np.ndarray, numero_chiavi: int, ordine: np.ndarray) -> np.ndarray:
+    """
+    Calcola i puntatori di un indice CSR: gli elementi della chiave `k` sono `ordine[puntatori[k]:puntatori[k + 1]]`.
+
+    :param chiavi: Chiave di ogni elemento.
+    :param numero_chiavi: Numero di chiavi distinte possibili.
+    :param ordine: Permutazione che ordina gli elementi per chiave.
+    :return: Array dei puntatori, di lunghezza `numero_chiavi + 1`.
+    :rtype: np.ndarray
+    """
+    puntatori = np.zeros(numero_chiavi + 1, dtype=np.int64)
+    np.cumsum(np.bincount(chiavi[ordine], minlength=numero_chiavi), out=puntatori[1:])
+    return puntatori
+
+
+class GrafoSparso:
+    """
+    Multigrafo diretto delle transazioni: un arco dal venditore all'acquirente per ogni transazione.
+    """
+
+    def __init__(self, transazioni: pd.DataFrame):
+        """
+        :param transazioni: DataFrame delle transazioni, con le colonne di `dati.SCHEMA_TRANSAZIONI`.
+        """
+        (self.origini, self.destinazioni), self.nodi = _codifica([transazioni['venditore'],
+                                                                   transazioni['acquirente']])
+        (self.codici_immobili,), self.immobili = _codifica([transazioni['immobile']])
+        (self.codici_agenzie,), self.agenzie = _codifica([transazioni['agenzia']])
+        self.id_transazioni = transazioni['id_transazione'].to_numpy()
+        self.prezzi = transazioni['prezzo'].to_numpy()
+        self.date = transazioni['data'].to_numpy()
+
+        self.numero_nodi = len(self.nodi)
+        self.numero_archi = len(self.origini)
+
+        # Numero di archi tra ogni coppia di nodi: la conversione in CSR somma gli archi paralleli
+        uni = np.ones(self.numero_archi, dtype=np.int32)
+        forma = (self.numero_nodi, self.numero_nodi)
+        self.adiacenza_uscita = sparse.coo_matrix((uni, (self.origini, self.destinazioni)), shape=forma).tocsr()
+        self.adiacenza_entrata = self.adiacenza_uscita.T.tocsr()
+
+        # Archi di ogni immobile in ordine di data (e di ID a parità di data)
+        self._ordine_immobili = np.lexsort((self.id_transazioni, self.date, self.codici_immobili))
+        self._puntatori_immobili = _indice_csr(self.codici_immobili, len(self.immobili), self._ordine_immobili)
+
+    def _get_codice_nodo(self, nodo: Any) -> int:
+        """
+        :param nodo: Il codice fiscale di un utente.
+        :return: Il numero del nodo.
+        :rtype: int
+        :raises KeyError: Se il nodo non esiste.
+        """
+        codice = self.nodi.get_indexer([nodo])[0]
+        if codice < 0:
+            raise KeyError(nodo)
+
+        return codice
+
+    def gradi(self) -> np.ndarray:
+        """
+        :return: Il grado di ogni nodo (archi entranti più archi uscenti, contando quelli paralleli), nell'ordine di
+                 `nodi`.
+        :rtype: np.ndarray
+        """
+        return np.bincount(self.origini, minlength=self.numero_nodi) + \
+            np.bincount(self.destinazioni, minlength=self.numero_nodi)
+
+    def degree(self, nodo: Any = None) -> Union[int, List[Tuple[Any, int]]]:
+        """
+        Grado dei nodi con la stessa semantica di `nx.MultiDiGraph.degree`, in modo che il grafo possa essere usato
+        al posto di quello NetworkX, ad esempio in `grafici.plot_grafico_frequenza_gradi`.
+
+        :param nodo: Un nodo, oppure None per tutti i nodi.
+        :return: Il grado del nodo, oppure la lista di coppie (nodo, grado).
+        :rtype: Union[int, List[Tuple[Any, int]]]
+        """
+        if nodo is not None:
+            codice = self._get_codice_nodo(nodo)
+            return int(self.adiacenza_uscita[codice].sum() + self.adiacenza_entrata[codice].sum())
+
+        return list(zip(self.nodi, self.gradi().tolist()))
+
+    def successori(self, nodo: Any) -> List[Any]:
+        """
+        :param nodo: Un nodo.
+        :return: Gli utenti che hanno comprato almeno una casa dal nodo.
+        :rtype: List[Any]
+        """
+        codice = self._get_codice_nodo(nodo)
+        inizio, fine = self.adiacenza_uscita.indptr[codice:codice + 2]
+        return self.nodi[self.adiacenza_uscita.indices[inizio:fine]].tolist()
+
+    def predecessori(self, nodo: Any) -> List[Any]:
+        """
+        :param nodo: Un nodo.
+        :return: Gli utenti che hanno venduto almeno una casa al nodo.
+        :rtype: List[Any]
+        """
+        codice = self._get_codice_nodo(nodo)
+        inizio, fine = self.adiacenza_entrata.indptr[codice:codice + 2]
+        return self.nodi[self.adiacenza_entrata.indices[inizio:fine]].tolist()
+
+    def get_archi_immobile(self, immobile: Any) -> np.ndarray:
+        """
+        :param immobile: Identificativo dell'immobile.
+        :return: Le posizioni degli archi dell'immobile, in ordine di data.
+        :rtype: np.ndarray
+        """
+        codice = self.immobili.get_indexer([immobile])[0]
+        if codice < 0:
+            return np.empty(0, dtype=np.int64)
+
+        inizio, fine = self._puntatori_immobili[codice:codice + 2]
+        return self._ordine_immobili[inizio:fine]
+
+    def get_transazioni(self, archi: Iterable[int] = None) -> pd.DataFrame:
+        """
+        Ricostruisce il DataFrame delle transazioni di alcuni archi.
+
+        :param archi: Posizioni degli archi, oppure None per tutti.
+        :return: DataFrame con le colonne di `dati.SCHEMA_TRANSAZIONI`.
+        :rtype: pd.DataFrame
+        """
+        archi = np.arange(self.numero_archi) if archi is None else np.asarray(archi, dtype=np.int64)
+
+        return pd.DataFrame({
+            'id_transazione': self.id_transazioni[archi],
+            'acquirente': pd.Categorical.from_codes(self.destinazioni[archi], self.nodi),
+            'venditore': pd.Categorical.from_codes(self.origini[archi], self.nodi),
+            'agenzia': pd.Categorical.from_codes(self.codici_agenzie[archi], self.agenzie),
+            'immobile': pd.Categorical.from_codes(self.codici_immobili[archi], self.immobili),
+            'prezzo': self.prezzi[archi],
+            'data': self.date[archi],
+        })
+
+    def get_catena_immobile(self, immobile: Any) -> pd.DataFrame:
+        """
+        :param immobile: Identificativo dell'immobile.
+        :return: Le transazioni dell'immobile in ordine di data: il venditore di ognuna è l'acquirente della
+                 precedente.
+        :rtype: pd.DataFrame
+        """
+        return self.get_transazioni(self.get_archi_immobile(immobile))
+
+    def get_transazioni_immobili(self, immobili: Iterable[Any]) -> pd.DataFrame:
+        """
+        :param immobili: Identificativi degli immobili.
+        :return: Le transazioni dei soli immobili indicati, ognuno in ordine di data, con le sole categorie usate.
+        :rtype: pd.DataFrame
+        """
+        archi = [self.get_archi_immobile(immobile) for immobile in immobili]
+        archi = np.concatenate(archi) if archi else np.empty(0, dtype=np.int64)
+
+        transazioni = self.get_transazioni(archi)
+        colonne_categoriche = ['acquirente', 'venditore', 'agenzia', 'immobile']
+        transazioni[colonne_categoriche] = transazioni[colonne_categoriche].apply(
+            lambda colonna: colonna.cat.remove_unused_categories())
+        return transazioni
+
+    def sottografo_networkx(self, immobili: Iterable[Any]) -> Tuple[nx.MultiDiGraph, dict]:
+        """
+        Converte in un grafo NetworkX le sole transazioni di alcuni immobili, ad esempio per disegnarle con
+        `grafo.disegna_grafo.disegna_grafo`.
+
+        :param immobili: Identificativi degli immobili.
+        :return: Il grafo e la mappa dei colori, come restituiti da `genera_grafo`.
+        :rtype: Tuple[nx.MultiDiGraph, dict]
+        """
+        transazioni = self.get_transazioni_immobili(immobili)
+        if transazioni.empty:
+            grafo = nx.MultiDiGraph()
+            indicizza_archi(grafo)
+            return grafo, {}
+
+        return genera_grafo(transazioni)
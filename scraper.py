@@ -3,11 +3,19 @@ Modulo per recuperare annunci immobiliari da agenzie immobiliari.
 """
 import importlib
 import logging
+import os
 
 import numpy as np
 import pandas as pd
 
-FILE_AGENZIE_CSV = "files/agenzie.csv"
+from dati import leggi_agenzie, leggi_annunci
+from dati.caricamento import FILE_ANNUNCI_CSV
+from geo.deduplicazione import aggiorna_proprieta
+from geo.griglia import aggiorna_griglia
+from grafici.modello_cluster import aggiorna_modello_cluster
+from statistiche.cache import pubblica_versione_dati
+from statistiche.indice_prezzi import aggiorna_indice_prezzi
+from statistiche.rollup import aggiorna_rollup
 
 
 def get_annunci() -> pd.DataFrame:
@@ -19,7 +27,7 @@ def get_annunci() -> pd.DataFrame:
     :return: Un DataFrame contenente tutti gli annunci recuperati da tutte le agenzie.
     """
     annunci_nuovi = pd.DataFrame()
-    agenzie = pd.read_csv(FILE_AGENZIE_CSV)
+    agenzie = leggi_agenzie()
 
     for index, agenzia in agenzie.iterrows():
         module_name, class_name = agenzia["scraper"].rsplit('.', 1)
@@ -34,7 +42,8 @@ def get_annunci() -> pd.DataFrame:
     return annunci_nuovi
 
 
-def merge_annunci(annunci_vecchi: pd.DataFrame, annunci_nuovi: pd.DataFrame) -> pd.DataFrame:
+def merge_annunci(annunci_vecchi: pd.DataFrame, annunci_nuovi: pd.DataFrame,
+                  riferimenti_modificati: list | None = None) -> pd.DataFrame:
     """
     Unisce un DataFrame di annunci vecchi con uno di annunci nuovi. Se un annuncio nel DataFrame nuovo ha lo stesso
     indice di un annuncio nel DataFrame vecchio, l'annuncio vecchio viene aggiornato solo se il prezzo è cambiato.
@@ -42,13 +51,19 @@ def merge_annunci(annunci_vecchi: pd.DataFrame, annunci_nuovi: pd.DataFrame) ->
 
     :param annunci_vecchi: DataFrame contenente gli annunci vecchi, con l'indice impostato al riferimento dell'annuncio.
     :param annunci_nuovi: DataFrame contenente gli annunci nuovi, con l'indice impostato al riferimento dell'annuncio.
+    :param riferimenti_modificati: Lista (opzionale) a cui vengono aggiunti i riferimenti degli annunci inseriti o
+                                   aggiornati, usata per gli aggiornamenti incrementali dei dati derivati.
     :return: DataFrame contenente gli annunci vecchi aggiornati con le informazioni degli annunci nuovi.
     """
+    if riferimenti_modificati is None:
+        riferimenti_modificati = []
+
     for riferimento, annuncio_nuovo in annunci_nuovi.iterrows():
         try:
             annuncio_vecchio_relativo = annunci_vecchi.loc[riferimento]
         except KeyError:
             annunci_vecchi.loc[riferimento] = annuncio_nuovo
+            riferimenti_modificati.append(riferimento)
             logging.info(f"Nuovo annuncio {riferimento}")
             continue
 
@@ -57,6 +72,7 @@ def merge_annunci(annunci_vecchi: pd.DataFrame, annunci_nuovi: pd.DataFrame) ->
                 logging.info(
                     f"Annuncio {riferimento} ha cambiato prezzo da {annuncio_vecchio_relativo['prezzo']} a {annuncio_nuovo['prezzo']}")
                 annunci_vecchi.loc[riferimento] = annuncio_nuovo
+                riferimenti_modificati.append(riferimento)
 
     return annunci_vecchi
 
@@ -69,20 +85,44 @@ def main():
 
     Gli altri campi non sono considerati per l'aggiornamento, poiché l'obiettivo è tracciare le variazioni di prezzo
     piuttosto che gli errori di inserimento o altre modifiche.
+
+    Dopo il salvataggio, il rollup giornaliero dei prezzi, le statistiche dell'indice edonico, l'associazione tra
+    annunci duplicati e immobili e la griglia geografica dei prezzi vengono aggiornati con i soli annunci nuovi o
+    modificati. Dal rollup, dall'indice e dalla griglia viene tolta la versione precedente degli annunci con prezzo
+    modificato, salvata prima del merge. Anche il modello dei cluster degli appartamenti viene aggiornato con i soli
+    annunci nuovi o modificati. Infine viene pubblicata una nuova versione dei dati, che invalida la cache dei risultati
+    di `analyzer.py`.
     """
     annunci_nuovi = get_annunci()
-    annunci_vecchi = pd.read_csv(FILE_AGENZIE_CSV, index_col="riferimento")
+    annunci_vecchi = leggi_annunci(FILE_ANNUNCI_CSV, indice="riferimento") if os.path.exists(FILE_ANNUNCI_CSV) \
+        else pd.DataFrame()
 
     if not annunci_vecchi.empty:
         if annunci_vecchi.columns.equals(annunci_nuovi.columns):
-            annunci_merge = merge_annunci(annunci_vecchi, annunci_nuovi)
-            annunci_merge.to_csv("files/annunci.csv")
+            riferimenti_modificati = []
+            # merge_annunci modifica gli annunci vecchi sul posto: le righe che potrebbero cambiare vanno copiate prima
+            annunci_precedenti = annunci_vecchi.loc[annunci_vecchi.index.intersection(annunci_nuovi.index)].copy()
+            annunci_merge = merge_annunci(annunci_vecchi, annunci_nuovi, riferimenti_modificati)
+            annunci_merge.to_csv(FILE_ANNUNCI_CSV)
+            annunci_rimossi = annunci_precedenti[annunci_precedenti.index.isin(riferimenti_modificati)]
+            aggiorna_rollup(annunci_merge.loc[riferimenti_modificati], annunci_rimossi)
+            aggiorna_indice_prezzi(annunci_merge.loc[riferimenti_modificati], annunci_rimossi)
+            aggiorna_proprieta(annunci_merge.reset_index(), riferimenti_modificati)
+            aggiorna_modello_cluster(annunci_merge.loc[riferimenti_modificati])
+            aggiorna_griglia(annunci_merge.loc[riferimenti_modificati], annunci_rimossi)
+            pubblica_versione_dati()
 
             logging.info("Annunci aggiornati")
         else:
             logging.error("Annunci vecchi e nuovi hanno colonne diverse")
     else:
-        annunci_nuovi.to_csv("files/annunci.csv")
+        annunci_nuovi.to_csv(FILE_ANNUNCI_CSV)
+        aggiorna_rollup(annunci_nuovi, ricostruisci=True)
+        aggiorna_indice_prezzi(annunci_nuovi, ricostruisci=True)
+        aggiorna_proprieta(annunci_nuovi.reset_index())
+        aggiorna_modello_cluster(annunci_nuovi, ricostruisci=True)
+        aggiorna_griglia(annunci_nuovi, ricostruisci=True)
+        pubblica_versione_dati()
 
 
 if __name__ == '__main__':
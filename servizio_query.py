@@ -0,0 +1,333 @@
+"""
+Servizio HTTP locale che risponde alle interrogazioni sugli annunci senza ricaricare i dati a ogni domanda.
+
+Il servizio carica una sola volta gli annunci, l'indice dei prezzi per gli scenari di filtri, il rollup giornaliero e
+le statistiche dell'indice edonico, e risponde in JSON con la stessa semantica dei filtri di `analyzer.py`. Ogni
+richiesta è servita da un thread e legge un'istantanea immutabile dei dati; un thread in background controlla
+periodicamente la versione dei dati pubblicata da `scraper.py` e, quando cambia, prepara una nuova istantanea e la
+sostituisce a quella corrente senza interrompere le richieste in corso.
+"""
+import argparse
+import json
+import logging
+import math
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+from dati import leggi_annunci, leggi_tipologie
+from dati.caricamento import FILE_ANNUNCI_CSV
+from statistiche import MotoreScenari, StatisticheIndicePrezzi, calcola_media_mobile_rollup, get_versione_dati, \
+    leggi_rollup
+
+COLONNE_ANNUNCI_SERVIZIO = ["agenzia", "latitudine", "longitudine", "prezzo"]
+PARAMETRI_FILTRI = {
+    "prezzo_minimo": int,
+    "prezzo_massimo": int,
+    "latitudine": float,
+    "longitudine": float,
+    "raggio": float,
+    "agenzia": str,
+}
+CATEGORIE_SERIE = ["nome_tipologia", "agenzia"]
+# Numero massimo di sottoinsiemi di annunci (agenzia e area) indicizzati in memoria
+NUMERO_MASSIMO_SOTTOINSIEMI = 1024
+
+
+class DatiServizio:
+    """
+    Istantanea dei dati servita alle richieste. Non viene mai modificata dopo la costruzione, a parte le cache
+    interne dei risultati, per cui può essere letta da più thread contemporaneamente.
+    """
+
+    def __init__(self, versione):
+        """
+        Carica i dati e costruisce gli indici.
+
+        :param versione: Versione dei dati, come restituita da `statistiche.get_versione_dati`.
+        """
+        annunci = leggi_annunci(FILE_ANNUNCI_CSV, colonne=COLONNE_ANNUNCI_SERVIZIO)
+        tipologie = leggi_tipologie(indice="id").add_suffix('_tipologia')
+
+        self.versione = versione
+        self.numero_annunci = len(annunci)
+        self.agenzie = set(annunci["agenzia"].dropna())
+        self.motore = MotoreScenari(annunci, numero_massimo_sottoinsiemi=NUMERO_MASSIMO_SOTTOINSIEMI)
+        self.rollup = leggi_rollup().join(tipologie, on="tipologia", how="inner")
+
+        statistiche_indice = StatisticheIndicePrezzi.carica()
+        self.indice = statistiche_indice.calcola_indice() if statistiche_indice is not None else None
+
+        self._serie = {}
+
+    def get_serie(self, agenzia=None, per=None):
+        """
+        Restituisce (calcolandola una sola volta) la media mobile settimanale dei prezzi dal rollup.
+
+        :param agenzia: ID dell'agenzia o None.
+        :param per: Colonna opzionale per cui calcolare una serie separata.
+        :return: DataFrame della serie, come restituito da `statistiche.calcola_media_mobile_rollup`.
+        :rtype: pd.DataFrame
+        """
+        chiave = (agenzia, per)
+        if chiave not in self._serie:
+            rollup = self.rollup[self.rollup["agenzia"] == agenzia] if agenzia else self.rollup
+            self._serie[chiave] = calcola_media_mobile_rollup(rollup, per=per)
+
+        return self._serie[chiave]
+
+
+class ErroreRichiesta(Exception):
+    """
+    Errore dovuto ai parametri di una richiesta, restituito al client con stato 400.
+    """
+
+
+def _get_filtri(parametri, dati):
+    """
+    Converte e valida i filtri di una richiesta, con gli stessi vincoli di `analyzer.py`.
+
+    :param parametri: Parametri della query string, come restituiti da `parse_qs`.
+    :param dati: Istantanea dei dati corrente.
+    :return: Dizionario dei filtri.
+    :rtype: dict
+    :raises ErroreRichiesta: Se un filtro non è valido.
+    """
+    filtri = {}
+    for nome, tipo in PARAMETRI_FILTRI.items():
+        if nome in parametri:
+            try:
+                filtri[nome] = tipo(parametri[nome][-1])
+            except ValueError as errore:
+                raise ErroreRichiesta(f"Valore non valido per {nome}: {parametri[nome][-1]}") from errore
+
+    area = [filtri.get("latitudine"), filtri.get("longitudine"), filtri.get("raggio")]
+    if any(area) and not all(area):
+        raise ErroreRichiesta("Se specifichi uno tra latitudine, longitudine o raggio, devi specificare anche gli "
+                              "altri.")
+
+    if filtri.get("prezzo_minimo") and filtri.get("prezzo_massimo") and \
+            filtri["prezzo_minimo"] > filtri["prezzo_massimo"]:
+        raise ErroreRichiesta("Il prezzo minimo deve essere minore del prezzo massimo.")
+
+    if filtri.get("agenzia") and filtri["agenzia"] not in dati.agenzie:
+        raise ErroreRichiesta(f"Agenzia sconosciuta: {filtri['agenzia']}")
+
+    return filtri
+
+
+def _senza_nan(valori):
+    """
+    Sostituisce i NaN di un dizionario con None, che in JSON diventa null.
+
+    :param valori: Dizionario di valori.
+    :return: Il dizionario senza NaN.
+    :rtype: dict
+    """
+    return {
+        nome: None if isinstance(valore, float) and math.isnan(valore) else valore
+        for nome, valore in valori.items()
+    }
+
+
+def _a_record(df):
+    """
+    Converte un DataFrame in una lista di record serializzabili in JSON, con date in formato ISO e NaN come null.
+
+    :param df: DataFrame da convertire.
+    :return: Lista di dizionari.
+    :rtype: list
+    """
+    return json.loads(df.to_json(orient="records", date_format="iso"))
+
+
+class GestoreRichieste(BaseHTTPRequestHandler):
+    """
+    Gestisce le richieste GET del servizio. Le risposte sono sempre in JSON.
+
+    - `/statistiche`: statistiche sui prezzi degli annunci che rispettano i filtri `prezzo_minimo`, `prezzo_massimo`,
+      `latitudine`, `longitudine`, `raggio` e `agenzia`.
+    - `/serie`: media mobile settimanale dei prezzi dal rollup, eventualmente per `agenzia` e separata `per`
+      tipologia (`nome_tipologia`) o agenzia.
+    - `/indice`: indice edonico dei prezzi.
+    - `/versione`: versione dei dati servita e numero di annunci.
+    """
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        Smista la richiesta all'endpoint corrispondente.
+        """
+        url = urlparse(self.path)
+        parametri = parse_qs(url.query)
+        # Una sola lettura: se i dati vengono ricaricati nel frattempo, la richiesta usa comunque un'istantanea coerente
+        dati = self.server.dati
+
+        endpoint = {
+            "/statistiche": self._statistiche,
+            "/serie": self._serie,
+            "/indice": self._indice,
+            "/versione": self._versione,
+        }.get(url.path)
+
+        if endpoint is None:
+            self._rispondi(HTTPStatus.NOT_FOUND, {"errore": f"Endpoint sconosciuto: {url.path}"})
+            return
+
+        try:
+            self._rispondi(HTTPStatus.OK, endpoint(parametri, dati))
+        except ErroreRichiesta as errore:
+            self._rispondi(HTTPStatus.BAD_REQUEST, {"errore": str(errore)})
+        except Exception as errore:  # pylint: disable=broad-except
+            # Senza risposta il client vedrebbe solo la connessione chiusa
+            logging.exception(f"Errore durante la richiesta {self.path}")
+            self._rispondi(HTTPStatus.INTERNAL_SERVER_ERROR, {"errore": f"Errore interno: {errore}"})
+
+    @staticmethod
+    def _statistiche(parametri, dati):
+        """
+        Statistiche sui prezzi degli annunci filtrati, con il tempo di calcolo in millisecondi.
+        """
+        inizio = time.perf_counter()
+        statistiche = dati.motore.valuta_scenario(**_get_filtri(parametri, dati))
+        statistiche["durata_ms"] = (time.perf_counter() - inizio) * 1000
+
+        return _senza_nan(statistiche)
+
+    @staticmethod
+    def _serie(parametri, dati):
+        """
+        Media mobile settimanale dei prezzi dal rollup.
+        """
+        agenzia = _get_filtri(parametri, dati).get("agenzia")
+        per = parametri.get("per", [None])[-1]
+        if per is not None and per not in CATEGORIE_SERIE:
+            raise ErroreRichiesta(f"Il parametro per deve essere uno tra {', '.join(CATEGORIE_SERIE)}")
+
+        return _a_record(dati.get_serie(agenzia, per))
+
+    @staticmethod
+    def _indice(_, dati):
+        """
+        Indice edonico dei prezzi per periodo.
+        """
+        if dati.indice is None:
+            raise ErroreRichiesta("Le statistiche dell'indice dei prezzi non sono ancora state calcolate")
+
+        return _a_record(dati.indice)
+
+    @staticmethod
+    def _versione(_, dati):
+        """
+        Versione dei dati servita e numero di annunci.
+        """
+        return {"versione": dati.versione, "numero_annunci": dati.numero_annunci}
+
+    def _rispondi(self, stato, contenuto):
+        """
+        Invia una risposta JSON.
+
+        :param stato: Stato HTTP.
+        :param contenuto: Oggetto serializzabile in JSON.
+        """
+        corpo = json.dumps(contenuto, ensure_ascii=False).encode("utf-8")
+        self.send_response(stato)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        logging.debug("%s - %s", self.address_string(), format % args)
+
+
+class ServizioQuery(ThreadingHTTPServer):
+    """
+    Server HTTP multithread che conserva l'istantanea corrente dei dati.
+    """
+    daemon_threads = True
+
+    def __init__(self, indirizzo, dati):
+        """
+        :param indirizzo: Tupla (host, porta) su cui ascoltare.
+        :param dati: Istantanea iniziale dei dati.
+        """
+        super().__init__(indirizzo, GestoreRichieste)
+        self.dati = dati
+
+    def ricarica_se_modificati(self):
+        """
+        Se la versione dei dati è cambiata, carica una nuova istantanea e la sostituisce a quella corrente. In caso di
+        errore (ad esempio un file scritto solo in parte) si continua a servire l'istantanea precedente.
+
+        :return: True se i dati sono stati ricaricati.
+        :rtype: bool
+        """
+        versione = get_versione_dati()
+        if versione == self.dati.versione:
+            return False
+
+        try:
+            dati = DatiServizio(versione)
+        except (OSError, ValueError, KeyError, pd.errors.ParserError):
+            logging.exception("Ricaricamento dei dati non riuscito, continuo con la versione precedente")
+            return False
+
+        # L'assegnazione di un attributo è atomica: le richieste successive vedono la nuova istantanea
+        self.dati = dati
+        logging.info(f"Dati ricaricati: {dati.numero_annunci} annunci")
+        return True
+
+
+def _controlla_versione(servizio, intervallo):
+    """
+    Controlla a intervalli regolari se sono stati pubblicati nuovi dati.
+
+    :param servizio: Il servizio da aggiornare.
+    :param intervallo: Secondi tra un controllo e il successivo.
+    """
+    while True:
+        time.sleep(intervallo)
+        servizio.ricarica_se_modificati()
+
+
+def _get_args():
+    """
+    Analizza e restituisce gli argomenti passati dall'utente via riga di comando.
+
+    :return: Un oggetto contenente tutti gli argomenti passati.
+    :rtype: argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(description='Avvia il servizio locale di interrogazione degli annunci.')
+    parser.add_argument('-H', '--host', type=str, default="127.0.0.1", required=False,
+                        help='Indirizzo su cui ascoltare')
+    parser.add_argument('-p', '--porta', type=int, default=8080, required=False, help='Porta su cui ascoltare')
+    parser.add_argument('-i', '--intervallo_ricarica', type=float, default=5.0, required=False,
+                        help='Secondi tra due controlli della versione dei dati')
+
+    return parser.parse_args()
+
+
+def main():
+    """
+    Carica i dati e avvia il servizio.
+    """
+    args = _get_args()
+
+    servizio = ServizioQuery((args.host, args.porta), DatiServizio(get_versione_dati()))
+    threading.Thread(target=_controlla_versione, args=(servizio, args.intervallo_ricarica), daemon=True).start()
+
+    logging.info(f"Servizio in ascolto su http://{args.host}:{args.porta} ({servizio.dati.numero_annunci} annunci)")
+    try:
+        servizio.serve_forever()
+    except KeyboardInterrupt:
+        servizio.server_close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+
+    main()
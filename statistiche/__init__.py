@@ -0,0 +1,8 @@
+from .filtri import distanza_haversine_km, maschera_filtri
+from .sketch_kll import SketchKLL
+from .streaming import AccumulatoreStatistiche, calcola_statistiche_streaming
+from .batch import MotoreScenari, leggi_scenari
+from .rollup import aggiorna_rollup, calcola_media_mobile_rollup, calcola_rollup, calcola_statistiche_rollup, \
+    leggi_rollup
+from .indice_prezzi import StatisticheIndicePrezzi, aggiorna_indice_prezzi, calcola_indice_prezzi
+from .cache import CacheRisultati, get_chiave_query, get_versione_dati, pubblica_versione_dati
@@ -0,0 +1,223 @@
+"""
+Valutazione in blocco di molte combinazioni di filtri (scenari) sugli stessi annunci.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from statistiche.filtri import distanza_haversine_km
+
+COLONNE_SCENARI = ["prezzo_minimo", "prezzo_massimo", "latitudine", "longitudine", "raggio", "agenzia", "zona"]
+COLONNE_SOTTOINSIEME = ["agenzia", "zona", "latitudine", "longitudine", "raggio"]
+COLONNE_RISULTATI = ["conteggio", "media", "mediana", "deviazione_standard", "minimo", "massimo"]
+
+
+def leggi_scenari(percorso_scenari):
+    """
+    Legge un file CSV di scenari. Ogni riga è una combinazione di filtri con le stesse colonne degli argomenti di
+    `analyzer.py`; le colonne mancanti e le celle vuote indicano un filtro non applicato.
+
+    :param percorso_scenari: Percorso del file CSV degli scenari.
+    :return: DataFrame degli scenari con tutte le colonne di `COLONNE_SCENARI`.
+    :rtype: pd.DataFrame
+    """
+    scenari = pd.read_csv(percorso_scenari, dtype={"agenzia": "string", "zona": "string"})
+    return scenari.reindex(columns=COLONNE_SCENARI)
+
+
+class MotoreScenari:
+    """
+    Indice in memoria sugli annunci che permette di valutare migliaia di scenari al secondo. Può essere usato da più
+    thread contemporaneamente, come fa `servizio_query.py`.
+
+    Gli scenari vengono raggruppati per sottoinsieme di annunci (agenzia, zona e area geografica). Per ogni sottoinsieme
+    distinto viene calcolata una sola volta la maschera, l'array ordinato dei prezzi e le somme cumulative di prezzi e
+    quadrati; i filtri sul prezzo diventano così due ricerche binarie e tutte le statistiche si ottengono con
+    operazioni vettoriali sull'intero gruppo di scenari.
+    """
+
+    def __init__(self, annunci, numero_massimo_sottoinsiemi=None):
+        """
+        Costruisce l'indice a partire dagli annunci. Gli annunci senza prezzo vengono scartati, dato che non
+        contribuiscono ad alcuna statistica.
+
+        :param annunci: DataFrame con le colonne 'prezzo', 'latitudine', 'longitudine', 'agenzia' ed eventualmente
+                        'zona'.
+        :param numero_massimo_sottoinsiemi: Numero massimo di sottoinsiemi tenuti in memoria; oltre questo limite
+                                            viene scartato quello calcolato per primo. Se None, non c'è limite.
+        """
+        annunci = annunci.dropna(subset=["prezzo"])
+
+        self._prezzi = annunci["prezzo"].to_numpy(dtype=float)
+        self._latitudini = annunci["latitudine"].to_numpy(dtype=float)
+        self._longitudini = annunci["longitudine"].to_numpy(dtype=float)
+        self._agenzie = annunci["agenzia"].astype(str).to_numpy()
+        self._zone = annunci["zona"].to_numpy(dtype=object) if "zona" in annunci.columns else None
+        # Le somme cumulative sono calcolate sugli scarti dalla media, per limitare la cancellazione numerica
+        self._spostamento = float(self._prezzi.mean()) if len(self._prezzi) else 0.0
+
+        self._maschere_agenzia = {}
+        self._indici_sottoinsieme = {}
+        self._numero_massimo_sottoinsiemi = numero_massimo_sottoinsiemi
+        # Protegge la lettura, l'inserimento e lo scarto degli indici dei sottoinsiemi tra thread concorrenti
+        self._lock_sottoinsiemi = threading.Lock()
+
+    def _get_maschera_agenzia(self, agenzia):
+        """
+        Restituisce (calcolandola una sola volta) la maschera degli annunci di un'agenzia.
+
+        :param agenzia: ID dell'agenzia.
+        :return: Array booleano.
+        """
+        maschera = self._maschere_agenzia.get(agenzia)
+        if maschera is None:
+            # Due thread possono calcolare la stessa maschera, ma l'assegnazione è atomica e il risultato identico
+            maschera = self._maschere_agenzia[agenzia] = self._agenzie == agenzia
+
+        return maschera
+
+    def _get_indice_sottoinsieme(self, agenzia, zona, latitudine, longitudine, raggio):
+        """
+        Restituisce (calcolandolo una sola volta) l'indice dei prezzi di un sottoinsieme di annunci: l'array ordinato
+        dei prezzi e le somme cumulative degli scarti e dei loro quadrati, precedute da uno zero.
+
+        :param agenzia: ID dell'agenzia o None.
+        :param zona: Nome della zona o None.
+        :param latitudine: Latitudine del centro o None.
+        :param longitudine: Longitudine del centro o None.
+        :param raggio: Raggio in km o None.
+        :return: Tupla (prezzi ordinati, somme cumulative, somme cumulative dei quadrati).
+        """
+        chiave = (agenzia, zona, latitudine, longitudine, raggio)
+        with self._lock_sottoinsiemi:
+            indice = self._indici_sottoinsieme.get(chiave)
+        if indice is not None:
+            return indice
+
+        maschera = np.ones(len(self._prezzi), dtype=bool)
+        if agenzia is not None:
+            maschera &= self._get_maschera_agenzia(agenzia)
+        if zona is not None:
+            if self._zone is None:
+                raise ValueError("Gli scenari filtrano per zona, ma agli annunci non è stata assegnata alcuna zona")
+            maschera &= self._zone == zona
+        if raggio is not None:
+            maschera &= distanza_haversine_km(self._latitudini, self._longitudini, latitudine, longitudine) <= raggio
+
+        prezzi = np.sort(self._prezzi[maschera])
+        scarti = prezzi - self._spostamento
+        somme = np.concatenate([[0.0], np.cumsum(scarti)])
+        somme_quadrati = np.concatenate([[0.0], np.cumsum(scarti ** 2)])
+
+        indice = prezzi, somme, somme_quadrati
+        # L'indice è calcolato fuori dal lock, per non serializzare le richieste su sottoinsiemi diversi
+        with self._lock_sottoinsiemi:
+            self._indici_sottoinsieme[chiave] = indice
+            if self._numero_massimo_sottoinsiemi is not None:
+                while len(self._indici_sottoinsieme) > self._numero_massimo_sottoinsiemi:
+                    # I dizionari mantengono l'ordine di inserimento: la prima chiave è la più vecchia
+                    del self._indici_sottoinsieme[next(iter(self._indici_sottoinsieme))]
+
+        return indice
+
+    def _valuta_gruppo(self, indice, prezzi_minimi, prezzi_massimi):
+        """
+        Calcola le statistiche di un gruppo di scenari che condividono lo stesso sottoinsieme di annunci.
+
+        :param indice: Indice del sottoinsieme, come restituito da `_get_indice_sottoinsieme`.
+        :param prezzi_minimi: Array dei prezzi minimi degli scenari (NaN se assente).
+        :param prezzi_massimi: Array dei prezzi massimi degli scenari (NaN se assente).
+        :return: Dizionario che associa a ogni colonna di `COLONNE_RISULTATI` l'array dei valori per scenario.
+        """
+        prezzi, somme, somme_quadrati = indice
+
+        # Come in analyzer.py, un filtro nullo o pari a zero non viene applicato
+        inizio = np.where(prezzi_minimi > 0, np.searchsorted(prezzi, prezzi_minimi, side="left"), 0)
+        fine = np.where(prezzi_massimi > 0, np.searchsorted(prezzi, prezzi_massimi, side="right"), len(prezzi))
+        fine = np.maximum(fine, inizio)
+        conteggio = fine - inizio
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            somma = somme[fine] - somme[inizio]
+            media = self._spostamento + somma / conteggio
+            varianza = (somme_quadrati[fine] - somme_quadrati[inizio] - somma ** 2 / conteggio) / (conteggio - 1)
+            deviazione_standard = np.sqrt(np.maximum(varianza, 0))
+
+        vuoti = conteggio == 0
+        # Gli indici degli scenari vuoti vengono limitati all'array solo per poter indicizzare, il risultato è NaN
+        ultimo = max(len(prezzi) - 1, 0)
+        prezzi = prezzi if len(prezzi) else np.array([np.nan])
+        mediana = (prezzi[np.minimum(inizio + (conteggio - 1) // 2, ultimo)] +
+                   prezzi[np.minimum(inizio + conteggio // 2, ultimo)]) / 2
+        minimo = prezzi[np.minimum(inizio, ultimo)]
+        massimo = prezzi[np.clip(fine - 1, 0, ultimo)]
+
+        return {
+            "conteggio": conteggio,
+            "media": np.where(vuoti, np.nan, media),
+            "mediana": np.where(vuoti, np.nan, mediana),
+            "deviazione_standard": np.where(conteggio < 2, np.nan, deviazione_standard),
+            "minimo": np.where(vuoti, np.nan, minimo),
+            "massimo": np.where(vuoti, np.nan, massimo),
+        }
+
+    def valuta_scenario(self, prezzo_minimo=None, prezzo_massimo=None, latitudine=None, longitudine=None, raggio=None,
+                        agenzia=None, zona=None):
+        """
+        Valuta un singolo scenario. A differenza di `valuta` non costruisce alcun DataFrame, per cui il costo di uno
+        scenario il cui sottoinsieme è già indicizzato si riduce a due ricerche binarie.
+
+        I filtri non specificati vengono ignorati, con la stessa semantica degli argomenti di `analyzer.py`.
+
+        :param prezzo_minimo: Prezzo minimo degli annunci.
+        :param prezzo_massimo: Prezzo massimo degli annunci.
+        :param latitudine: Latitudine del centro dell'area di ricerca.
+        :param longitudine: Longitudine del centro dell'area di ricerca.
+        :param raggio: Raggio (in km) dell'area di ricerca.
+        :param agenzia: ID dell'agenzia.
+        :param zona: Nome della zona.
+        :return: Dizionario con le statistiche di `COLONNE_RISULTATI`.
+        :rtype: dict
+        """
+        if not all([latitudine, longitudine, raggio]):
+            latitudine = longitudine = raggio = None
+
+        indice = self._get_indice_sottoinsieme(agenzia or None, zona or None, latitudine, longitudine, raggio)
+        statistiche = self._valuta_gruppo(indice, np.array([prezzo_minimo or np.nan], dtype=float),
+                                          np.array([prezzo_massimo or np.nan], dtype=float))
+
+        risultato = {colonna: float(valori[0]) for colonna, valori in statistiche.items()}
+        risultato["conteggio"] = int(risultato["conteggio"])
+        return risultato
+
+    def valuta(self, scenari):
+        """
+        Valuta tutti gli scenari e restituisce una tabella con una riga di statistiche per scenario.
+
+        :param scenari: DataFrame degli scenari, con le colonne di `COLONNE_SCENARI`.
+        :return: DataFrame degli scenari con in aggiunta le colonne di `COLONNE_RISULTATI`.
+        :rtype: pd.DataFrame
+        """
+        scenari = scenari.reindex(columns=COLONNE_SCENARI).reset_index(drop=True)
+        area = scenari[["latitudine", "longitudine", "raggio"]].fillna(0).astype(bool).all(axis=1)
+        sottoinsiemi = scenari[COLONNE_SOTTOINSIEME].astype(object)
+        sottoinsiemi.loc[~area, ["latitudine", "longitudine", "raggio"]] = None
+        sottoinsiemi = sottoinsiemi.where(sottoinsiemi.notna(), None)
+
+        prezzi_minimi = scenari["prezzo_minimo"].to_numpy(dtype=float)
+        prezzi_massimi = scenari["prezzo_massimo"].to_numpy(dtype=float)
+        risultati = {colonna: np.full(len(scenari), np.nan) for colonna in COLONNE_RISULTATI}
+
+        for chiave, posizioni in sottoinsiemi.groupby(COLONNE_SOTTOINSIEME, dropna=False, sort=False).indices.items():
+            agenzia, zona, latitudine, longitudine, raggio = (None if pd.isna(valore) else valore for valore in chiave)
+            indice = self._get_indice_sottoinsieme(agenzia, zona, latitudine, longitudine, raggio)
+            statistiche = self._valuta_gruppo(indice, prezzi_minimi[posizioni], prezzi_massimi[posizioni])
+
+            for colonna, valori in statistiche.items():
+                risultati[colonna][posizioni] = valori
+
+        risultati = pd.DataFrame(risultati)
+        risultati["conteggio"] = risultati["conteggio"].astype(int)
+
+        return pd.concat([scenari, risultati], axis=1)
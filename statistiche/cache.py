@@ -0,0 +1,177 @@
+"""
+Cache su disco dei risultati di `analyzer.py` (statistiche e grafici), indicizzata per query.
+
+La chiave di ogni risultato è l'hash degli argomenti normalizzati della query e della versione dei dati. La versione
+dipende dal contenuto di `FILE_VERSIONE_DATI`, che `scraper.py` rinnova a ogni merge, e da dimensione e data di
+modifica dei file letti dall'analisi: quando i dati cambiano le chiavi cambiano e i risultati vecchi non vengono più
+letti. Ogni risultato è un file pickle; la data di modifica del file registra l'ultimo accesso, e quando la cache
+supera il numero massimo di voci o la dimensione massima vengono eliminati i risultati usati meno di recente.
+"""
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+import uuid
+
+DIRECTORY_CACHE = "files/cache"
+FILE_VERSIONE_DATI = "files/versione_dati.txt"
+FILE_DATI_ANALISI = [
+    "files/annunci.csv",
+    "files/agenzie.csv",
+    "files/tipologie.csv",
+    "files/proprieta.csv",
+    "files/rollup_giornaliero.csv",
+    "files/indice_prezzi.npz",
+    "files/modelli/cluster_appartamenti.joblib",
+]
+NUMERO_MASSIMO_VOCI_CACHE = 256
+DIMENSIONE_MASSIMA_CACHE_BYTE = 256 * 1024 * 1024
+
+
+def get_versione_dati(percorsi_aggiuntivi=()):
+    """
+    Calcola l'impronta della versione dei dati letti dall'analisi.
+
+    :param percorsi_aggiuntivi: Altri file da cui dipende il risultato (ad esempio il GeoJSON delle zone).
+    :return: Stringa che cambia ogni volta che cambia uno dei file.
+    :rtype: str
+    """
+    impronta = []
+    if os.path.exists(FILE_VERSIONE_DATI):
+        with open(FILE_VERSIONE_DATI, encoding="utf-8") as file_versione:
+            impronta.append(file_versione.read().strip())
+
+    for percorso in [*FILE_DATI_ANALISI, *percorsi_aggiuntivi]:
+        if os.path.exists(percorso):
+            stato = os.stat(percorso)
+            impronta.append(f"{percorso}:{stato.st_size}:{stato.st_mtime_ns}")
+
+    return "|".join(impronta)
+
+
+def pubblica_versione_dati(directory_cache=DIRECTORY_CACHE):
+    """
+    Registra una nuova versione dei dati e svuota la cache. Va chiamata dopo ogni modifica degli annunci.
+
+    :param directory_cache: Directory della cache da svuotare.
+    :return: La nuova versione.
+    :rtype: str
+    """
+    versione = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    with open(FILE_VERSIONE_DATI, "w", encoding="utf-8") as file_versione:
+        file_versione.write(versione)
+
+    shutil.rmtree(directory_cache, ignore_errors=True)
+    return versione
+
+
+def get_chiave_query(argomenti, versione_dati):
+    """
+    Calcola la chiave di una query a partire dai suoi argomenti normalizzati: gli argomenti non impostati vengono
+    ignorati e l'ordine non conta, per cui query equivalenti hanno la stessa chiave.
+
+    :param argomenti: Dizionario degli argomenti che determinano il risultato.
+    :param versione_dati: Versione dei dati, come restituita da `get_versione_dati`.
+    :return: Hash esadecimale della query.
+    :rtype: str
+    """
+    normalizzati = {
+        nome: round(valore, 6) if isinstance(valore, float) else valore
+        for nome, valore in argomenti.items()
+        if valore is not None and valore is not False
+    }
+    testo = json.dumps({"argomenti": normalizzati, "versione": versione_dati}, sort_keys=True, default=str)
+
+    return hashlib.sha256(testo.encode("utf-8")).hexdigest()
+
+
+class CacheRisultati:
+    """
+    Cache LRU su disco, limitata nel numero di voci e nella dimensione totale.
+    """
+
+    def __init__(self, directory=DIRECTORY_CACHE, numero_massimo_voci=NUMERO_MASSIMO_VOCI_CACHE,
+                 dimensione_massima_byte=DIMENSIONE_MASSIMA_CACHE_BYTE):
+        """
+        :param directory: Directory in cui salvare i risultati.
+        :param numero_massimo_voci: Numero massimo di risultati conservati.
+        :param dimensione_massima_byte: Dimensione massima complessiva dei risultati, in byte.
+        """
+        self.directory = directory
+        self.numero_massimo_voci = numero_massimo_voci
+        self.dimensione_massima_byte = dimensione_massima_byte
+
+    def _get_percorso(self, chiave):
+        """
+        Restituisce il percorso del file del risultato di una chiave.
+
+        :param chiave: Chiave della query.
+        :return: Percorso del file pickle.
+        """
+        return os.path.join(self.directory, f"{chiave}.pkl")
+
+    def leggi(self, chiave):
+        """
+        Restituisce il risultato salvato per una chiave, segnandolo come usato di recente.
+
+        :param chiave: Chiave della query.
+        :return: Il risultato, oppure None se non è in cache o il file è illeggibile.
+        """
+        percorso = self._get_percorso(chiave)
+        try:
+            with open(percorso, "rb") as file_risultato:
+                risultato = pickle.load(file_risultato)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+        os.utime(percorso)
+        return risultato
+
+    def scrivi(self, chiave, risultato):
+        """
+        Salva il risultato di una query ed elimina i risultati usati meno di recente se la cache supera i limiti.
+
+        Il file viene scritto con un nome temporaneo e poi rinominato, per cui un lettore concorrente non legge mai
+        un risultato incompleto.
+
+        :param chiave: Chiave della query.
+        :param risultato: Oggetto serializzabile con pickle.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        percorso = self._get_percorso(chiave)
+        percorso_temporaneo = f"{percorso}.{uuid.uuid4().hex}.tmp"
+
+        with open(percorso_temporaneo, "wb") as file_risultato:
+            pickle.dump(risultato, file_risultato, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(percorso_temporaneo, percorso)
+
+        self._elimina_meno_recenti()
+
+    def _elimina_meno_recenti(self):
+        """
+        Elimina i risultati con l'accesso meno recente finché la cache non rispetta i limiti.
+        """
+        voci = []
+        with os.scandir(self.directory) as elementi:
+            for elemento in elementi:
+                if elemento.name.endswith(".pkl"):
+                    stato = elemento.stat()
+                    voci.append((stato.st_mtime_ns, stato.st_size, elemento.path))
+
+        voci.sort()
+        dimensione_totale = sum(dimensione for _, dimensione, _ in voci)
+        while voci and (len(voci) > self.numero_massimo_voci or dimensione_totale > self.dimensione_massima_byte):
+            _, dimensione, percorso = voci.pop(0)
+            dimensione_totale -= dimensione
+            try:
+                os.remove(percorso)
+            except FileNotFoundError:
+                pass
+
+    def svuota(self):
+        """
+        Elimina tutti i risultati.
+        """
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,66 @@
+"""
+Filtri vettoriali sugli annunci, condivisi tra le diverse modalità di analisi.
+"""
+import numpy as np
+
+RAGGIO_TERRESTRE_KM = 6371.0088
+
+
+def distanza_haversine_km(latitudini, longitudini, lat_centrale, lon_centrale):
+    """
+    Calcola in modo vettoriale la distanza (in km) tra una serie di coordinate e un punto centrale.
+
+    Si usa la formula dell'emisenoverso su una sfera di raggio medio terrestre: rispetto alla distanza geodetica di
+    geopy l'errore è inferiore allo 0,5%, ma il calcolo avviene su interi array NumPy invece che riga per riga.
+
+    :param latitudini: Array delle latitudini.
+    :param longitudini: Array delle longitudini.
+    :param lat_centrale: Latitudine del punto centrale.
+    :param lon_centrale: Longitudine del punto centrale.
+    :return: Array delle distanze in km.
+    """
+    lat1 = np.radians(np.asarray(latitudini, dtype=float))
+    lon1 = np.radians(np.asarray(longitudini, dtype=float))
+    lat2 = np.radians(lat_centrale)
+    lon2 = np.radians(lon_centrale)
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RAGGIO_TERRESTRE_KM * np.arcsin(np.sqrt(a))
+
+
+def maschera_filtri(annunci, prezzo_minimo=None, prezzo_massimo=None, latitudine=None, longitudine=None, raggio=None,
+                    agenzia=None, zona=None):
+    """
+    Costruisce la maschera booleana degli annunci che rispettano i filtri di `analyzer.py`.
+
+    I filtri non specificati vengono ignorati, con la stessa semantica degli argomenti da linea di comando.
+
+    :param annunci: DataFrame con le colonne 'prezzo', 'latitudine', 'longitudine', 'agenzia' ed eventualmente 'zona'.
+    :param prezzo_minimo: Prezzo minimo degli annunci.
+    :param prezzo_massimo: Prezzo massimo degli annunci.
+    :param latitudine: Latitudine del centro dell'area di ricerca.
+    :param longitudine: Longitudine del centro dell'area di ricerca.
+    :param raggio: Raggio (in km) dell'area di ricerca.
+    :param agenzia: ID dell'agenzia.
+    :param zona: Nome della zona. Richiede che gli annunci abbiano la colonna 'zona'.
+    :return: Array booleano con un elemento per annuncio.
+    :rtype: np.ndarray
+    """
+    maschera = np.ones(len(annunci), dtype=bool)
+
+    if prezzo_minimo:
+        maschera &= (annunci["prezzo"] >= prezzo_minimo).to_numpy()
+    if prezzo_massimo:
+        maschera &= (annunci["prezzo"] <= prezzo_massimo).to_numpy()
+
+    if all([latitudine, longitudine, raggio]):
+        distanze = distanza_haversine_km(annunci["latitudine"], annunci["longitudine"], latitudine, longitudine)
+        maschera &= distanze <= raggio
+
+    if agenzia:
+        maschera &= (annunci["agenzia"] == agenzia).to_numpy()
+
+    if zona:
+        maschera &= (annunci["zona"] == zona).to_numpy()
+
+    return maschera
@@ -0,0 +1,273 @@
+"""
+Indice edonico dei prezzi degli annunci.
+
+La media mobile dei prezzi risente della composizione degli annunci: se in un mese vengono pubblicate più case grandi
+la media sale anche se i prezzi non cambiano. L'indice edonico stima invece l'andamento dei prezzi a parità di
+caratteristiche, con la regressione
+
+    log(prezzo) = Σ periodo_t + b_mq · log(mq) + b_locali · locali + tipologia + zona + errore
+
+dove ogni annuncio contribuisce con un'osservazione, il suo prezzo attuale, assegnata al periodo della data
+dell'ultima modifica del prezzo. I minimi quadrati dipendono dai dati solo attraverso X'X e X'y: queste statistiche
+sufficienti vengono accumulate a blocchi con matrici sparse (ogni riga ha poche colonne non nulle) e aggiornate in
+modo incrementale a ogni merge, per cui ricalcolare l'indice richiede di risolvere un sistema di qualche centinaio di
+incognite invece di rileggere lo storico. Quando un annuncio cambia prezzo la sua osservazione precedente viene
+sottratta, come nel rollup giornaliero: le statistiche aggiornate coincidono quindi con quelle ricalcolate da tutti
+gli annunci salvati, e con quelle calcolate al momento sugli annunci filtrati di `analyzer.py`.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from dati import leggi_annunci
+from dati.caricamento import FILE_ANNUNCI_CSV
+
+FILE_INDICE_PREZZI_NPZ = "files/indice_prezzi.npz"
+FREQUENZA_PERIODI = "M"
+DIMENSIONE_BLOCCO_INDICE = 200_000
+# Lato (in gradi) delle celle usate come zona quando agli annunci non è stata assegnata una zona
+LATO_CELLA_ZONA_GRADI = 0.016
+# Peso relativo della regolarizzazione, che rende risolubile il sistema anche con categorie quasi vuote
+REGOLARIZZAZIONE = 1e-8
+COLONNE_NUMERICHE_INDICE = ["log_mq", "locali"]
+
+
+def _get_variabili(annunci):
+    """
+    Estrae dagli annunci la variabile dipendente e le variabili della regressione. Gli annunci senza prezzo, metri
+    quadrati, locali o data vengono scartati.
+
+    Come zona si usa la colonna 'zona' se presente, altrimenti la cella della griglia di lato `LATO_CELLA_ZONA_GRADI`.
+
+    :param annunci: DataFrame con le colonne 'prezzo', 'mq', 'locali', 'tipologia', 'data_ultima_modifica_prezzo',
+                    'latitudine', 'longitudine' ed eventualmente 'zona'.
+    :return: Tupla (log dei prezzi, DataFrame delle variabili numeriche, DataFrame delle variabili categoriche già
+             convertite nei nomi delle colonne della regressione).
+    """
+    validi = (annunci["prezzo"] > 0) & (annunci["mq"] > 0) & annunci["locali"].notna() & \
+        annunci["data_ultima_modifica_prezzo"].notna()
+    if "zona" in annunci.columns:
+        validi &= annunci["zona"].notna()
+    else:
+        validi &= annunci["latitudine"].notna() & annunci["longitudine"].notna()
+    annunci = annunci[validi]
+
+    numeriche = pd.DataFrame({
+        "log_mq": np.log(annunci["mq"].to_numpy(dtype=float)),
+        "locali": annunci["locali"].to_numpy(dtype=float),
+    })
+
+    if "zona" in annunci.columns:
+        zone = "zona=" + annunci["zona"].astype(str)
+    else:
+        celle_latitudine = np.floor(annunci["latitudine"] / LATO_CELLA_ZONA_GRADI).astype(np.int64).astype(str)
+        celle_longitudine = np.floor(annunci["longitudine"] / LATO_CELLA_ZONA_GRADI).astype(np.int64).astype(str)
+        zone = "cella=" + celle_latitudine + "_" + celle_longitudine
+
+    periodi = pd.to_datetime(annunci["data_ultima_modifica_prezzo"]).dt.to_period(FREQUENZA_PERIODI)
+    categoriche = pd.DataFrame({
+        "periodo": ("periodo=" + periodi.astype(str)).to_numpy(),
+        "tipologia": ("tipologia=" + annunci["tipologia"].astype(str)).to_numpy(),
+        "zona": zone.to_numpy(),
+    })
+
+    return np.log(annunci["prezzo"].to_numpy(dtype=float)), numeriche, categoriche
+
+
+class StatisticheIndicePrezzi:
+    """
+    Statistiche sufficienti (X'X, X'y e numero di osservazioni) della regressione edonica.
+
+    Le colonne della regressione vengono aggiunte man mano che compaiono nuovi periodi, tipologie o zone: le matrici
+    vengono allargate con zeri, dato che le osservazioni precedenti valgono zero sulle nuove colonne.
+    """
+
+    def __init__(self):
+        """
+        Inizializza statistiche vuote, con le sole colonne numeriche.
+        """
+        self.colonne = list(COLONNE_NUMERICHE_INDICE)
+        self._posizioni = {colonna: posizione for posizione, colonna in enumerate(self.colonne)}
+        self.xtx = np.zeros((len(self.colonne), len(self.colonne)))
+        self.xty = np.zeros(len(self.colonne))
+        self.numero_osservazioni = 0
+
+    def _get_posizioni(self, nomi):
+        """
+        Restituisce la posizione di ogni nome di colonna, aggiungendo le colonne non ancora presenti.
+
+        :param nomi: Array dei nomi delle colonne.
+        :return: Array delle posizioni.
+        :rtype: np.ndarray
+        """
+        codici, nomi_distinti = pd.factorize(nomi)
+
+        nuovi = [nome for nome in nomi_distinti if nome not in self._posizioni]
+        if nuovi:
+            for nome in nuovi:
+                self._posizioni[nome] = len(self.colonne)
+                self.colonne.append(nome)
+            self.xtx = np.pad(self.xtx, (0, len(nuovi)))
+            self.xty = np.pad(self.xty, (0, len(nuovi)))
+
+        return np.array([self._posizioni[nome] for nome in nomi_distinti], dtype=np.int64)[codici]
+
+    def _aggiorna_blocco(self, annunci, segno=1):
+        """
+        Aggiunge (o sottrae) le osservazioni di un blocco di annunci.
+
+        :param annunci: DataFrame degli annunci del blocco.
+        :param segno: 1 per aggiungere le osservazioni, -1 per sottrarle.
+        """
+        log_prezzi, numeriche, categoriche = _get_variabili(annunci)
+        numero_righe = len(log_prezzi)
+        if numero_righe == 0:
+            return
+
+        posizioni = [np.full(numero_righe, self._posizioni[colonna]) for colonna in COLONNE_NUMERICHE_INDICE]
+        posizioni += [self._get_posizioni(categoriche[colonna].to_numpy()) for colonna in categoriche.columns]
+        valori = [numeriche[colonna].to_numpy() for colonna in COLONNE_NUMERICHE_INDICE]
+        valori += [np.ones(numero_righe)] * len(categoriche.columns)
+
+        righe = np.tile(np.arange(numero_righe), len(posizioni))
+        x = sparse.csr_matrix((np.concatenate(valori), (righe, np.concatenate(posizioni))),
+                              shape=(numero_righe, len(self.colonne)))
+
+        self.xtx += segno * (x.T @ x).toarray()
+        self.xty += segno * (x.T @ log_prezzi)
+        self.numero_osservazioni += segno * numero_righe
+
+    def aggiorna(self, annunci, dimensione_blocco=DIMENSIONE_BLOCCO_INDICE):
+        """
+        Aggiunge le osservazioni degli annunci, elaborandoli a blocchi per limitare la memoria usata.
+
+        :param annunci: DataFrame degli annunci.
+        :param dimensione_blocco: Numero di annunci per blocco.
+        """
+        for inizio in range(0, len(annunci), dimensione_blocco):
+            self._aggiorna_blocco(annunci.iloc[inizio:inizio + dimensione_blocco])
+
+    def sottrai(self, annunci, dimensione_blocco=DIMENSIONE_BLOCCO_INDICE):
+        """
+        Sottrae le osservazioni di annunci aggiunti in precedenza, ad esempio la versione precedente degli annunci con
+        prezzo modificato. Le colonne rimaste senza osservazioni vengono ignorate da `calcola_indice`.
+
+        :param annunci: DataFrame degli annunci, con gli stessi valori con cui sono stati aggiunti.
+        :param dimensione_blocco: Numero di annunci per blocco.
+        """
+        for inizio in range(0, len(annunci), dimensione_blocco):
+            self._aggiorna_blocco(annunci.iloc[inizio:inizio + dimensione_blocco], segno=-1)
+
+    def salva(self, percorso=FILE_INDICE_PREZZI_NPZ):
+        """
+        Salva le statistiche su file.
+
+        :param percorso: Percorso del file npz.
+        """
+        np.savez(percorso, colonne=np.array(self.colonne, dtype=str), xtx=self.xtx, xty=self.xty,
+                 numero_osservazioni=self.numero_osservazioni)
+
+    @classmethod
+    def carica(cls, percorso=FILE_INDICE_PREZZI_NPZ):
+        """
+        Carica le statistiche salvate su file.
+
+        :param percorso: Percorso del file npz.
+        :return: Le statistiche, oppure None se il file non esiste.
+        :rtype: StatisticheIndicePrezzi or None
+        """
+        if not os.path.exists(percorso):
+            return None
+
+        with np.load(percorso) as dati:
+            statistiche = cls()
+            statistiche.colonne = dati["colonne"].tolist()
+            statistiche._posizioni = {colonna: posizione for posizione, colonna in enumerate(statistiche.colonne)}
+            statistiche.xtx = dati["xtx"]
+            statistiche.xty = dati["xty"]
+            statistiche.numero_osservazioni = int(dati["numero_osservazioni"])
+
+        return statistiche
+
+    def calcola_indice(self):
+        """
+        Risolve la regressione e calcola l'indice dei prezzi, posto a 100 nel primo periodo.
+
+        Per tipologie e zone la categoria più frequente fa da riferimento e la sua colonna viene esclusa, per evitare
+        la collinearità con le colonne dei periodi. Accanto all'indice edonico viene restituito l'indice grezzo,
+        ottenuto dalla media dei log dei prezzi di ogni periodo senza correzione per le caratteristiche.
+
+        :return: DataFrame con le colonne 'periodo', 'conteggio', 'indice' e 'indice_grezzo', ordinato per periodo.
+        :rtype: pd.DataFrame
+        """
+        colonne = pd.Series(self.colonne)
+        conteggi = np.diag(self.xtx)
+        gruppi = colonne.str.split("=").str[0]
+
+        riferimenti = [conteggi_gruppo.idxmax()
+                       for gruppo, conteggi_gruppo in pd.Series(conteggi).groupby(gruppi)
+                       if gruppo in ("tipologia", "zona", "cella")]
+        incluse = np.flatnonzero((conteggi > 0) & ~colonne.index.isin(riferimenti))
+
+        xtx = self.xtx[np.ix_(incluse, incluse)]
+        xtx = xtx + np.eye(len(incluse)) * REGOLARIZZAZIONE * np.trace(xtx) / max(len(incluse), 1)
+        coefficienti = pd.Series(np.linalg.solve(xtx, self.xty[incluse]), index=colonne[incluse].to_numpy())
+
+        periodi = colonne[(gruppi == "periodo") & (conteggi > 0)]
+        indice = pd.DataFrame({
+            "periodo": [pd.Period(nome.split("=", 1)[1], freq=FREQUENZA_PERIODI).to_timestamp() for nome in periodi],
+            "conteggio": conteggi[periodi.index].astype(np.int64),
+            "coefficiente": coefficienti[periodi.to_numpy()].to_numpy(),
+            "media_log_prezzo": self.xty[periodi.index] / conteggi[periodi.index],
+        }).sort_values("periodo", ignore_index=True)
+
+        indice["indice"] = 100 * np.exp(indice["coefficiente"] - indice["coefficiente"].iloc[0])
+        indice["indice_grezzo"] = 100 * np.exp(indice["media_log_prezzo"] - indice["media_log_prezzo"].iloc[0])
+
+        return indice[["periodo", "conteggio", "indice", "indice_grezzo"]]
+
+
+def calcola_indice_prezzi(annunci):
+    """
+    Calcola l'indice edonico dei prezzi di un insieme di annunci.
+
+    :param annunci: DataFrame degli annunci.
+    :return: L'indice, come restituito da `StatisticheIndicePrezzi.calcola_indice`.
+    :rtype: pd.DataFrame
+    """
+    statistiche = StatisticheIndicePrezzi()
+    statistiche.aggiorna(annunci)
+    return statistiche.calcola_indice()
+
+
+def aggiorna_indice_prezzi(annunci_modificati, annunci_rimossi=None, percorso=FILE_INDICE_PREZZI_NPZ,
+                           ricostruisci=False, percorso_annunci=FILE_ANNUNCI_CSV):
+    """
+    Aggiunge alle statistiche salvate le osservazioni degli annunci nuovi o con prezzo modificato, ne toglie quelle
+    della versione precedente degli annunci modificati e le salva.
+
+    Se il file delle statistiche manca ma quello degli annunci esiste, le statistiche vengono ricalcolate da tutti gli
+    annunci salvati, così che l'indice non parta dalle sole osservazioni dell'ultimo merge.
+
+    :param annunci_modificati: DataFrame degli annunci nuovi o modificati dall'ultimo merge.
+    :param annunci_rimossi: DataFrame (opzionale) con la versione precedente degli annunci con prezzo modificato, le
+                            cui osservazioni vengono tolte dalle statistiche.
+    :param percorso: Percorso del file npz delle statistiche.
+    :param ricostruisci: Se True, le statistiche esistenti vengono scartate e ricalcolate dai soli annunci passati.
+    :param percorso_annunci: Percorso del file CSV di tutti gli annunci, già aggiornato con il merge.
+    :return: Le statistiche aggiornate.
+    :rtype: StatisticheIndicePrezzi
+    """
+    statistiche = None if ricostruisci else StatisticheIndicePrezzi.carica(percorso)
+    if statistiche is None:
+        if not ricostruisci and os.path.exists(percorso_annunci):
+            annunci_modificati = leggi_annunci(percorso_annunci)
+        statistiche, annunci_rimossi = StatisticheIndicePrezzi(), None
+
+    if annunci_rimossi is not None:
+        statistiche.sottrai(annunci_rimossi)
+    statistiche.aggiorna(annunci_modificati)
+    statistiche.salva(percorso)
+    return statistiche
@@ -0,0 +1,189 @@
+"""
+Aggregati giornalieri (rollup) dei prezzi degli annunci per agenzia e tipologia.
+
+Ogni riga del rollup riassume le osservazioni di prezzo di un giorno per una coppia agenzia × tipologia: ogni annuncio
+è un'osservazione del suo prezzo attuale nel giorno di `data_ultima_modifica_prezzo`, e un cambio di prezzo sposta
+l'osservazione dal giorno precedente a quello nuovo. Gli aggregati sono tutti combinabili (somme, minimi e massimi), per
+cui il rollup può essere aggiornato in modo incrementale con i soli annunci modificati da ogni merge, e i grafici
+temporali leggono poche migliaia di righe invece di tutti gli annunci.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from dati import leggi_annunci
+from dati.caricamento import FILE_ANNUNCI_CSV
+
+FILE_ROLLUP_CSV = "files/rollup_giornaliero.csv"
+CHIAVI_ROLLUP = ["data", "agenzia", "tipologia"]
+AGGREGAZIONI_ROLLUP = {
+    "conteggio": "sum",
+    "somma_prezzo": "sum",
+    "somma_quadrati_prezzo": "sum",
+    "prezzo_minimo": "min",
+    "prezzo_massimo": "max",
+    "conteggio_prezzo_mq": "sum",
+    "somma_prezzo_mq": "sum",
+}
+
+
+def calcola_rollup(annunci):
+    """
+    Calcola il rollup giornaliero di un insieme di annunci. Gli annunci senza prezzo vengono ignorati.
+
+    :param annunci: DataFrame con le colonne 'data_ultima_modifica_prezzo', 'agenzia', 'tipologia', 'prezzo' e 'mq'.
+    :return: DataFrame con una riga per giorno × agenzia × tipologia e le colonne di `AGGREGAZIONI_ROLLUP`.
+    :rtype: pd.DataFrame
+    """
+    annunci = annunci.dropna(subset=["prezzo"])
+    mq_validi = annunci["mq"].where(annunci["mq"] > 0)
+
+    osservazioni = pd.DataFrame({
+        "data": pd.to_datetime(annunci["data_ultima_modifica_prezzo"]).dt.normalize(),
+        "agenzia": annunci["agenzia"],
+        "tipologia": annunci["tipologia"],
+        "conteggio": 1,
+        "somma_prezzo": annunci["prezzo"],
+        "somma_quadrati_prezzo": annunci["prezzo"] ** 2,
+        "prezzo_minimo": annunci["prezzo"],
+        "prezzo_massimo": annunci["prezzo"],
+        "conteggio_prezzo_mq": mq_validi.notna().astype(int),
+        "somma_prezzo_mq": (annunci["prezzo"] / mq_validi).fillna(0),
+    })
+
+    return osservazioni.groupby(CHIAVI_ROLLUP, as_index=False).agg(AGGREGAZIONI_ROLLUP)
+
+
+def unisci_rollup(rollup, rollup_nuovo):
+    """
+    Combina due rollup sommando conteggi e somme e prendendo minimi e massimi delle righe con le stesse chiavi.
+
+    :param rollup: Rollup esistente.
+    :param rollup_nuovo: Rollup da aggiungere.
+    :return: Il rollup combinato.
+    :rtype: pd.DataFrame
+    """
+    return pd.concat([rollup, rollup_nuovo]).groupby(CHIAVI_ROLLUP, as_index=False).agg(AGGREGAZIONI_ROLLUP)
+
+
+def leggi_rollup(percorso_rollup=FILE_ROLLUP_CSV):
+    """
+    Legge il rollup salvato su file.
+
+    :param percorso_rollup: Percorso del file CSV del rollup.
+    :return: Il rollup, oppure un DataFrame vuoto se il file non esiste.
+    :rtype: pd.DataFrame
+    """
+    if not os.path.exists(percorso_rollup):
+        return pd.DataFrame(columns=CHIAVI_ROLLUP + list(AGGREGAZIONI_ROLLUP))
+
+    return pd.read_csv(percorso_rollup, parse_dates=["data"])
+
+
+def sottrai_rollup(rollup, rollup_rimosso):
+    """
+    Toglie da un rollup le osservazioni riassunte in un altro, ad esempio la versione precedente degli annunci con
+    prezzo modificato.
+
+    Conteggi e somme vengono sottratti e le righe rimaste senza osservazioni eliminate. Minimo e massimo non si possono
+    aggiornare togliendo un'osservazione: restano quelli precedenti, che sono comunque un limite inferiore e superiore
+    dei prezzi rimasti nella riga.
+
+    :param rollup: Rollup esistente.
+    :param rollup_rimosso: Rollup delle osservazioni da togliere.
+    :return: Il rollup senza le osservazioni rimosse.
+    :rtype: pd.DataFrame
+    """
+    colonne_somma = [colonna for colonna, aggregazione in AGGREGAZIONI_ROLLUP.items() if aggregazione == "sum"]
+    rollup_rimosso = rollup_rimosso[CHIAVI_ROLLUP + colonne_somma].copy()
+    rollup_rimosso[colonne_somma] = -rollup_rimosso[colonne_somma]
+
+    rollup = unisci_rollup(rollup, rollup_rimosso)
+    return rollup[rollup["conteggio"] > 0].reset_index(drop=True)
+
+
+def aggiorna_rollup(annunci_aggiunti, annunci_rimossi=None, percorso_rollup=FILE_ROLLUP_CSV, ricostruisci=False,
+                    percorso_annunci=FILE_ANNUNCI_CSV):
+    """
+    Aggiunge al rollup salvato le osservazioni degli annunci nuovi o con prezzo modificato e lo salva.
+
+    Se il rollup non è ancora stato salvato ma il file degli annunci esiste, il rollup viene ricostruito da tutti gli
+    annunci salvati, che comprendono già quelli aggiunti: partire dai soli annunci modificati perderebbe gli altri.
+
+    :param annunci_aggiunti: DataFrame degli annunci nuovi o con prezzo modificato, nella versione aggiornata.
+    :param annunci_rimossi: DataFrame (opzionale) con la versione precedente degli annunci con prezzo modificato, le cui
+                            osservazioni vengono tolte dal rollup.
+    :param percorso_rollup: Percorso del file CSV del rollup.
+    :param ricostruisci: Se True, il rollup esistente viene scartato e ricalcolato dai soli annunci aggiunti.
+    :param percorso_annunci: Percorso del file CSV di tutti gli annunci, già aggiornato con il merge.
+    :return: Il rollup aggiornato.
+    :rtype: pd.DataFrame
+    """
+    if not ricostruisci and not os.path.exists(percorso_rollup) and os.path.exists(percorso_annunci):
+        annunci_aggiunti, annunci_rimossi, ricostruisci = leggi_annunci(percorso_annunci), None, True
+
+    rollup_nuovo = calcola_rollup(annunci_aggiunti)
+    if not ricostruisci:
+        rollup = leggi_rollup(percorso_rollup)
+        if annunci_rimossi is not None:
+            rollup = sottrai_rollup(rollup, calcola_rollup(annunci_rimossi))
+        rollup_nuovo = unisci_rollup(rollup, rollup_nuovo)
+
+    rollup_nuovo.to_csv(percorso_rollup, index=False)
+    return rollup_nuovo
+
+
+def calcola_media_mobile_rollup(rollup, finestra_giorni=7, per=None):
+    """
+    Calcola la media mobile dei prezzi a partire dal rollup, pesando ogni giorno per il numero di osservazioni.
+
+    :param rollup: Il rollup giornaliero.
+    :param finestra_giorni: Ampiezza in giorni della finestra mobile.
+    :param per: Colonna opzionale (ad esempio 'nome_tipologia') per cui calcolare una serie separata.
+    :return: DataFrame con le colonne 'data', 'conteggio', 'media_settimanale' ed eventualmente `per`.
+    :rtype: pd.DataFrame
+    """
+    chiavi = ["data"] if per is None else [per, "data"]
+    giornaliero = rollup.groupby(chiavi, as_index=False)[["conteggio", "somma_prezzo"]].sum()
+
+    finestra = f"{finestra_giorni}D"
+    if per is None:
+        mobile = giornaliero.rolling(finestra, on="data")[["conteggio", "somma_prezzo"]].sum()
+    else:
+        mobile = giornaliero.groupby(per, sort=False).rolling(finestra, on="data")[["conteggio", "somma_prezzo"]]
+        mobile = mobile.sum()
+
+    serie = giornaliero[chiavi + ["conteggio"]].copy()
+    # Il groupby restituisce le righe già ordinate per chiavi, nello stesso ordine di `giornaliero`
+    serie["media_settimanale"] = (mobile["somma_prezzo"] / mobile["conteggio"]).to_numpy()
+
+    return serie
+
+
+def calcola_statistiche_rollup(rollup):
+    """
+    Calcola media, deviazione standard, minimo e massimo dei prezzi delle osservazioni riassunte nel rollup.
+
+    La mediana non è ricavabile dagli aggregati e non viene restituita.
+
+    :param rollup: Il rollup giornaliero, eventualmente già filtrato.
+    :return: Dizionario con le statistiche sui prezzi.
+    :rtype: dict
+    """
+    conteggio = rollup["conteggio"].sum()
+    somma = rollup["somma_prezzo"].sum()
+
+    if conteggio == 0:
+        return {"conteggio": 0, "media": np.nan, "deviazione_standard": np.nan, "minimo": np.nan, "massimo": np.nan}
+
+    varianza = (rollup["somma_quadrati_prezzo"].sum() - somma ** 2 / conteggio) / (conteggio - 1) \
+        if conteggio > 1 else np.nan
+
+    return {
+        "conteggio": int(conteggio),
+        "media": somma / conteggio,
+        "deviazione_standard": float(np.sqrt(max(varianza, 0))) if conteggio > 1 else np.nan,
+        "minimo": rollup["prezzo_minimo"].min(),
+        "massimo": rollup["prezzo_massimo"].max(),
+    }
@@ -0,0 +1,144 @@
+"""
+Sketch KLL per la stima dei quantili su flussi di dati.
+"""
+import numpy as np
+
+
+class SketchKLL:
+    """
+    Sketch KLL (Karnin, Lang, Liberty) per stimare quantili con memoria limitata.
+
+    Lo sketch mantiene una gerarchia di compattatori: il livello h contiene elementi di peso 2^h. Quando un livello
+    supera la sua capacità viene ordinato e metà dei suoi elementi (pari o dispari, scelti a caso) viene promossa al
+    livello successivo. La memoria occupata è O(k) indipendentemente dal numero di valori inseriti e due sketch
+    possono essere uniti, per cui il calcolo può essere suddiviso in blocchi indipendenti.
+    """
+
+    FATTORE_CAPACITA = 2 / 3
+
+    def __init__(self, k=200, seed=None):
+        """
+        Inizializza uno sketch vuoto.
+
+        :param k: Capacità del livello più alto. Valori maggiori riducono l'errore aumentando la memoria.
+        :param seed: Seed del generatore usato nelle compattazioni.
+        """
+        self.k = k
+        self.n = 0
+        self._compattatori = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def errore_rango(self):
+        """
+        Errore normalizzato di rango dei quantili stimati, con confidenza del 99%.
+
+        Un quantile q restituito dallo sketch ha un rango reale compreso in [q - errore, q + errore]. Finché non è
+        avvenuta alcuna compattazione lo sketch è esatto.
+
+        :return: Errore di rango come frazione di n.
+        :rtype: float
+        """
+        if len(self._compattatori) == 1:
+            return 0.0
+
+        return 2.296 / self.k ** 0.9723
+
+    def _capacita(self, livello):
+        """
+        Calcola la capacità di un livello: decresce geometricamente scendendo verso il livello 0.
+
+        :param livello: Indice del livello.
+        :return: Numero massimo di elementi del livello.
+        """
+        altezza = len(self._compattatori)
+        return max(2, int(np.ceil(self.k * self.FATTORE_CAPACITA ** (altezza - livello - 1))))
+
+    def _comprimi(self):
+        """
+        Compatta i livelli che superano la loro capacità, promuovendo metà degli elementi al livello successivo.
+        """
+        livello = 0
+        while livello < len(self._compattatori):
+            compattatore = self._compattatori[livello]
+            if len(compattatore) > self._capacita(livello):
+                if livello + 1 == len(self._compattatori):
+                    self._compattatori.append(np.empty(0))
+
+                ordinati = np.sort(compattatore)
+                # Se gli elementi sono dispari, uno resta al livello corrente
+                resto = len(ordinati) % 2
+                promossi = ordinati[resto:][self._rng.integers(0, 2)::2]
+
+                self._compattatori[livello] = ordinati[:resto]
+                self._compattatori[livello + 1] = np.concatenate([self._compattatori[livello + 1], promossi])
+
+            livello += 1
+
+    def aggiorna(self, valori):
+        """
+        Inserisce un blocco di valori nello sketch. I valori NaN vengono ignorati.
+
+        :param valori: Array di valori numerici.
+        """
+        valori = np.asarray(valori, dtype=float)
+        valori = valori[~np.isnan(valori)]
+        if len(valori) == 0:
+            return
+
+        self.n += len(valori)
+        self._compattatori[0] = np.concatenate([self._compattatori[0], valori])
+        self._comprimi()
+
+    def unisci(self, altro):
+        """
+        Unisce un altro sketch in questo, come se tutti i suoi valori fossero stati inseriti qui.
+
+        :param altro: Lo sketch da unire.
+        :type altro: SketchKLL
+        """
+        while len(self._compattatori) < len(altro._compattatori):
+            self._compattatori.append(np.empty(0))
+
+        for livello, compattatore in enumerate(altro._compattatori):
+            self._compattatori[livello] = np.concatenate([self._compattatori[livello], compattatore])
+
+        self.n += altro.n
+        self._comprimi()
+
+    def quantili(self, q):
+        """
+        Stima i quantili richiesti.
+
+        :param q: Quantile o lista di quantili compresi tra 0 e 1.
+        :return: Array dei quantili stimati (NaN se lo sketch è vuoto).
+        :rtype: np.ndarray
+        """
+        q = np.atleast_1d(np.asarray(q, dtype=float))
+        if self.n == 0:
+            return np.full(len(q), np.nan)
+
+        if len(self._compattatori) == 1:
+            return np.quantile(self._compattatori[0], q)
+
+        valori = np.concatenate(self._compattatori)
+        pesi = np.concatenate([
+            np.full(len(compattatore), 2 ** livello, dtype=np.int64)
+            for livello, compattatore in enumerate(self._compattatori)
+        ])
+        ordine = np.argsort(valori, kind="stable")
+        valori = valori[ordine]
+        pesi_cumulati = np.cumsum(pesi[ordine])
+
+        indici = np.searchsorted(pesi_cumulati, q * pesi_cumulati[-1], side="left")
+        return valori[np.minimum(indici, len(valori) - 1)]
+
+    def quantile(self, q):
+        """
+        Stima un singolo quantile.
+
+        :param q: Quantile compreso tra 0 e 1.
+        :return: Il quantile stimato.
+        :rtype: float
+        """
+        return float(self.quantili(q)[0])
@@ -0,0 +1,148 @@
+"""
+Calcolo delle statistiche sui prezzi degli annunci leggendo il file a blocchi, senza caricarlo interamente in memoria.
+"""
+import numpy as np
+import pandas as pd
+
+from dati.caricamento import SCHEMA_ANNUNCI
+from statistiche.filtri import maschera_filtri
+from statistiche.sketch_kll import SketchKLL
+
+COLONNE_STATISTICHE = ["agenzia", "latitudine", "longitudine", "prezzo"]
+PERCENTILI = [0.25, 0.75, 0.9]
+
+
+class AccumulatoreStatistiche:
+    """
+    Accumula in modo incrementale media, varianza, minimo, massimo e quantili di una serie di valori.
+
+    Media e varianza sono mantenute con l'algoritmo di Welford nella variante a blocchi di Chan et al.: ogni blocco
+    viene riassunto in (conteggio, media, M2) con operazioni vettoriali e poi combinato con l'aggregato corrente.
+    Due accumulatori possono essere uniti, per cui blocchi diversi possono essere elaborati indipendentemente.
+    """
+
+    def __init__(self, k=200, seed=0):
+        """
+        Inizializza un accumulatore vuoto.
+
+        :param k: Parametro di precisione dello sketch KLL usato per i quantili.
+        :param seed: Seed dello sketch KLL.
+        """
+        self.conteggio = 0
+        self.media = 0.0
+        self.m2 = 0.0
+        self.minimo = np.nan
+        self.massimo = np.nan
+        self.sketch = SketchKLL(k=k, seed=seed)
+
+    def _combina(self, conteggio, media, m2, minimo, massimo):
+        """
+        Combina un aggregato parziale con quello corrente.
+
+        :param conteggio: Numero di valori dell'aggregato parziale.
+        :param media: Media dell'aggregato parziale.
+        :param m2: Somma dei quadrati degli scarti dalla media dell'aggregato parziale.
+        :param minimo: Minimo dell'aggregato parziale.
+        :param massimo: Massimo dell'aggregato parziale.
+        """
+        if conteggio == 0:
+            return
+
+        totale = self.conteggio + conteggio
+        delta = media - self.media
+
+        self.media += delta * conteggio / totale
+        self.m2 += m2 + delta ** 2 * self.conteggio * conteggio / totale
+        self.conteggio = totale
+        self.minimo = np.fmin(self.minimo, minimo)
+        self.massimo = np.fmax(self.massimo, massimo)
+
+    def aggiorna(self, valori):
+        """
+        Aggiunge un blocco di valori. I valori NaN vengono ignorati, come fa pandas.
+
+        :param valori: Array di valori numerici.
+        """
+        valori = np.asarray(valori, dtype=float)
+        valori = valori[~np.isnan(valori)]
+        if len(valori) == 0:
+            return
+
+        media_blocco = valori.mean()
+        m2_blocco = ((valori - media_blocco) ** 2).sum()
+        self._combina(len(valori), media_blocco, m2_blocco, valori.min(), valori.max())
+        self.sketch.aggiorna(valori)
+
+    def unisci(self, altro):
+        """
+        Unisce un altro accumulatore in questo.
+
+        :param altro: L'accumulatore da unire.
+        :type altro: AccumulatoreStatistiche
+        """
+        self._combina(altro.conteggio, altro.media, altro.m2, altro.minimo, altro.massimo)
+        self.sketch.unisci(altro.sketch)
+
+    @property
+    def deviazione_standard(self):
+        """
+        Deviazione standard campionaria (ddof=1), come quella calcolata da pandas.
+
+        :return: La deviazione standard o NaN se ci sono meno di due valori.
+        :rtype: float
+        """
+        if self.conteggio < 2:
+            return np.nan
+
+        return float(np.sqrt(self.m2 / (self.conteggio - 1)))
+
+    def get_statistiche(self, percentili=None):
+        """
+        Restituisce le statistiche accumulate.
+
+        :param percentili: Lista dei quantili da stimare oltre alla mediana.
+        :return: Dizionario con media, mediana, deviazione standard, minimo, massimo, percentili ed errore di rango
+                 dei quantili.
+        :rtype: dict
+        """
+        percentili = PERCENTILI if percentili is None else percentili
+        stime = self.sketch.quantili([0.5, *percentili])
+
+        return {
+            "media": float(self.media) if self.conteggio else np.nan,
+            "mediana": float(stime[0]),
+            "deviazione_standard": self.deviazione_standard,
+            "minimo": float(self.minimo),
+            "massimo": float(self.massimo),
+            "percentili": dict(zip(percentili, stime[1:].tolist())),
+            "errore_rango_quantili": self.sketch.errore_rango,
+        }
+
+
+def calcola_statistiche_streaming(percorso_annunci, dimensione_chunk=500_000, k=200, **filtri):
+    """
+    Calcola le statistiche sui prezzi leggendo il file degli annunci a blocchi.
+
+    Ogni blocco viene filtrato e riassunto in un aggregato parziale che viene unito al totale: la memoria occupata
+    dipende solo dalla dimensione del blocco e da k, non dal numero di annunci.
+
+    :param percorso_annunci: Percorso del file CSV degli annunci.
+    :param dimensione_chunk: Numero di righe lette per blocco.
+    :param k: Parametro di precisione dello sketch dei quantili.
+    :param filtri: Filtri accettati da `maschera_filtri` (prezzo_minimo, prezzo_massimo, latitudine, longitudine,
+                   raggio, agenzia).
+    :return: Dizionario delle statistiche, come restituito da `AccumulatoreStatistiche.get_statistiche`.
+    :rtype: dict
+    """
+    accumulatore = AccumulatoreStatistiche(k=k)
+
+    # La lettura a blocchi richiede il motore C; i tipi sono comunque quelli dichiarati nello schema degli annunci
+    tipi = {colonna: SCHEMA_ANNUNCI[colonna] for colonna in COLONNE_STATISTICHE}
+    for blocco in pd.read_csv(percorso_annunci, usecols=COLONNE_STATISTICHE, dtype=tipi, chunksize=dimensione_chunk):
+        blocco = blocco[maschera_filtri(blocco, **filtri)]
+
+        parziale = AccumulatoreStatistiche(k=k)
+        parziale.aggiorna(blocco["prezzo"].to_numpy())
+        accumulatore.unisci(parziale)
+
+    return accumulatore.get_statistiche()
@@ -0,0 +1,69 @@
+"""
+Test del motore degli scenari di `statistiche.batch`.
+"""
+import argparse
+import concurrent.futures
+import sys
+
+import numpy as np
+import pandas as pd
+
+from analyzer import _filtra_annunci
+from statistiche.batch import MotoreScenari
+
+
+def _genera_annunci(numero_annunci=2_000, seed=0):
+    """
+    :param numero_annunci: Numero di annunci sintetici.
+    :param seed: Seed del generatore di numeri casuali.
+    :return: DataFrame di annunci con prezzo, coordinate e agenzia.
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "prezzo": rng.lognormal(12.5, 0.5, numero_annunci).round(),
+        "latitudine": 45.46 + rng.normal(0, 0.03, numero_annunci),
+        "longitudine": 9.19 + rng.normal(0, 0.04, numero_annunci),
+        "agenzia": rng.choice(["GAB", "TEC", "REM", "IMM"], numero_annunci),
+    })
+
+
+def test_valuta_scenario_concorrente_con_cache_limitata():
+    """
+    Più thread che valutano scenari su sottoinsiemi diversi, con una cache di due soli sottoinsiemi, ottengono gli
+    stessi risultati di una valutazione sequenziale senza errori dovuti allo scarto concorrente degli indici.
+    """
+    annunci = _genera_annunci()
+    scenari = [{"agenzia": agenzia, "prezzo_massimo": prezzo_massimo, "latitudine": 45.46, "longitudine": 9.19,
+                "raggio": raggio}
+               for agenzia in ["GAB", "TEC", "REM", "IMM"]
+               for raggio in [1, 2, 3, 5]
+               for prezzo_massimo in [200_000, 400_000]] * 20
+
+    attesi = [MotoreScenari(annunci).valuta_scenario(**scenario) for scenario in scenari]
+
+    motore = MotoreScenari(annunci, numero_massimo_sottoinsiemi=2)
+    # Cambi di thread molto frequenti rendono probabile l'interleaving tra controllo, lettura e scarto della cache
+    intervallo = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as esecutore:
+            risultati = list(esecutore.map(lambda scenario: motore.valuta_scenario(**scenario), scenari))
+    finally:
+        sys.setswitchinterval(intervallo)
+
+    assert risultati == attesi
+    assert len(motore._indici_sottoinsieme) <= 2  # pylint: disable=protected-access
+
+
+def test_scenari_coerenti_con_i_filtri_della_linea_di_comando():
+    """
+    Il motore degli scenari e i filtri di `analyzer.py` includono gli stessi annunci, anche vicino al bordo del
+    raggio.
+    """
+    annunci = _genera_annunci(20_000)
+    for raggio in [0.5, 1.0, 2.5, 4.0]:
+        filtri = {"prezzo_minimo": 150_000, "prezzo_massimo": 500_000, "latitudine": 45.46, "longitudine": 9.19,
+                  "raggio": raggio, "agenzia": "GAB"}
+        args = argparse.Namespace(zona=None, **filtri)
+
+        assert MotoreScenari(annunci).valuta_scenario(**filtri)["conteggio"] == len(_filtra_annunci(annunci, args))
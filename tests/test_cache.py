@@ -0,0 +1,84 @@
+"""
+Test dell'invalidazione della cache dei risultati di `statistiche.cache`.
+"""
+import os
+
+import pytest
+
+from statistiche import cache as modulo_cache
+from statistiche.cache import CacheRisultati, get_chiave_query, get_versione_dati, pubblica_versione_dati
+
+ARGOMENTI = {"prezzo_minimo": 100000, "raggio": 2.0, "agenzia": None, "deduplica": False}
+
+
+@pytest.fixture(name="file_dati")
+def fixture_file_dati(tmp_path, monkeypatch):
+    """
+    Sposta il file della versione e i file letti dall'analisi in una directory temporanea.
+
+    :return: Il percorso del file degli annunci.
+    """
+    percorso_annunci = tmp_path / "annunci.csv"
+    percorso_annunci.write_text("riferimento,prezzo\n1,100000\n", encoding="utf-8")
+    monkeypatch.setattr(modulo_cache, "FILE_VERSIONE_DATI", str(tmp_path / "versione_dati.txt"))
+    monkeypatch.setattr(modulo_cache, "FILE_DATI_ANALISI", [str(percorso_annunci)])
+    return percorso_annunci
+
+
+@pytest.mark.usefixtures("file_dati")
+def test_chiave_delle_query_equivalenti():
+    """
+    L'ordine degli argomenti e quelli non impostati non cambiano la chiave, mentre un argomento diverso sì.
+    """
+    versione = get_versione_dati()
+
+    assert get_chiave_query(ARGOMENTI, versione) == \
+        get_chiave_query({"raggio": 2.0000000001, "prezzo_minimo": 100000}, versione)
+    assert get_chiave_query(ARGOMENTI, versione) != get_chiave_query({**ARGOMENTI, "raggio": 3.0}, versione)
+
+
+@pytest.mark.usefixtures("file_dati")
+def test_nuova_versione_invalida_la_cache(tmp_path):
+    """
+    Dopo la pubblicazione di una nuova versione dei dati la stessa query ha una chiave diversa e la cache è vuota.
+    """
+    cache = CacheRisultati(str(tmp_path / "cache"))
+    chiave = get_chiave_query(ARGOMENTI, get_versione_dati())
+    cache.scrivi(chiave, {"statistiche": 1})
+    assert cache.leggi(chiave) == {"statistiche": 1}
+
+    pubblica_versione_dati(cache.directory)
+    nuova_chiave = get_chiave_query(ARGOMENTI, get_versione_dati())
+
+    assert nuova_chiave != chiave
+    assert cache.leggi(chiave) is None
+    assert cache.leggi(nuova_chiave) is None
+
+
+def test_modifica_dei_dati_cambia_la_versione(file_dati):
+    """
+    Anche senza una nuova versione pubblicata, la modifica di un file letto dall'analisi o di un file aggiuntivo cambia
+    la versione dei dati.
+    """
+    versione = get_versione_dati()
+    file_dati.write_text("riferimento,prezzo\n1,100000\n2,200000\n", encoding="utf-8")
+    assert get_versione_dati() != versione
+
+    percorso_zone = file_dati.parent / "zone.geojson"
+    percorso_zone.write_text("{}", encoding="utf-8")
+    assert get_versione_dati([str(percorso_zone)]) != get_versione_dati()
+
+
+def test_eliminazione_dei_meno_recenti(tmp_path):
+    """
+    Superato il numero massimo di voci viene eliminato il risultato letto meno di recente.
+    """
+    cache = CacheRisultati(str(tmp_path / "cache"), numero_massimo_voci=2)
+    cache.scrivi("prima", 1)
+    cache.scrivi("seconda", 2)
+    os.utime(cache._get_percorso("seconda"), ns=(0, 0))
+    cache.leggi("prima")
+    cache.scrivi("terza", 3)
+
+    assert cache.leggi("seconda") is None
+    assert (cache.leggi("prima"), cache.leggi("terza")) == (1, 3)
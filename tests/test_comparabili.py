@@ -0,0 +1,53 @@
+"""
+Test della ricerca dei comparabili di `geo.comparabili`.
+"""
+import numpy as np
+import pandas as pd
+
+from geo.comparabili import calcola_comparabili
+
+
+def test_calcola_comparabili_con_coordinate_mancanti():
+    """
+    Gli annunci senza latitudine o longitudine non hanno comparabili e non compaiono tra quelli degli altri annunci.
+    """
+    rng = np.random.default_rng(0)
+    numero_annunci = 200
+    annunci = pd.DataFrame({
+        "latitudine": 45.46 + rng.normal(0, 0.005, numero_annunci),
+        "longitudine": 9.19 + rng.normal(0, 0.005, numero_annunci),
+        "prezzo": rng.lognormal(12.5, 0.5, numero_annunci).round(),
+        "mq": rng.integers(40, 150, numero_annunci).astype(float),
+        "locali": rng.integers(1, 5, numero_annunci).astype(float),
+        "tipologia": np.zeros(numero_annunci, dtype=int),
+    })
+    annunci.loc[3, "latitudine"] = np.nan
+    annunci.loc[7, "longitudine"] = np.nan
+
+    posizioni, punteggi = calcola_comparabili(annunci, k=5, processi=1)
+
+    assert posizioni.shape == punteggi.shape == (numero_annunci, 5)
+    for posizione in [3, 7]:
+        assert (posizioni[posizione] == -1).all()
+        assert np.isinf(punteggi[posizione]).all()
+    assert not np.isin(posizioni, [3, 7]).any()
+    assert (np.delete(posizioni, [3, 7], axis=0) >= 0).all()
+
+
+def test_calcola_comparabili_senza_annunci_indicizzabili():
+    """
+    Se nessun annuncio ha un prezzo valido l'indice è vuoto e nessun annuncio ha comparabili.
+    """
+    annunci = pd.DataFrame({
+        "latitudine": [45.46, 45.47, np.nan],
+        "longitudine": [9.19, 9.20, 9.21],
+        "prezzo": [np.nan, np.nan, np.nan],
+        "mq": [50.0, 80.0, 65.0],
+        "locali": [2.0, 3.0, np.nan],
+        "tipologia": [1, 1, 1],
+    })
+
+    posizioni, punteggi = calcola_comparabili(annunci, k=4, processi=1)
+
+    assert (posizioni == -1).all() and posizioni.shape == (3, 4)
+    assert np.isinf(punteggi).all() and punteggi.shape == (3, 4)
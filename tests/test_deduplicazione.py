@@ -0,0 +1,101 @@
+"""
+Test del riconoscimento degli annunci duplicati di `geo.deduplicazione`.
+"""
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from geo.deduplicazione import DIMENSIONE_CELLA_GRADI, _calcola_blocchi, deduplica, genera_coppie_candidate
+
+
+def _genera_annunci(numero_annunci, seed=0):
+    """
+    :param numero_annunci: Numero di annunci da generare, concentrati in una piccola area.
+    :param seed: Seed dei numeri casuali.
+    :return: DataFrame degli annunci con le colonne usate dalla deduplicazione, con alcune coordinate mancanti.
+    :rtype: pd.DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    annunci = pd.DataFrame({
+        "riferimento": np.arange(numero_annunci) * 7 + 3,
+        "tipologia": rng.integers(1, 3, numero_annunci),
+        "latitudine": 45.46 + rng.uniform(0, 0.005, numero_annunci),
+        "longitudine": 9.18 + rng.uniform(0, 0.005, numero_annunci),
+        "mq": rng.uniform(60, 90, numero_annunci).round(),
+        "locali": rng.integers(2, 4, numero_annunci).astype(float),
+        "prezzo": rng.uniform(2e5, 3e5, numero_annunci).round(),
+        "agenzia": rng.choice(["A", "B", "C"], numero_annunci),
+    })
+    annunci.loc[rng.choice(numero_annunci, 10, replace=False), "latitudine"] = np.nan
+    return annunci
+
+
+def _coppie_forza_bruta(annunci, posizioni_nuove):
+    """
+    :return: Insieme delle coppie non ordinate di annunci in blocchi uguali o adiacenti con almeno un annuncio nuovo.
+    :rtype: set
+    """
+    blocchi = _calcola_blocchi(annunci, DIMENSIONE_CELLA_GRADI)
+    posizioni = blocchi["posizione"].to_numpy()
+    chiavi = blocchi[["tipologia", "cella_lat", "cella_lon", "fascia_mq"]].to_numpy()
+
+    return {
+        (posizioni[sinistra], posizioni[destra])
+        for sinistra, destra in itertools.combinations(range(len(blocchi)), 2)
+        if chiavi[sinistra, 0] == chiavi[destra, 0] and np.abs(chiavi[sinistra] - chiavi[destra]).max() <= 1
+        and (posizioni[sinistra] in posizioni_nuove or posizioni[destra] in posizioni_nuove)
+    }
+
+
+def test_coppie_candidate_come_forza_bruta():
+    """
+    Le coppie generate sono esattamente quelle nello stesso blocco o in blocchi adiacenti, ognuna una sola volta, sia
+    confrontando tutti gli annunci sia solo quelli nuovi.
+    """
+    annunci = _genera_annunci(300)
+
+    for posizioni_nuove in [np.arange(len(annunci)), np.array([0, 5, 17, 42, 250])]:
+        sinistre, destre = genera_coppie_candidate(
+            annunci, None if len(posizioni_nuove) == len(annunci) else posizioni_nuove)
+        coppie = [tuple(sorted(coppia)) for coppia in zip(sinistre.tolist(), destre.tolist())]
+
+        assert len(coppie) == len(set(coppie))
+        assert set(coppie) == _coppie_forza_bruta(annunci, set(posizioni_nuove.tolist()))
+
+
+def _annuncio(riferimento, agenzia, prezzo, mq=80.0):
+    """
+    :return: Un annuncio di 3 locali, sempre nella stessa posizione.
+    :rtype: dict
+    """
+    return {"riferimento": riferimento, "tipologia": 1, "latitudine": 45.46, "longitudine": 9.18, "mq": mq,
+            "locali": 3.0, "prezzo": prezzo, "agenzia": agenzia}
+
+
+def test_nessuna_catena_tra_annunci_della_stessa_agenzia():
+    """
+    Due annunci della stessa agenzia non finiscono nello stesso immobile nemmeno se sono entrambi simili all'annuncio di
+    un'altra agenzia, che viene associato al più simile dei due.
+    """
+    annunci = pd.DataFrame([_annuncio(1, "A", 300000), _annuncio(2, "B", 300000), _annuncio(3, "A", 310000)])
+
+    proprieta = deduplica(annunci)
+
+    assert proprieta.to_dict() == {1: 1, 2: 1, 3: 3}
+
+
+def test_annuncio_con_prezzo_modificato_lascia_il_gruppo():
+    """
+    Un annuncio che dopo una modifica di prezzo non è più simile al suo gruppo ne viene separato, come in un calcolo
+    da zero.
+    """
+    annunci = pd.DataFrame([_annuncio(1, "A", 300000, 85.0), _annuncio(2, "B", 300000), _annuncio(3, "C", 300000)])
+    proprieta = deduplica(annunci)
+    assert proprieta.to_dict() == {1: 1, 2: 1, 3: 1}
+
+    annunci.loc[annunci["riferimento"] == 1, "prezzo"] = 600000
+    aggiornata = deduplica(annunci, [1], proprieta)
+
+    assert aggiornata.to_dict() == {1: 1, 2: 2, 3: 2}
+    pd.testing.assert_series_equal(aggiornata, deduplica(annunci))
@@ -0,0 +1,76 @@
+"""
+Test della generazione a blocchi di `generatore_csv_transazioni`.
+"""
+import json
+import os
+
+import pandas as pd
+
+from dati import leggi_transazioni
+from generatore_csv_transazioni import FORMATI_TRANSAZIONI, _prepara_directory_blocchi, genera_transazioni_a_blocchi
+
+
+def test_genera_transazioni_a_blocchi_riproducibile(tmp_path):
+    """
+    A parità di seed e data finale il file generato è sempre lo stesso e non contiene date successive alla data
+    finale.
+    """
+    percorsi = [tmp_path / "prima.csv", tmp_path / "seconda.csv"]
+    for percorso in percorsi:
+        genera_transazioni_a_blocchi(3000, 200, 5, 100, str(percorso), dimensione_blocco=1000, seed=7,
+                                     data_finale="2015-06-30")
+
+    prima, seconda = (pd.read_csv(percorso) for percorso in percorsi)
+    pd.testing.assert_frame_equal(prima, seconda)
+    assert prima["data"].max() <= "2015-06-30"
+
+
+def test_genera_transazioni_a_blocchi_indipendente_dai_processi(tmp_path):
+    """
+    Il file generato non dipende dal numero di processi, nemmeno quando i processi sono più dei blocchi.
+    """
+    letture = []
+    for numero_processi in [1, 4]:
+        percorso = str(tmp_path / f"transazioni_{numero_processi}.csv")
+        genera_transazioni_a_blocchi(2000, 200, 5, 100, percorso, dimensione_blocco=1000,
+                                     numero_processi=numero_processi, seed=7, data_finale="2015-06-30")
+        letture.append(pd.read_csv(percorso))
+
+    pd.testing.assert_frame_equal(letture[0], letture[1])
+    assert len(letture[0]) == 2000
+
+
+def test_ripresa_usa_la_data_finale_salvata(tmp_path):
+    """
+    Una generazione ripresa senza seed né data finale usa quelli salvati in `parametri.json`, mentre una directory
+    senza data finale salvata viene ricominciata.
+    """
+    directory = str(tmp_path / "blocchi")
+    parametri = {"numero_record": 10}
+
+    assert _prepara_directory_blocchi(directory, parametri, 5, "2019-05-05") == (5, "2019-05-05")
+    assert _prepara_directory_blocchi(directory, parametri, None, None) == (5, "2019-05-05")
+
+    percorso_parametri = os.path.join(directory, "parametri.json")
+    with open(percorso_parametri, "w", encoding="utf-8") as file_parametri:
+        json.dump({"parametri": parametri, "seed": 5}, file_parametri)
+    _, data_finale = _prepara_directory_blocchi(directory, parametri, 5, "2020-01-01")
+
+    assert data_finale == "2020-01-01"
+    with open(percorso_parametri, encoding="utf-8") as file_parametri:
+        assert json.load(file_parametri)["data_finale"] == "2020-01-01"
+
+
+def test_leggi_transazioni_in_ogni_formato(tmp_path):
+    """
+    Le transazioni generate in CSV, CSV compresso e Parquet vengono lette con gli stessi valori e gli stessi tipi.
+    """
+    letture = []
+    for formato in FORMATI_TRANSAZIONI:
+        percorso = str(tmp_path / f"transazioni.{formato}")
+        genera_transazioni_a_blocchi(3000, 200, 5, 100, percorso, formato, dimensione_blocco=1000, seed=7,
+                                     data_finale="2015-06-30")
+        letture.append(leggi_transazioni(percorso))
+
+    for transazioni in letture[1:]:
+        pd.testing.assert_frame_equal(transazioni, letture[0], check_categorical=False)
@@ -0,0 +1,78 @@
+"""
+Test della griglia geografica dei prezzi di `geo.griglia`.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from geo.griglia import BASE_INTERVALLO, NUMERO_LIVELLI, aggiorna_griglia, get_lato_cella, get_percorso_livello, \
+    leggi_griglia, riepiloga_griglia
+
+
+def _genera_annunci(numero_annunci, seed=0):
+    """
+    :param numero_annunci: Numero di annunci da generare.
+    :param seed: Seed dei numeri casuali.
+    :return: DataFrame degli annunci con coordinate, prezzo e metri quadrati, con alcuni valori mancanti.
+    :rtype: pd.DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    annunci = pd.DataFrame({
+        "latitudine": 45.45 + rng.uniform(0, 0.1, numero_annunci),
+        "longitudine": 9.15 + rng.uniform(0, 0.1, numero_annunci),
+        "mq": rng.uniform(30, 200, numero_annunci).round(),
+    })
+    annunci["prezzo"] = (annunci["mq"] * rng.lognormal(np.log(5000), 0.3, numero_annunci)).round()
+    annunci.loc[rng.choice(numero_annunci, 20, replace=False), "latitudine"] = np.nan
+    annunci.loc[rng.choice(numero_annunci, 20, replace=False), "mq"] = np.nan
+    return annunci
+
+
+def test_aggiornamento_come_ricostruzione(tmp_path):
+    """
+    Aggiungere gli annunci in due merge e togliere la versione precedente di quelli con prezzo modificato dà la stessa
+    griglia della ricostruzione da zero, salvata in un file per livello.
+    """
+    annunci = _genera_annunci(2000)
+    modificati = annunci.head(300).assign(prezzo=lambda righe: righe["prezzo"] * 1.3)
+    finali = pd.concat([modificati, annunci.iloc[300:]])
+
+    incrementale, ricostruita = str(tmp_path / "incrementale"), str(tmp_path / "ricostruita")
+    aggiorna_griglia(annunci.head(1500), directory_griglia=incrementale, ricostruisci=True)
+    aggiorna_griglia(pd.concat([modificati, annunci.iloc[1500:]]), annunci.head(300), directory_griglia=incrementale)
+    aggiorna_griglia(finali, directory_griglia=ricostruita, ricostruisci=True)
+
+    for livello in range(NUMERO_LIVELLI):
+        assert os.path.exists(get_percorso_livello(livello, incrementale))
+        griglia = leggi_griglia(livello, incrementale)
+        attesa = leggi_griglia(livello, ricostruita)
+
+        assert (griglia["livello"] == livello).all()
+        pd.testing.assert_frame_equal(griglia.drop(columns="somma"), attesa.drop(columns="somma"))
+        np.testing.assert_allclose(griglia["somma"], attesa["somma"])
+
+
+def test_riepilogo_delle_celle(tmp_path):
+    """
+    Conteggi e medie delle celle sono esatti e la mediana ha un errore relativo inferiore all'ampiezza di un
+    intervallo.
+    """
+    annunci = _genera_annunci(5000)
+    aggiorna_griglia(annunci, directory_griglia=str(tmp_path), ricostruisci=True)
+    livello = 0
+    celle = riepiloga_griglia(leggi_griglia(livello, str(tmp_path)), livello) \
+        .set_index(["cella_latitudine", "cella_longitudine"])
+
+    validi = annunci.dropna(subset=["latitudine", "longitudine"])
+    lato = get_lato_cella(livello)
+    attese = validi.groupby([np.floor(validi["latitudine"] / lato).astype(int).rename("cella_latitudine"),
+                             np.floor(validi["longitudine"] / lato).astype(int).rename("cella_longitudine")])["prezzo"]
+    attese = attese.agg(["count", "mean", lambda prezzi: np.sort(prezzi)[(len(prezzi) - 1) // 2]])
+    attese.columns = ["conteggio", "media", "mediana"]
+    attese = attese.reindex(celle.index)
+
+    assert celle["conteggio"].sum() == len(validi)
+    np.testing.assert_array_equal(celle["conteggio"], attese["conteggio"])
+    np.testing.assert_allclose(celle["media_prezzo"], attese["media"])
+    assert (np.abs(celle["mediana_prezzo"] / attese["mediana"] - 1) < BASE_INTERVALLO - 1).all()
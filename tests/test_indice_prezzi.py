@@ -0,0 +1,50 @@
+"""
+Test dell'indice edonico dei prezzi di `statistiche.indice_prezzi`.
+"""
+import numpy as np
+import pandas as pd
+
+from statistiche.indice_prezzi import StatisticheIndicePrezzi, aggiorna_indice_prezzi, calcola_indice_prezzi
+
+
+def _genera_annunci(numero_annunci, seed=0):
+    """
+    :param numero_annunci: Numero di annunci sintetici.
+    :param seed: Seed del generatore di numeri casuali.
+    :return: DataFrame di annunci con le colonne usate dall'indice, indicizzato per riferimento.
+    :rtype: pd.DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    mq = rng.uniform(30, 200, numero_annunci).round()
+    return pd.DataFrame({
+        "latitudine": 45.46 + rng.normal(0, 0.03, numero_annunci),
+        "longitudine": 9.19 + rng.normal(0, 0.04, numero_annunci),
+        "prezzo": (mq * 4000 * rng.lognormal(0, 0.2, numero_annunci)).round(),
+        "mq": mq,
+        "locali": rng.integers(1, 6, numero_annunci).astype(float),
+        "tipologia": rng.integers(0, 3, numero_annunci),
+        "data_ultima_modifica_prezzo": pd.Timestamp("2023-01-01") +
+        pd.to_timedelta(rng.integers(0, 365, numero_annunci), unit="D"),
+    }, index=pd.RangeIndex(numero_annunci, name="riferimento"))
+
+
+def test_aggiornamento_incrementale_uguale_alla_ricostruzione(tmp_path):
+    """
+    Aggiornare le statistiche con annunci nuovi e modificati, togliendo la versione precedente di questi ultimi, dà lo
+    stesso indice delle statistiche ricalcolate da tutti gli annunci attuali.
+    """
+    percorso = str(tmp_path / "indice_prezzi.npz")
+    annunci = _genera_annunci(3000)
+    aggiorna_indice_prezzi(annunci.iloc[:2500], percorso=percorso, ricostruisci=True)
+
+    modificati = annunci.index[:300]
+    precedenti = annunci.loc[modificati].copy()
+    annunci.loc[modificati, "prezzo"] *= 1.2
+    annunci.loc[modificati, "data_ultima_modifica_prezzo"] = pd.Timestamp("2024-01-15")
+    aggiunti = annunci.loc[modificati.append(annunci.index[2500:])]
+
+    incrementale = aggiorna_indice_prezzi(aggiunti, precedenti, percorso=percorso)
+
+    assert incrementale.numero_osservazioni == len(annunci)
+    pd.testing.assert_frame_equal(StatisticheIndicePrezzi.carica(percorso).calcola_indice(),
+                                  calcola_indice_prezzi(annunci), check_exact=False, rtol=1e-9)
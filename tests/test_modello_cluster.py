@@ -0,0 +1,98 @@
+"""
+Test del modello dei cluster degli appartamenti di `grafici.modello_cluster`.
+"""
+import locale
+import sys
+
+import numpy as np
+import pandas as pd
+from matplotlib import pyplot as plt
+
+from grafici import plot_clusterizazzione
+from grafici.modello_cluster import ModelloCluster, aggiorna_modello_cluster
+
+
+def _genera_appartamenti(numero_appartamenti, seed=0):
+    """
+    :param numero_appartamenti: Numero di appartamenti da generare.
+    :param seed: Seed dei numeri casuali.
+    :return: DataFrame degli appartamenti con le colonne usate dal modello e dal grafico.
+    :rtype: pd.DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    mq = rng.uniform(30, 200, numero_appartamenti).round()
+    return pd.DataFrame({
+        "riferimento": np.arange(numero_appartamenti),
+        "prezzo": (mq * rng.choice([2500, 6000], numero_appartamenti) * rng.uniform(0.9, 1.1, numero_appartamenti)),
+        "mq": mq,
+        "nome_tipologia": "appartamento",
+        "data_ultima_modifica_prezzo": pd.Timestamp("2024-01-01"),
+    })
+
+
+def _etichette_disegnate(monkeypatch, annunci, percorso_modello):
+    """
+    Disegna il grafico dei cluster e restituisce l'etichetta della legenda di ogni cluster.
+
+    :return: Dizionario ID del cluster -> etichetta.
+    :rtype: dict
+    """
+    # Il modulo è nascosto dall'omonima funzione esportata da `grafici`
+    modulo = sys.modules["grafici.plot_clusterizazzione"]
+    etichette = {}
+    monkeypatch.setattr(locale, "setlocale", lambda *args: None)
+    monkeypatch.setattr(modulo._assegna_clusters, "__defaults__", (percorso_modello,))
+    monkeypatch.setattr(modulo, "_plot_cluster_data", lambda appartamenti, ordinati, soglia: etichette.update(ordinati))
+    monkeypatch.setattr(plt, "show", lambda: plt.close("all"))
+    plot_clusterizazzione(annunci)
+    return etichette
+
+
+def test_etichette_indipendenti_dai_filtri(monkeypatch, tmp_path):
+    """
+    Lo stesso cluster ha la stessa etichetta qualunque sottoinsieme di appartamenti venga disegnato.
+    """
+    percorso_modello = str(tmp_path / "modello.joblib")
+    appartamenti = _genera_appartamenti(3000)
+    modello = ModelloCluster()
+    modello.aggiorna(appartamenti)
+    modello.salva(percorso_modello)
+
+    tutti = _etichette_disegnate(monkeypatch, appartamenti, percorso_modello)
+    filtrati = _etichette_disegnate(monkeypatch, appartamenti[appartamenti["prezzo"] > 300000], percorso_modello)
+
+    assert len(set(tutti.values())) == 6
+    assert all(tutti[cluster] == etichetta for cluster, etichetta in filtrati.items())
+
+
+def test_annuncio_con_prezzo_modificato_viene_appreso(tmp_path):
+    """
+    Un annuncio già appreso e poi ripubblicato con un prezzo diverso aggiorna di nuovo il modello.
+    """
+    percorso_modello = str(tmp_path / "modello.joblib")
+    appartamenti = _genera_appartamenti(600).assign(tipologia=1)
+    aggiorna_modello_cluster(appartamenti, percorso_modello, ricostruisci=True)
+    centri_prima = ModelloCluster.carica(percorso_modello).centri()
+
+    modificati = appartamenti.head(50).assign(prezzo=lambda annunci: annunci["prezzo"] * 3)
+    centri_dopo = aggiorna_modello_cluster(modificati, percorso_modello).centri()
+
+    assert not np.allclose(centri_prima.to_numpy(), centri_dopo.to_numpy())
+    assert not hasattr(ModelloCluster.carica(percorso_modello), "riferimenti_visti")
+
+
+def test_modello_mancante_addestrato_su_tutti_gli_annunci(tmp_path):
+    """
+    Se il modello non è ancora stato salvato viene addestrato su tutti gli annunci del file, non sui soli aggiunti.
+    """
+    percorso_annunci = str(tmp_path / "annunci.csv")
+    appartamenti = _genera_appartamenti(600).assign(tipologia=1)
+    appartamenti.assign(agenzia="GAB", link="", latitudine=np.nan, longitudine=np.nan, locali=np.nan) \
+        .drop(columns="nome_tipologia").to_csv(percorso_annunci, index=False)
+
+    modello = aggiorna_modello_cluster(appartamenti.head(3), str(tmp_path / "modello.joblib"),
+                                       percorso_annunci=percorso_annunci)
+    completo = aggiorna_modello_cluster(appartamenti, str(tmp_path / "completo.joblib"), ricostruisci=True)
+
+    assert modello.addestrato
+    np.testing.assert_allclose(modello.centri().to_numpy(), completo.centri().to_numpy())
@@ -0,0 +1,92 @@
+"""
+Test dell'aggiornamento incrementale del rollup giornaliero di `statistiche.rollup`.
+"""
+import numpy as np
+import pandas as pd
+
+from statistiche.rollup import AGGREGAZIONI_ROLLUP, CHIAVI_ROLLUP, aggiorna_rollup, calcola_rollup, \
+    calcola_statistiche_rollup
+
+COLONNE_SOMMA = [colonna for colonna, aggregazione in AGGREGAZIONI_ROLLUP.items() if aggregazione == "sum"]
+
+
+def _genera_annunci(numero_annunci, seed=0):
+    """
+    :param numero_annunci: Numero di annunci da generare.
+    :param seed: Seed dei numeri casuali.
+    :return: DataFrame degli annunci nello schema di `files/annunci.csv`, con alcuni prezzi e mq mancanti.
+    :rtype: pd.DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    annunci = pd.DataFrame({
+        "riferimento": np.arange(numero_annunci),
+        "agenzia": rng.choice(["GAB", "TEC"], numero_annunci),
+        "link": "",
+        "latitudine": np.nan,
+        "longitudine": np.nan,
+        "prezzo": rng.uniform(1e5, 5e5, numero_annunci).round(),
+        "mq": rng.uniform(30, 150, numero_annunci).round(),
+        "locali": np.nan,
+        "tipologia": rng.integers(1, 4, numero_annunci),
+        "data_ultima_modifica_prezzo": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 30, numero_annunci),
+                                                                                   unit="D"),
+    })
+    annunci.loc[rng.choice(numero_annunci, 10, replace=False), "prezzo"] = np.nan
+    annunci.loc[rng.choice(numero_annunci, 10, replace=False), "mq"] = 0
+    return annunci
+
+
+def _riprezza(annunci):
+    """
+    :return: Gli annunci con un nuovo prezzo, modificato 40 giorni dopo.
+    :rtype: pd.DataFrame
+    """
+    return annunci.assign(prezzo=annunci["prezzo"] * 0.9,
+                          data_ultima_modifica_prezzo=annunci["data_ultima_modifica_prezzo"] + pd.Timedelta(days=40))
+
+
+def test_aggiunta_e_rimozione_come_ricostruzione(tmp_path):
+    """
+    Aggiungere gli annunci nuovi e spostare le osservazioni di quelli con prezzo modificato dà gli stessi conteggi e le
+    stesse somme del rollup ricostruito da zero; minimi e massimi restano limiti dei prezzi rimasti.
+    """
+    annunci = _genera_annunci(1000)
+    modificati = _riprezza(annunci.head(200))
+    finali = pd.concat([modificati, annunci.iloc[200:]])
+
+    percorso = str(tmp_path / "rollup.csv")
+    aggiorna_rollup(annunci.head(800), percorso_rollup=percorso, ricostruisci=True)
+    incrementale = aggiorna_rollup(pd.concat([modificati, annunci.iloc[800:]]), annunci.head(200),
+                                   percorso_rollup=percorso)
+    ricostruito = calcola_rollup(finali)
+
+    unione = incrementale.merge(ricostruito, on=CHIAVI_ROLLUP, how="outer", suffixes=("", "_atteso"))
+    assert len(unione) == len(incrementale) == len(ricostruito)
+    for colonna in COLONNE_SOMMA:
+        np.testing.assert_allclose(unione[colonna], unione[f"{colonna}_atteso"], rtol=1e-9)
+    assert (unione["prezzo_minimo"] <= unione["prezzo_minimo_atteso"]).all()
+    assert (unione["prezzo_massimo"] >= unione["prezzo_massimo_atteso"]).all()
+
+    statistiche = calcola_statistiche_rollup(incrementale)
+    prezzi = finali["prezzo"].dropna()
+    assert statistiche["conteggio"] == len(prezzi)
+    np.testing.assert_allclose(statistiche["media"], prezzi.mean())
+    np.testing.assert_allclose(statistiche["deviazione_standard"], prezzi.std())
+
+
+def test_rollup_mancante_ricostruito_da_tutti_gli_annunci(tmp_path):
+    """
+    Se il rollup non è ancora stato salvato viene ricostruito da tutti gli annunci del file, senza togliere
+    osservazioni mai aggiunte.
+    """
+    annunci = _genera_annunci(500)
+    modificati = _riprezza(annunci.head(50))
+    finali = pd.concat([modificati, annunci.iloc[50:]])
+    percorso_annunci = str(tmp_path / "annunci.csv")
+    finali.to_csv(percorso_annunci, index=False)
+
+    rollup = aggiorna_rollup(modificati, annunci.head(50), percorso_rollup=str(tmp_path / "rollup.csv"),
+                             percorso_annunci=percorso_annunci)
+
+    pd.testing.assert_frame_equal(rollup[CHIAVI_ROLLUP + COLONNE_SOMMA],
+                                  calcola_rollup(finali)[CHIAVI_ROLLUP + COLONNE_SOMMA], check_dtype=False)
@@ -0,0 +1,61 @@
+"""
+Test delle risposte di errore di `servizio_query`.
+"""
+import json
+import threading
+import types
+import urllib.error
+import urllib.request
+
+import pytest
+
+from servizio_query import ServizioQuery
+
+
+@pytest.fixture(name="indirizzo")
+def fixture_indirizzo():
+    """
+    Avvia il servizio su una porta libera con dati incompleti, in cui manca il numero di annunci.
+
+    :return: L'URL di base del servizio.
+    """
+    servizio = ServizioQuery(("127.0.0.1", 0), types.SimpleNamespace(versione="1", indice=None))
+    thread = threading.Thread(target=servizio.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{servizio.server_address[1]}"
+    servizio.shutdown()
+    servizio.server_close()
+
+
+def _richiedi(url):
+    """
+    :param url: URL da richiedere.
+    :return: Tupla (stato HTTP, corpo JSON decodificato).
+    :rtype: tuple
+    """
+    try:
+        with urllib.request.urlopen(url, timeout=5) as risposta:
+            return risposta.status, json.load(risposta)
+    except urllib.error.HTTPError as errore:
+        return errore.code, json.load(errore)
+
+
+def test_errore_della_richiesta(indirizzo):
+    """
+    Un errore dovuto alla richiesta restituisce lo stato 400 con il messaggio in JSON.
+    """
+    stato, corpo = _richiedi(f"{indirizzo}/indice")
+
+    assert stato == 400
+    assert "errore" in corpo
+
+
+def test_errore_interno(indirizzo):
+    """
+    Un errore imprevisto durante la risposta restituisce lo stato 500 con il messaggio in JSON, invece di chiudere
+    la connessione.
+    """
+    stato, corpo = _richiedi(f"{indirizzo}/versione")
+
+    assert stato == 500
+    assert "numero_annunci" in corpo["errore"]
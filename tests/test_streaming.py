@@ -0,0 +1,105 @@
+"""
+Test delle statistiche a blocchi di `statistiche.streaming` e dello sketch dei quantili di `statistiche.sketch_kll`.
+"""
+import numpy as np
+import pandas as pd
+
+from statistiche.sketch_kll import SketchKLL
+from statistiche.streaming import AccumulatoreStatistiche, calcola_statistiche_streaming
+
+QUANTILI = np.linspace(0.01, 0.99, 99)
+
+
+def _errore_rango_massimo(valori, stime, quantili):
+    """
+    :return: La massima distanza tra il quantile richiesto e il rango normalizzato reale della stima.
+    :rtype: float
+    """
+    ordinati = np.sort(valori)
+    ranghi_minimi = np.searchsorted(ordinati, stime, side="left") / len(ordinati)
+    ranghi_massimi = np.searchsorted(ordinati, stime, side="right") / len(ordinati)
+    return float(np.max(np.maximum(ranghi_minimi - quantili, quantili - ranghi_massimi).clip(min=0)))
+
+
+def test_sketch_esatto_senza_compattazioni():
+    """
+    Finché non supera la sua capacità lo sketch restituisce i quantili esatti e un errore di rango nullo.
+    """
+    valori = np.random.default_rng(0).normal(size=100)
+    sketch = SketchKLL(k=200, seed=0)
+    sketch.aggiorna(valori)
+
+    assert sketch.errore_rango == 0
+    np.testing.assert_allclose(sketch.quantili(QUANTILI), np.quantile(valori, QUANTILI))
+
+
+def test_errore_rango_dello_sketch_unito():
+    """
+    Uno sketch costruito unendo gli sketch di blocchi separati stima i quantili entro l'errore di rango dichiarato.
+    """
+    rng = np.random.default_rng(1)
+    valori = np.concatenate([rng.lognormal(12, 0.5, 150_000), rng.uniform(0, 1e5, 50_000)])
+    rng.shuffle(valori)
+
+    sketch = SketchKLL(k=200, seed=0)
+    for blocco in np.array_split(valori, 17):
+        parziale = SketchKLL(k=200, seed=len(blocco))
+        parziale.aggiorna(blocco)
+        sketch.unisci(parziale)
+
+    assert sketch.n == len(valori)
+    assert 0 < sketch.errore_rango < 0.02
+    assert _errore_rango_massimo(valori, sketch.quantili(QUANTILI), QUANTILI) <= sketch.errore_rango
+
+
+def test_unione_degli_accumulatori_come_numpy():
+    """
+    Unire gli accumulatori di blocchi, anche vuoti o con NaN, dà media, deviazione standard, minimo e massimo di tutti
+    i valori, senza perdere precisione quando la media è molto maggiore della dispersione.
+    """
+    rng = np.random.default_rng(2)
+    valori = 1e9 + rng.normal(0, 1, 30_000)
+    valori[rng.choice(len(valori), 100, replace=False)] = np.nan
+    blocchi = np.array_split(valori, [0, 10, 10, 5000, 22_000])
+
+    accumulatore = AccumulatoreStatistiche()
+    for blocco in blocchi:
+        parziale = AccumulatoreStatistiche()
+        parziale.aggiorna(blocco)
+        accumulatore.unisci(parziale)
+
+    validi = valori[~np.isnan(valori)]
+    assert accumulatore.conteggio == len(validi)
+    np.testing.assert_allclose(accumulatore.media, validi.mean(), rtol=1e-15)
+    np.testing.assert_allclose(accumulatore.deviazione_standard, validi.std(ddof=1), rtol=1e-9)
+    assert accumulatore.minimo == validi.min()
+    assert accumulatore.massimo == validi.max()
+
+
+def test_statistiche_streaming_come_pandas(tmp_path):
+    """
+    Le statistiche calcolate leggendo il file a blocchi, con un filtro, coincidono con quelle di pandas sull'intero
+    file.
+    """
+    rng = np.random.default_rng(3)
+    numero_annunci = 5000
+    annunci = pd.DataFrame({
+        "agenzia": rng.choice(["GAB", "TEC"], numero_annunci),
+        "latitudine": 45.46 + rng.normal(0, 0.01, numero_annunci),
+        "longitudine": 9.19 + rng.normal(0, 0.01, numero_annunci),
+        "prezzo": rng.lognormal(12.5, 0.4, numero_annunci).round(),
+    })
+    percorso = str(tmp_path / "annunci.csv")
+    annunci.to_csv(percorso, index=False)
+
+    statistiche = calcola_statistiche_streaming(percorso, dimensione_chunk=700, prezzo_minimo=200_000)
+
+    prezzi = annunci.loc[annunci["prezzo"] >= 200_000, "prezzo"]
+    np.testing.assert_allclose(statistiche["media"], prezzi.mean())
+    np.testing.assert_allclose(statistiche["deviazione_standard"], prezzi.std())
+    assert statistiche["minimo"] == prezzi.min()
+    assert statistiche["massimo"] == prezzi.max()
+    quantili = [0.5, *statistiche["percentili"]]
+    stime = [statistiche["mediana"], *statistiche["percentili"].values()]
+    assert _errore_rango_massimo(prezzi.to_numpy(), np.array(stime), np.array(quantili)) \
+        <= statistiche["errore_rango_quantili"]
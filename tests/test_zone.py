@@ -0,0 +1,85 @@
+"""
+Test dell'assegnazione degli annunci alle zone di `geo.zone`.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from geo import zone as modulo_zone
+from geo.zone import aggiorna_zone_annunci, assegna_zone, carica_zone
+
+
+@pytest.fixture(name="percorso_geojson")
+def fixture_percorso_geojson(tmp_path):
+    """
+    Scrive un file GeoJSON con due zone quadrate affiancate, "Ovest" e "Est".
+
+    :return: Il percorso del file.
+    """
+    def quadrato(longitudine_minima):
+        return [[[longitudine_minima, 45.0], [longitudine_minima + 1, 45.0], [longitudine_minima + 1, 46.0],
+                 [longitudine_minima, 46.0], [longitudine_minima, 45.0]]]
+
+    feature = [
+        {"type": "Feature", "properties": {"nome": nome}, "geometry": {"type": "Polygon", "coordinates": quadrato(lon)}}
+        for nome, lon in [("Ovest", 8.0), ("Est", 9.0)]
+    ]
+    percorso = tmp_path / "zone.geojson"
+    percorso.write_text(json.dumps({"type": "FeatureCollection", "features": feature}), encoding="utf-8")
+    return str(percorso)
+
+
+def _genera_annunci():
+    """
+    :return: Annunci nelle due zone, fuori da ogni zona e senza coordinate.
+    :rtype: pd.DataFrame
+    """
+    return pd.DataFrame({
+        "riferimento": [1, 2, 3, 4],
+        "latitudine": [45.5, 45.5, 47.0, np.nan],
+        "longitudine": [8.5, 9.5, 9.5, np.nan],
+    })
+
+
+def test_assegna_zone(percorso_geojson):
+    """
+    Ogni punto riceve la zona che lo contiene; i punti fuori da ogni zona o senza coordinate restano senza zona.
+    """
+    nomi, geometrie = carica_zone(percorso_geojson)
+    annunci = _genera_annunci()
+
+    zone = assegna_zone(annunci["latitudine"], annunci["longitudine"], nomi, geometrie)
+
+    assert zone.tolist() == ["Ovest", "Est", None, None]
+
+
+def test_cache_conserva_gli_annunci_non_passati(percorso_geojson, tmp_path, monkeypatch):
+    """
+    Una chiamata con un sottoinsieme degli annunci non cancella gli altri dalla cache, e gli annunci senza coordinate
+    non vengono ricalcolati.
+    """
+    percorso_cache = str(tmp_path / "zone_annunci.csv")
+    annunci = _genera_annunci()
+    aggiorna_zone_annunci(annunci, percorso_geojson, percorso_cache)
+
+    calcolati = []
+
+    def assegna_e_conta(latitudini, longitudini, nomi, geometrie):
+        calcolati.extend(latitudini)
+        return assegna_zone(latitudini, longitudini, nomi, geometrie)
+
+    monkeypatch.setattr(modulo_zone, "assegna_zone", assegna_e_conta)
+
+    spostato = annunci.iloc[[0]].assign(longitudine=9.5)
+    assert aggiorna_zone_annunci(spostato, percorso_geojson, percorso_cache).tolist() == ["Est"]
+    assert len(calcolati) == 1
+
+    zone = aggiorna_zone_annunci(annunci, percorso_geojson, percorso_cache)
+    assert zone.tolist() == ["Ovest", "Est", None, None]
+    assert len(calcolati) == 2
+    assert sorted(pd.read_csv(percorso_cache)["riferimento"]) == [1, 2, 3, 4]
+
+    aggiorna_zone_annunci(annunci, percorso_geojson, percorso_cache)
+    assert len(calcolati) == 2
@@ -1,26 +1,65 @@
 """
 Modulo per analizzare le transazioni
 """
+import argparse
+
 import networkx as nx
-import pandas as pd
 
+from dati import leggi_transazioni
+from dati.caricamento import FILE_TRANSAZIONI_CSV
 from grafici import plot_grafico_transazioni_per_anno, plot_grafico_funzione_prezzo_transazioni_immobili, \
-    plot_grafico_frequenza_gradi
+    plot_grafico_frequenza_gradi, plot_istogramma_gradi
 from grafo.disegna_grafo import disegna_grafo
 from grafo.genera_grafo import genera_grafo
+from grafo.grafo_sparso import GrafoSparso
+
+
+def _get_args():
+    """
+    Ottiene gli argomenti dalla linea di comando usando argparse.
+
+    :return: Namespace L'oggetto contenente tutti gli argomenti della riga di comando parsati.
+    """
+    parser = argparse.ArgumentParser(description="Impostazioni analisi transazioni")
+    parser.add_argument('-f', '--file', type=str, default=FILE_TRANSAZIONI_CSV,
+                        help='File delle transazioni: CSV, CSV compresso (.csv.gz) o Parquet (.parquet)')
+    parser.add_argument('-b', '--backend', type=str, choices=["networkx", "sparso"], default="networkx",
+                        help='Struttura del grafo: NetworkX completo o matrici sparse per dataset grandi')
+    parser.add_argument('-i', '--immobili', type=str, nargs='+', default=None,
+                        help='Immobili di cui disegnare il grafo e i prezzi (solo con il backend sparso)')
+
+    args = parser.parse_args()
+
+    if args.immobili is not None and args.backend != "sparso":
+        parser.error("La selezione degli immobili da disegnare è disponibile solo con il backend sparso")
+
+    return args
 
 
 def main():
     """
     Funzione principale eseguita quando lo script è avviato.
 
-    Legge un file CSV contenente transazioni immobiliari, lo converte in un DataFrame, e genera e visualizza
-    un grafo delle transazioni. Inoltre, genera immagini del grafo e grafici delle transazioni per ogni immobile.
+    Legge il file delle transazioni immobiliari (CSV, CSV compresso o Parquet), lo converte in un DataFrame, e genera
+    e visualizza un grafo delle transazioni. Inoltre, genera immagini del grafo e grafici delle transazioni per ogni
+    immobile.
+    Con il backend sparso il grafo completo resta in forma compatta: i prezzi e il grafo vengono disegnati solo per gli
+    immobili richiesti e i gradi dei nodi sono riassunti in un istogramma invece che con una barra per nodo.
     """
-    transazioni = pd.read_csv('files/transazioni.csv')
-    transazioni['data'] = pd.to_datetime(transazioni['data'])
+    args = _get_args()
+    transazioni = leggi_transazioni(args.file)
 
     plot_grafico_transazioni_per_anno(transazioni)
+
+    if args.backend == "sparso":
+        grafo_sparso = GrafoSparso(transazioni)
+        if args.immobili:
+            plot_grafico_funzione_prezzo_transazioni_immobili(grafo_sparso.get_transazioni_immobili(args.immobili))
+            disegna_grafo(*grafo_sparso.sottografo_networkx(args.immobili))
+
+        plot_istogramma_gradi(grafo_sparso.gradi())
+        return
+
     plot_grafico_funzione_prezzo_transazioni_immobili(transazioni)
     grafo_transazioni, mappa_colori = genera_grafo(transazioni)
     disegna_grafo(grafo_transazioni, mappa_colori)